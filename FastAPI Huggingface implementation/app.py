@@ -1,8 +1,13 @@
+import os
+import json
+import asyncio
 import logging
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, Depends
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
-from typing import Dict, Optional, List, Any
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+from typing import Dict, Optional, List, Any, Literal
 import uuid
 from datetime import datetime
 from contextlib import asynccontextmanager
@@ -10,7 +15,15 @@ from contextlib import asynccontextmanager
 from models.embedding import EmbeddingModel
 from models.summarization import SummarizationModel
 from models.nlp import NLPModel
+from models.gazetteer import EntityGazetteer
 from database.query import DatabaseService
+from database.local_search import LocalSearchService
+from services.cache import ResultCache, load_warmup_queries
+from services.inference import InferenceExecutor
+from services.batching import EmbeddingBatcher, SummarizationBatcher
+from services.jobs import FINAL_STATUSES, JobStore, create_job_store
+from services.singleflight import SingleFlight
+from services.scheduler import JobAborted, JobScheduler, SchedulerFull
 from main import QueryProcessor
 
 # Configure logging
@@ -26,10 +39,72 @@ embedding_model = None
 summarization_model = None
 nlp_model = None
 db_service = None
+result_cache = None
+inference_executor = None
+embedding_batcher = None
+summarization_batcher = None
+job_store: Optional[JobStore] = None
+# Identical requests submitted while one is running share its pipeline run
+job_coalescer = SingleFlight()
+# Request key -> jobs attached to its in-flight pipeline run and the stages
+# published so far, so coalesced jobs receive the intermediate results too
+pipeline_runs: Dict[tuple, Dict[str, Any]] = {}
+job_scheduler: Optional[JobScheduler] = None
+# Query entity matcher built from articles.ner, with ENTITY_MATCHER=gazetteer
+entity_gazetteer: Optional[EntityGazetteer] = None
+
+def build_processor() -> QueryProcessor:
+    """QueryProcessor wired to the shared models, cache and executors"""
+    return QueryProcessor(
+        embedding_model=embedding_model,
+        summarization_model=summarization_model,
+        nlp_model=nlp_model,
+        db_service=db_service,
+        cache=result_cache,
+        executor=inference_executor,
+        embedding_batcher=embedding_batcher,
+        summarization_batcher=summarization_batcher,
+        entity_matcher=entity_gazetteer
+    )
+
+async def warm_up_cache(path: str):
+    """Populate the result cache from a file of popular queries"""
+    try:
+        queries = load_warmup_queries(path)
+    except Exception as e:
+        logger.error(f"Could not read cache warm-up file {path}: {str(e)}")
+        return
+
+    logger.info(f"Warming up result cache with {len(queries)} queries")
+    processor = build_processor()
+    for item in queries:
+        try:
+            request = PostRequest(**item)
+            await processor.process(
+                query=request.query,
+                topic=request.topic,
+                start_date=request.start_date,
+                end_date=request.end_date,
+                summary_mode=request.summary_mode
+            )
+        except Exception as e:
+            logger.warning(f"Cache warm-up failed for {item}: {str(e)}")
+    logger.info(f"Cache warm-up finished: {result_cache.stats()}")
+
+async def refresh_gazetteer_periodically(interval: float):
+    """Add the entities of newly loaded articles to the gazetteer"""
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await entity_gazetteer.refresh(db_service)
+        except Exception as e:
+            logger.error(f"Gazetteer refresh failed: {str(e)}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    global embedding_model, summarization_model, nlp_model, db_service
+    global embedding_model, summarization_model, nlp_model, db_service, result_cache
+    global inference_executor, embedding_batcher, summarization_batcher, job_store, job_scheduler
+    global entity_gazetteer
     
     # Model initialization
     logger.info("Initializing models...")
@@ -37,22 +112,64 @@ async def lifespan(app: FastAPI):
         embedding_model = EmbeddingModel()
         summarization_model = SummarizationModel()
         nlp_model = NLPModel()
-        db_service = DatabaseService()
+        # SEARCH_BACKEND=local serves searches from an in-process index
+        if os.getenv("SEARCH_BACKEND", "postgres").lower() == "local":
+            db_service = LocalSearchService()
+        else:
+            db_service = DatabaseService()
+        await db_service.open()
+        result_cache = ResultCache()
+        inference_executor = InferenceExecutor()
+        embedding_batcher = EmbeddingBatcher(embedding_model, inference_executor)
+        embedding_batcher.start()
+        summarization_batcher = SummarizationBatcher(summarization_model, inference_executor)
+        summarization_batcher.start()
+        job_store = create_job_store()
+        job_scheduler = JobScheduler(on_start=mark_job_started, on_abort=mark_job_aborted)
+        job_scheduler.start()
+        if os.getenv("ENTITY_MATCHER", "spacy").lower() == "gazetteer":
+            entity_gazetteer = EntityGazetteer()
+            await entity_gazetteer.refresh(db_service)
         logger.info("All models initialized successfully")
     except Exception as e:
         logger.error(f"Model initialization failed: {str(e)}")
         raise
 
+    warmup_task = None
+    warmup_file = os.getenv("CACHE_WARMUP_FILE")
+    if warmup_file:
+        warmup_task = asyncio.create_task(warm_up_cache(warmup_file))
+
+    gazetteer_task = None
+    if entity_gazetteer:
+        interval = float(os.getenv("GAZETTEER_REFRESH_SECONDS", "600"))
+        gazetteer_task = asyncio.create_task(refresh_gazetteer_periodically(interval))
+
     yield
 
+    if warmup_task and not warmup_task.done():
+        warmup_task.cancel()
+    if gazetteer_task:
+        gazetteer_task.cancel()
+
     # Cleanup
     logger.info("Shutting down application...")
+    if job_scheduler:
+        await job_scheduler.stop()
+    if embedding_batcher:
+        await embedding_batcher.stop()
+    if summarization_batcher:
+        await summarization_batcher.stop()
+    if inference_executor:
+        inference_executor.shutdown()
+    if job_store:
+        await job_store.close()
     if db_service:
         try:
             await db_service.close()
-            logger.info("Database connection closed successfully")
+            logger.info("Database connection pool closed successfully")
         except Exception as e:
-            logger.error(f"Error closing database connection: {str(e)}")
+            logger.error(f"Error closing database connection pool: {str(e)}")
 
 app = FastAPI(
     title="Kairos News API",
@@ -63,6 +180,26 @@ app = FastAPI(
 @app.get("/")
 async def root():
     return {"message": "Kairos News API is running"}
+
+@app.get("/cache/stats")
+async def get_cache_stats():
+    return {
+        **result_cache.stats(),
+        "embeddings": embedding_model.cache.stats(),
+        "entities": nlp_model.entity_cache.stats(),
+        "embedding_batches": embedding_batcher.stats(),
+        "summarization_batches": summarization_batcher.stats(),
+        "gazetteer": entity_gazetteer.stats() if entity_gazetteer else None,
+        "search": db_service.stats(),
+    }
+
+@app.post("/gazetteer/refresh")
+async def refresh_gazetteer():
+    """Pick up the entities of articles loaded since the last refresh"""
+    if not entity_gazetteer:
+        raise HTTPException(status_code=404, detail="Gazetteer is not enabled")
+    rows = await entity_gazetteer.refresh(db_service)
+    return {"rows": rows, **entity_gazetteer.stats()}
     
 app.add_middleware(
     CORSMiddleware,
@@ -71,96 +208,316 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# In-memory job storage
-jobs_db: Dict[str, Dict] = {}
-
 class PostRequest(BaseModel):
     query: str
     topic: Optional[str] = None
     start_date: Optional[str] = None
     end_date: Optional[str] = None
+    summary_mode: Literal["extractive", "fast", "quality"] = "quality"
+    priority: Literal["high", "normal", "low"] = "normal"
+    # Seconds from submission until the job is abandoned, capped by the server
+    deadline: Optional[float] = Field(None, gt=0)
+
+class StreamRequest(PostRequest):
+    # Beam search cannot be streamed, so streams default to greedy decoding
+    summary_mode: Literal["extractive", "fast", "quality"] = "fast"
 
 class JobStatus(BaseModel):
     id: str
     status: str
+    # Last intermediate result merged into result while processing:
+    # entities, articles, extractive_summary, then summary when completed
+    stage: Optional[str] = None
+    # Incremented on every change of the job, for long-polling /loading
+    version: int = 0
     created_at: datetime
+    started_at: Optional[datetime] = None
     completed_at: Optional[datetime] = None
     request: PostRequest
     result: Optional[Dict[str, Any]] = None
+    coalesced: bool = False
+    queue_position: Optional[int] = None
+    queue_depth: Optional[int] = None
+    wait_seconds: Optional[float] = None
+
+class BatchRequest(BaseModel):
+    requests: List[PostRequest]
+    # Scheduling of the batch as a whole, as for a single job
+    priority: Literal["high", "normal", "low"] = "normal"
+    deadline: Optional[float] = Field(None, gt=0)
+
+# Longest a /loading request waits for the job to change
+LOADING_MAX_WAIT = float(os.getenv("LOADING_MAX_WAIT_SECONDS", "30"))
+
+# Most queries a single /batch request may carry
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", "32"))
+
+def retry_later(e: SchedulerFull) -> HTTPException:
+    return HTTPException(
+        status_code=429,
+        detail=str(e),
+        headers={"Retry-After": str(e.retry_after)}
+    )
+
+def request_key(request: PostRequest) -> tuple:
+    """Normalized request identity used to coalesce identical jobs"""
+    return ResultCache.request_key(
+        request.query,
+        request.topic,
+        request.start_date,
+        request.end_date
+    ) + (request.summary_mode,)
 
 @app.post("/index", response_model=JobStatus)
-async def create_job(request: PostRequest, background_tasks: BackgroundTasks):
+async def create_job(request: PostRequest):
+    try:
+        job_scheduler.check_capacity()
+    except SchedulerFull as e:
+        logger.warning(f"Rejecting job, {str(e)}")
+        raise retry_later(e)
+
     job_id = str(uuid.uuid4())
     logger.info(f"Creating new job {job_id} with request: {request.dict()}")
 
-    jobs_db[job_id] = {
+    job = await job_store.create({
         "id": job_id,
-        "status": "processing",
+        "status": "queued",
         "created_at": datetime.now(),
+        "started_at": None,
         "completed_at": None,
         "request": request.dict(),
-        "result": None
-    }
+        "result": None,
+        "stage": None,
+        "version": 0
+    })
 
-    background_tasks.add_task(
-        process_job,
-        job_id,
-        request,
-        embedding_model,
-        summarization_model,
-        nlp_model,
-        db_service
-    )
+    try:
+        job_scheduler.submit(
+            job_id,
+            lambda: process_job(job_id, request),
+            priority=request.priority,
+            deadline=request.deadline
+        )
+    except SchedulerFull as e:
+        await job_store.update(job_id, {
+            "status": "rejected",
+            "completed_at": datetime.now(),
+            "result": {"error": str(e)}
+        })
+        raise retry_later(e)
     
-    logger.info(f"Job {job_id} created and processing started")
-    return jobs_db[job_id]
+    logger.info(f"Job {job_id} created and queued")
+    return {**job, **job_scheduler.status(job_id)}
+
+@app.delete("/index", response_model=JobStatus)
+async def cancel_job(id: str):
+    job = await job_store.get(id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    if not job_scheduler.cancel(id):
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']} and cannot be cancelled")
+    logger.info(f"Cancellation requested for job {id}")
+    return {**job, **job_scheduler.status(id)}
+
+async def mark_job_started(job_id: str, wait_seconds: float):
+    await job_store.update(job_id, {
+        "status": "processing",
+        "started_at": datetime.now(),
+        "wait_seconds": wait_seconds
+    })
+
+async def mark_job_aborted(job_id: str, status: str, reason: str):
+    logger.warning(f"Job {job_id} {status}: {reason}")
+    await job_store.update(job_id, {
+        "status": status,
+        "completed_at": datetime.now(),
+        "result": {"error": reason}
+    })
 
 @app.get("/loading", response_model=JobStatus)
-async def get_job_status(id: str):
+async def get_job_status(id: str, wait: float = 0, version: Optional[int] = None):
+    """Job status and results so far. With wait, blocks for up to wait
+    seconds until the job's version exceeds version (by default the one it
+    has when the request arrives) or the job finishes."""
     logger.info(f"Checking status for job {id}")
-    if id not in jobs_db:
+    job = await job_store.get(id)
+    if job is not None and wait > 0 and job["status"] not in FINAL_STATUSES:
+        since = job.get("version", 0) if version is None else version
+        job = await job_store.wait(id, since, min(wait, LOADING_MAX_WAIT))
+    if job is None:
         logger.warning(f"Job {id} not found")
         raise HTTPException(status_code=404, detail="Job not found")
     
-    logger.info(f"Returning status for job {id}: {jobs_db[id]['status']}")
-    return jobs_db[id]
-
-async def process_job(
-    job_id: str,
-    request: PostRequest,
-    embedding_model: EmbeddingModel,
-    summarization_model: SummarizationModel,
-    nlp_model: NLPModel,
-    db_service: DatabaseService
-):
+    logger.info(f"Returning status for job {id}: {job['status']}")
+    if job["status"] == "queued":
+        return {**job, **job_scheduler.status(id)}
+    return job
+
+@app.post("/batch")
+async def batch_queries(batch: BatchRequest):
+    """Runs several queries at once, sharing the query encoding and the
+    database round trip; returns the result of each in request order.
+    The batch is one job of the scheduler, waiting for a worker slot and
+    bounded by its deadline like any other."""
+    if not batch.requests:
+        raise HTTPException(status_code=422, detail="No requests in batch")
+    if len(batch.requests) > BATCH_MAX_QUERIES:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds {BATCH_MAX_QUERIES} requests")
+
+    batch_id = f"batch-{uuid.uuid4()}"
+    logger.info(f"Processing batch {batch_id} of {len(batch.requests)} requests")
+    processor = build_processor()
     try:
-        logger.info(f"Starting processing for job {job_id}")
-        
-        processor = QueryProcessor(
-            embedding_model=embedding_model,
-            summarization_model=summarization_model,
-            nlp_model=nlp_model,
-            db_service=db_service
+        results = await job_scheduler.execute(
+            batch_id,
+            lambda: processor.process_batch([
+                {
+                    "query": request.query,
+                    "topic": request.topic,
+                    "start_date": request.start_date,
+                    "end_date": request.end_date,
+                    "summary_mode": request.summary_mode,
+                }
+                for request in batch.requests
+            ]),
+            priority=batch.priority,
+            deadline=batch.deadline
         )
-        
-        logger.debug(f"Processing query: {request.query}")
-        result = await processor.process(
+    except SchedulerFull as e:
+        logger.warning(f"Rejecting batch, {str(e)}")
+        raise retry_later(e)
+    except JobAborted as e:
+        raise HTTPException(status_code=504 if e.status == "timeout" else 409, detail=str(e))
+    return {"results": results}
+
+@app.get("/jobs/stats")
+async def get_job_stats():
+    return {
+        "jobs": await job_store.count(),
+        "coalescing": job_coalescer.stats(),
+        "scheduler": job_scheduler.stats(),
+    }
+
+def format_sse(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+async def stream_events(request: PostRequest):
+    """The events of the pipeline run as a scheduler job, so streams share
+    the worker slots, priorities and deadlines of the other jobs"""
+    logger.info(f"Streaming request: {request.dict()}")
+    processor = build_processor()
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def run_stream():
+        async for event in processor.process_stream(
             query=request.query,
             topic=request.topic,
             start_date=request.start_date,
-            end_date=request.end_date
-        )
+            end_date=request.end_date,
+            summary_mode=request.summary_mode
+        ):
+            await events.put(event)
+
+    job = asyncio.create_task(job_scheduler.execute(
+        f"stream-{uuid.uuid4()}",
+        run_stream,
+        priority=request.priority,
+        deadline=request.deadline
+    ))
+    # Marks the end of the events, however the job ends
+    job.add_done_callback(lambda _: events.put_nowait(None))
+    try:
+        while True:
+            item = await events.get()
+            if item is None:
+                break
+            yield format_sse(*item)
+        await job
+    except SchedulerFull as e:
+        yield format_sse("error", {"error": str(e), "retry_after": e.retry_after})
+    except JobAborted as e:
+        yield format_sse("error", {"error": str(e), "status": e.status})
+    finally:
+        # Stops the job when the client disconnects
+        job.cancel()
+
+def stream_response(request: PostRequest) -> StreamingResponse:
+    return StreamingResponse(
+        stream_events(request),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/stream")
+async def stream_job(request: StreamRequest):
+    """Server-Sent Events: articles, then summary tokens, then the summary.
+    Tokens are streamed in "fast" mode, the default here; "quality"
+    summaries arrive whole in the summary event. The pipeline waits for a
+    worker slot like other jobs; a missed deadline ends the stream with an
+    error event."""
+    try:
+        job_scheduler.check_capacity()
+    except SchedulerFull as e:
+        raise retry_later(e)
+    return stream_response(request)
+
+@app.get("/stream")
+async def stream_job_get(request: StreamRequest = Depends()):
+    """Query-string variant of POST /stream for EventSource clients"""
+    return await stream_job(request)
+
+async def process_job(job_id: str, request: PostRequest):
+    try:
+        logger.info(f"Starting processing for job {job_id}")
+        
+        processor = build_processor()
+        
+        logger.debug(f"Processing query: {request.query}")
+        key = request_key(request)
+        coalesced = job_coalescer.is_inflight(key)
+
+        run = pipeline_runs.setdefault(key, {"jobs": set(), "stage": None, "result": {}})
+        run["jobs"].add(job_id)
+        if run["stage"]:
+            await job_store.update(job_id, {"stage": run["stage"], "result": dict(run["result"])})
+
+        async def publish(stage: str, data: Dict[str, Any]):
+            run["stage"] = stage
+            run["result"].update(data)
+            for attached in list(run["jobs"]):
+                await job_store.update(attached, {"stage": stage, "result": dict(run["result"])})
+
+        async def run_pipeline():
+            try:
+                return await processor.process(
+                    query=request.query,
+                    topic=request.topic,
+                    start_date=request.start_date,
+                    end_date=request.end_date,
+                    summary_mode=request.summary_mode,
+                    on_stage=publish
+                )
+            finally:
+                if pipeline_runs.get(key) is run:
+                    del pipeline_runs[key]
+
+        try:
+            result = await job_coalescer.do(key, run_pipeline)
+        finally:
+            run["jobs"].discard(job_id)
         
-        jobs_db[job_id].update({
+        await job_store.update(job_id, {
             "status": "completed",
             "completed_at": datetime.now(),
-            "result": result if result else {"message": "No results found"}
+            "result": result if result else {"message": "No results found"},
+            "stage": "summary" if result and "summary" in result else run["stage"],
+            "coalesced": coalesced
         })
         logger.info(f"Job {job_id} completed successfully")
         
     except Exception as e:
         logger.error(f"Error processing job {job_id}: {str(e)}", exc_info=True)
-        jobs_db[job_id].update({
+        await job_store.update(job_id, {
             "status": "failed",
             "completed_at": datetime.now(),
             "result": {"error": str(e)}
@@ -0,0 +1,89 @@
+"""
+Embedding throughput under simulated concurrency, with and without the
+EmbeddingBatcher.
+
+Each simulated job encodes one query string and a list of article sentences,
+like QueryProcessor does. Run from the API directory:
+
+    python -m benchmarks.embedding_batching --jobs 32 --sentences 60
+"""
+
+import time
+import asyncio
+import argparse
+import random
+
+from models.embedding import EmbeddingModel
+from services.inference import InferenceExecutor
+from services.batching import EmbeddingBatcher
+
+WORDS = (
+    "governo parlamento lisboa porto eleições economia saúde escola inflação "
+    "ministro câmara orçamento futebol tribunal europa greve energia habitação"
+).split()
+
+
+def make_text(rng: random.Random, n_words: int) -> str:
+    return " ".join(rng.choice(WORDS) for _ in range(n_words))
+
+
+def make_jobs(n_jobs: int, n_sentences: int, seed: int = 0):
+    rng = random.Random(seed)
+    return [
+        (make_text(rng, 6), [make_text(rng, 25) for _ in range(n_sentences)])
+        for _ in range(n_jobs)
+    ]
+
+
+async def run_direct(model, executor, jobs):
+    async def job(query, sentences):
+        await executor.run("embedding", model.encode, query)
+        await executor.run("embedding", model.encode, sentences)
+
+    await asyncio.gather(*(job(q, s) for q, s in jobs))
+
+
+async def run_batched(batcher, jobs):
+    async def job(query, sentences):
+        await batcher.encode(query)
+        await batcher.encode(sentences)
+
+    await asyncio.gather(*(job(q, s) for q, s in jobs))
+
+
+async def main(args):
+    model = EmbeddingModel()
+    # Measure inference, not memoization
+    model.cache.max_entries = 0
+    executor = InferenceExecutor()
+    jobs = make_jobs(args.jobs, args.sentences)
+    n_texts = sum(1 + len(s) for _, s in jobs)
+
+    # Warm-up pass so model loading and first-call overheads are excluded
+    await run_direct(model, executor, jobs[:2])
+
+    start = time.perf_counter()
+    await run_direct(model, executor, jobs)
+    direct = time.perf_counter() - start
+
+    batcher = EmbeddingBatcher(model, executor, args.max_batch_size, args.max_wait_ms)
+    batcher.start()
+    start = time.perf_counter()
+    await run_batched(batcher, jobs)
+    batched = time.perf_counter() - start
+    await batcher.stop()
+    executor.shutdown()
+
+    print(f"jobs={args.jobs} sentences/job={args.sentences} texts={n_texts}")
+    print(f"direct : {direct:.3f}s  {args.jobs / direct:.1f} jobs/s  {n_texts / direct:.0f} texts/s")
+    print(f"batched: {batched:.3f}s  {args.jobs / batched:.1f} jobs/s  {n_texts / batched:.0f} texts/s")
+    print(f"batcher stats: {batcher.stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--jobs", type=int, default=32)
+    parser.add_argument("--sentences", type=int, default=60)
+    parser.add_argument("--max-batch-size", type=int, default=64)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    asyncio.run(main(parser.parse_args()))
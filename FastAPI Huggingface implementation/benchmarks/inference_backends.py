@@ -0,0 +1,113 @@
+"""
+Parity, latency and memory comparison of the torch and onnx inference
+backends for EmbeddingModel and SummarizationModel.
+
+Parity is checked against the current PyTorch output: embeddings by cosine
+similarity, summaries by exact match and token overlap. Run from the API
+directory:
+
+    python -m benchmarks.inference_backends --runs 3
+"""
+
+import gc
+import os
+import time
+import argparse
+import resource
+
+import numpy as np
+
+from models.embedding import EmbeddingModel
+from models.summarization import SummarizationModel
+
+QUERIES = [
+    "eleições legislativas em portugal",
+    "inflação e preços da habitação em lisboa",
+    "greve dos professores",
+    "seleção nacional de futebol no europeu",
+]
+
+ARTICLE = (
+    "O Governo aprovou esta quinta-feira em Conselho de Ministros o Orçamento do Estado, "
+    "que prevê um crescimento económico de 1,8% e uma inflação abaixo dos 3%. "
+    "O ministro das Finanças afirmou que o documento reforça o investimento público na saúde "
+    "e na educação, mantendo as contas públicas equilibradas. "
+    "Os partidos da oposição criticaram a proposta, considerando que a carga fiscal continua "
+    "elevada para as famílias e que as medidas para a habitação são insuficientes. "
+    "A votação na generalidade está marcada para o final do mês na Assembleia da República, "
+    "onde o executivo precisa do apoio de outros partidos para garantir a aprovação. "
+    "Os sindicatos anunciaram entretanto novas greves na função pública, exigindo aumentos "
+    "salariais acima da inflação e a revisão das carreiras."
+)
+
+
+def rss_mb() -> float:
+    """Current resident set size in MB (peak RSS where /proc is unavailable)"""
+    try:
+        with open("/proc/self/statm") as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def timed(fn, runs: int):
+    fn()  # warm-up
+    start = time.perf_counter()
+    for _ in range(runs):
+        result = fn()
+    return result, (time.perf_counter() - start) / runs
+
+
+def load(cls, backend: str):
+    gc.collect()
+    before = rss_mb()
+    start = time.perf_counter()
+    model = cls(backend=backend)
+    return model, time.perf_counter() - start, rss_mb() - before
+
+
+def token_overlap(a: str, b: str) -> float:
+    a_tokens, b_tokens = set(a.lower().split()), set(b.lower().split())
+    return len(a_tokens & b_tokens) / max(len(a_tokens | b_tokens), 1)
+
+
+def compare_embeddings(runs: int):
+    texts = QUERIES + [ARTICLE]
+    outputs = {}
+    for backend in ("torch", "onnx"):
+        model, load_s, mem = load(EmbeddingModel, backend)
+        model.cache.max_entries = 0
+        outputs[backend], latency = timed(lambda m=model: m.encode(texts), runs)
+        print(f"[embedding/{backend}] load {load_s:.1f}s  +{mem:.0f}MB RSS  encode({len(texts)}) {latency * 1000:.1f}ms")
+        del model
+
+    ref, cand = outputs["torch"], outputs["onnx"]
+    cosine = np.sum(ref * cand, axis=1) / (np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1))
+    print(f"[embedding] cosine similarity to torch: min {cosine.min():.4f}  mean {cosine.mean():.4f}")
+
+
+def compare_summaries(runs: int):
+    outputs = {}
+    for backend in ("torch", "onnx"):
+        model, load_s, mem = load(SummarizationModel, backend)
+        outputs[backend], latency = timed(lambda m=model: m.summarize(ARTICLE), runs)
+        print(f"[summarization/{backend}] load {load_s:.1f}s  +{mem:.0f}MB RSS  summarize {latency:.2f}s")
+        del model
+
+    exact = outputs["torch"] == outputs["onnx"]
+    overlap = token_overlap(outputs["torch"], outputs["onnx"])
+    print(f"[summarization] exact match: {exact}  token overlap with torch: {overlap:.3f}")
+    if not exact:
+        print(f"  torch: {outputs['torch']}\n  onnx : {outputs['onnx']}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--skip-summarization", action="store_true")
+    args = parser.parse_args()
+
+    compare_embeddings(args.runs)
+    if not args.skip_summarization:
+        compare_summaries(args.runs)
@@ -0,0 +1,71 @@
+"""
+LexRank sentence ranking: the dense reference implementation against the
+sparse power iteration used by QueryProcessor.
+
+Sentence embeddings are synthetic clusters of 384-dimensional vectors, like
+MiniLM's, so no model is loaded. Rankings are compared on the dense scores:
+the sparse top-n matches when it selects sentences with the same dense
+scores, since sentences of equal degree tie exactly and their order is
+arbitrary in the dense code. Run from the API directory:
+
+    python -m benchmarks.lexrank --sizes 50 200 1000 3000
+"""
+
+import time
+import argparse
+
+import numpy as np
+
+from models.LexRank import degree_centrality_scores, sparse_degree_centrality_scores
+
+
+def make_embeddings(n: int, dim: int = 384, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 20, 1), dim))
+    labels = rng.integers(0, len(centers), n)
+    return (centers[labels] + rng.normal(scale=2.0, size=(n, dim))).astype(np.float32)
+
+
+def dense_scores(embeddings: np.ndarray, threshold: float) -> np.ndarray:
+    # The former _rank_sentences code path
+    similarity_matrix = np.dot(embeddings, embeddings.T) / (np.linalg.norm(embeddings, axis=1, keepdims=True) * np.linalg.norm(embeddings, axis=1, keepdims=True).T)
+    return degree_centrality_scores(similarity_matrix, threshold=threshold)
+
+
+def timed(fn, *args, repeat: int = 3):
+    best, result = float("inf"), None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(*args)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(args):
+    for n in args.sizes:
+        embeddings = make_embeddings(n)
+
+        sparse_time, sparse = timed(sparse_degree_centrality_scores, embeddings, args.threshold, repeat=args.repeat)
+        if n > args.max_dense:
+            print(f"n={n:<6} dense: skipped  sparse: {sparse_time * 1000:8.1f}ms")
+            continue
+        dense_time, dense = timed(dense_scores, embeddings, args.threshold, repeat=args.repeat)
+
+        top_dense = np.argsort(-dense, kind="stable")[:args.top_n]
+        top_sparse = np.argsort(-sparse, kind="stable")[:args.top_n]
+        same_ranking = np.allclose(dense[top_dense], dense[top_sparse], rtol=1e-4)
+        print(
+            f"n={n:<6} dense: {dense_time * 1000:8.1f}ms  sparse: {sparse_time * 1000:8.1f}ms  "
+            f"speedup: {dense_time / sparse_time:6.1f}x  "
+            f"same top-{args.top_n}: {same_ranking}  max score diff: {np.abs(dense - sparse).max():.2e}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[50, 200, 1000, 3000])
+    parser.add_argument("--threshold", type=float, default=0.1)
+    parser.add_argument("--top-n", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--max-dense", type=int, default=3000, help="Largest size the dense code is run on")
+    main(parser.parse_args())
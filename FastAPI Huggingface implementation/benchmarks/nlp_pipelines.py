@@ -0,0 +1,106 @@
+"""
+spaCy load time and throughput per pipeline configuration.
+
+Compares the full pt_core_news_md pipeline with the task-specific ones
+NLPModel uses: NER only for entity extraction, and the parser or the
+rule-based sentencizer for sentence segmentation, each with one nlp() call
+per text and with nlp.pipe (optionally over several processes). Run from
+the API directory:
+
+    python -m benchmarks.nlp_pipelines --texts 200 --n-process 1 2
+"""
+
+import time
+import random
+import argparse
+
+import spacy
+
+from models.nlp import MODEL_NAME, UNUSED_COMPONENTS
+
+WORDS = (
+    "governo parlamento lisboa porto eleições economia saúde escola inflação "
+    "ministro câmara orçamento futebol tribunal europa greve energia habitação"
+).split()
+NAMES = ["António Costa", "Marcelo Rebelo de Sousa", "Lisboa", "Benfica", "União Europeia", "Coimbra"]
+
+
+def make_article(rng: random.Random, n_sentences: int = 12) -> str:
+    sentences = []
+    for _ in range(n_sentences):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(10, 25))]
+        words.insert(rng.randrange(len(words)), rng.choice(NAMES))
+        sentences.append(" ".join(words).capitalize() + ".")
+    return " ".join(sentences)
+
+
+def timed_load(fn):
+    start = time.perf_counter()
+    nlp = fn()
+    return nlp, time.perf_counter() - start
+
+
+def disabled_for(nlp, component):
+    needed = {component}
+    for name, pipe in nlp.pipeline:
+        if component in getattr(pipe, "listening_components", []):
+            needed.add(name)
+    return [name for name in nlp.pipe_names if name not in needed]
+
+
+def report(label: str, n_texts: int, seconds: float):
+    print(f"  {label:<34} {seconds:7.2f}s  {n_texts / seconds:8.1f} texts/s")
+
+
+def run_single(nlp, texts, disable):
+    start = time.perf_counter()
+    for text in texts:
+        nlp(text, disable=disable)
+    return time.perf_counter() - start
+
+
+def run_pipe(nlp, texts, disable, batch_size, n_process):
+    start = time.perf_counter()
+    for _ in nlp.pipe(texts, disable=disable, batch_size=batch_size, n_process=n_process):
+        pass
+    return time.perf_counter() - start
+
+
+def main(args):
+    rng = random.Random(0)
+    texts = [make_article(rng) for _ in range(args.texts)]
+    queries = [f"{rng.choice(NAMES)} {rng.choice(WORDS)} {rng.choice(WORDS)}" for _ in range(args.texts)]
+
+    full, full_load = timed_load(lambda: spacy.load(MODEL_NAME))
+    lean, lean_load = timed_load(lambda: spacy.load(MODEL_NAME, exclude=UNUSED_COMPONENTS))
+    sentencizer, sentencizer_load = timed_load(lambda: spacy.blank("pt"))
+    sentencizer.add_pipe("sentencizer")
+
+    print("Load time")
+    print(f"  full pipeline {full.pipe_names}: {full_load:.2f}s")
+    print(f"  lean pipeline {lean.pipe_names}: {lean_load:.2f}s")
+    print(f"  blank + sentencizer: {sentencizer_load:.2f}s")
+
+    ner_disabled = disabled_for(lean, "ner")
+    parser_disabled = disabled_for(lean, "parser")
+
+    print(f"\nEntity extraction, {len(queries)} queries")
+    report("full pipeline, nlp() per text", len(queries), run_single(full, queries, []))
+    report("NER only, nlp() per text", len(queries), run_single(lean, queries, ner_disabled))
+    for n_process in args.n_process:
+        report(f"NER only, pipe n_process={n_process}", len(queries), run_pipe(lean, queries, ner_disabled, args.batch_size, n_process))
+
+    print(f"\nSentence segmentation, {len(texts)} articles")
+    report("full pipeline, nlp() per text", len(texts), run_single(full, texts, []))
+    report("parser only, nlp() per text", len(texts), run_single(lean, texts, parser_disabled))
+    for n_process in args.n_process:
+        report(f"parser only, pipe n_process={n_process}", len(texts), run_pipe(lean, texts, parser_disabled, args.batch_size, n_process))
+    report("sentencizer, pipe", len(texts), run_pipe(sentencizer, texts, [], args.batch_size, 1))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", type=int, default=200)
+    parser.add_argument("--batch-size", type=int, default=64)
+    parser.add_argument("--n-process", type=int, nargs="+", default=[1, 2])
+    main(parser.parse_args())
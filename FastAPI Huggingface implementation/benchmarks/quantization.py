@@ -0,0 +1,105 @@
+"""
+Quantized first-pass search with exact re-ranking against the float search.
+
+For each query the exact float32 top-k is the reference. float16 is the
+scan the local index does without quantization. int8 and binary quantized
+scans over-fetch k * rerank factor candidates, which are re-ranked exactly
+against the float vectors; recall@k is the fraction of the reference found.
+All scans go chunk by chunk like LocalSearchService; memory is the size of
+the matrix each first pass reads.
+
+Uses the embeddings of a local index (database/build_local_index.py) when
+--index is given, else synthetic clustered 384-dimensional vectors; queries
+are perturbed corpus vectors. Run from the API directory:
+
+    python -m benchmarks.quantization --index data/local_index --rerank-factors 1 2 4 10
+"""
+
+import os
+import time
+import argparse
+
+import numpy as np
+
+from database.quantization import hamming_distances, int8_distances, quantize_binary, quantize_int8
+
+
+def make_embeddings(n: int, dim: int = 384, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centers = rng.normal(size=(max(n // 50, 1), dim))
+    labels = rng.integers(0, len(centers), n)
+    embeddings = centers[labels] + rng.normal(scale=1.5, size=(n, dim))
+    return (embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)).astype(np.float32)
+
+
+def scan(first_pass, n: int, chunk_rows: int) -> np.ndarray:
+    return np.concatenate([first_pass(slice(start, start + chunk_rows)) for start in range(0, n, chunk_rows)])
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    top = np.argpartition(distances, k)[:k]
+    return top[np.argsort(distances[top], kind="stable")]
+
+
+def rerank(embeddings: np.ndarray, query: np.ndarray, candidates: np.ndarray, k: int) -> np.ndarray:
+    distances = 1 - embeddings[candidates] @ query
+    return candidates[np.argsort(distances, kind="stable")[:k]]
+
+
+def main(args):
+    if args.index:
+        embeddings = np.load(os.path.join(args.index, "embeddings.npy")).astype(np.float32)
+    else:
+        embeddings = make_embeddings(args.n)
+    n, dim = embeddings.shape
+    rng = np.random.default_rng(1)
+    queries = embeddings[rng.integers(0, n, args.queries)] + rng.normal(scale=0.05, size=(args.queries, dim))
+    queries = (queries / np.linalg.norm(queries, axis=1, keepdims=True)).astype(np.float32)
+
+    half = embeddings.astype(np.float16)
+    codes, scales = quantize_int8(embeddings)
+    bits = quantize_binary(embeddings)
+    print(
+        f"{n} vectors of {dim} dimensions, first-pass matrix: float32 {embeddings.nbytes / 2**20:.1f}MiB, "
+        f"float16 {half.nbytes / 2**20:.1f}MiB, int8 {codes.nbytes / 2**20:.1f}MiB, "
+        f"binary {bits.nbytes / 2**20:.1f}MiB"
+    )
+
+    start = time.perf_counter()
+    reference = [top_k(scan(lambda rows: 1 - embeddings[rows] @ query, n, args.chunk_rows), args.k) for query in queries]
+    float_ms = (time.perf_counter() - start) * 1000 / len(queries)
+    print(f"float32 exact: {float_ms:7.2f}ms/query")
+
+    start = time.perf_counter()
+    for query in queries:
+        top_k(scan(lambda rows: 1 - half[rows].astype(np.float32) @ query, n, args.chunk_rows), args.k)
+    print(f"float16 exact: {(time.perf_counter() - start) * 1000 / len(queries):7.2f}ms/query")
+
+    first_passes = {
+        "int8": lambda query: scan(lambda rows: int8_distances(codes[rows], scales, query), n, args.chunk_rows),
+        "binary": lambda query: scan(lambda rows: hamming_distances(bits[rows], quantize_binary(query)), n, args.chunk_rows),
+    }
+    for name, first_pass in first_passes.items():
+        for factor in args.rerank_factors:
+            candidates = min(args.k * factor, n - 1)
+            found = 0
+            start = time.perf_counter()
+            for query, expected in zip(queries, reference):
+                result = rerank(embeddings, query, top_k(first_pass(query), candidates), args.k)
+                found += len(np.intersect1d(result, expected))
+            ms = (time.perf_counter() - start) * 1000 / len(queries)
+            print(
+                f"{name:<6} x{factor:<3} ({candidates:>5} candidates): {ms:7.2f}ms/query  "
+                f"recall@{args.k}: {found / (len(queries) * args.k):.3f}"
+            )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", help="Local index directory whose embeddings are used")
+    parser.add_argument("--n", type=int, default=100000, help="Synthetic corpus size")
+    parser.add_argument("--queries", type=int, default=100)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--rerank-factors", type=int, nargs="+", default=[1, 2, 4, 10])
+    parser.add_argument("--chunk-rows", type=int, default=16384)
+    main(parser.parse_args())
@@ -0,0 +1,77 @@
+"""
+Fill articles.ner.norm_word (migration 002) from the word column.
+
+The key is computed with database.entities.normalize_entity, the same function
+the API applies to query entities, so stored and query keys always agree.
+Rows are processed in article_id ranges, one transaction per range, and
+only rows where norm_word is NULL are touched, so the script can be
+interrupted and re-run. Rows inserted later are filled by the trigger of
+migration 007. Run from the API directory with the same DB_* environment
+variables as the API:
+
+    python -m database.backfill_norm_word --batch-articles 5000
+"""
+
+import sys
+import time
+import argparse
+
+import psycopg
+
+from database.entities import normalize_entity
+from database.query import database_conninfo
+
+
+def backfill_range(conn, low: int, high: int) -> int:
+    """Set norm_word for the NULL rows of the articles in [low, high)"""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            '''
+            SELECT DISTINCT word FROM articles.ner
+            WHERE article_id >= %s AND article_id < %s AND norm_word IS NULL
+            ''',
+            (low, high)
+        )
+        words = [row[0] for row in cursor.fetchall()]
+        if not words:
+            return 0
+
+        cursor.execute(
+            '''
+            UPDATE articles.ner n
+            SET norm_word = m.norm_word
+            FROM unnest(%s::text[], %s::text[]) AS m(word, norm_word)
+            WHERE n.word = m.word
+            AND n.article_id >= %s AND n.article_id < %s
+            AND n.norm_word IS NULL
+            ''',
+            (words, [normalize_entity(word) for word in words], low, high)
+        )
+        updated = cursor.rowcount
+    conn.commit()
+    return updated
+
+
+def main(args):
+    with psycopg.connect(database_conninfo(), prepare_threshold=None) as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT MIN(article_id), MAX(article_id) FROM articles.ner WHERE norm_word IS NULL")
+            first, last = cursor.fetchone()
+        conn.commit()
+
+        if first is None:
+            print("Nothing to backfill")
+            return
+
+        start = time.perf_counter()
+        total = 0
+        for low in range(first, last + 1, args.batch_articles):
+            total += backfill_range(conn, low, low + args.batch_articles)
+            print(f"articles {low}-{min(low + args.batch_articles, last + 1) - 1}: {total} rows updated")
+        print(f"Backfilled {total} rows in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-articles", type=int, default=5000)
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,191 @@
+"""
+Build the on-disk index read by database.local_search.LocalSearchService.
+
+Reads the JSON lines written by "3-Preprocessing and Embeddings.py" (url,
+title, text, publish_date, optional topic, embedding and, when present,
+sentence_spans and sentence_embeddings) and writes to the output directory:
+
+    meta.json                dimensions, dtype and topic names
+    embeddings.npy           L2-normalized article embeddings (float16/32)
+    embeddings_int8.npy,     int8 codes and per-dimension scales, or
+    int8_scales.npy,         packed sign bits, scanned before an exact
+    embeddings_binary.npy    re-rank (--quantize int8|binary)
+    dates.npy, topics.npy    publish day and topic code of each article
+    content.jsonl            url, title and content, one article per line,
+    offsets.npy              with the byte offset of each line
+    entity_keys.json,        inverted index of normalized entity mentions:
+    entity_indptr.npy,       the articles of key i are
+    entity_rows.npy          entity_rows[entity_indptr[i]:entity_indptr[i + 1]]
+    sentence_*.npy           precomputed sentence spans and embeddings
+    bm25_*                   BM25 inverted index of the content (--bm25)
+    hnsw.bin                 HNSW graph over the embeddings (--hnsw)
+
+Articles are numbered in input order; that number is their article_id in the
+local backend. --ner runs the spaCy NER of the API over every article to
+build the entity index, --bm25 indexes the content for hybrid search. Run from the API directory:
+
+    python -m database.build_local_index data/articles_done/*.json --output data/local_index --hnsw --ner --bm25
+"""
+
+import os
+import sys
+import json
+import time
+import argparse
+
+import numpy as np
+
+from database.entities import normalize_entity
+from database.lexical import save_bm25_index
+from database.quantization import QUANTIZATIONS, quantize_binary, quantize_int8
+from database.local_search import NO_DATE
+
+
+def read_records(paths):
+    for path in paths:
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get("embedding") and record.get("text"):
+                        yield record
+
+
+def day_number(value) -> int:
+    try:
+        return int(np.datetime64(str(value)[:10], "D").astype(np.int64))
+    except (TypeError, ValueError):
+        return NO_DATE
+
+
+def normalized(rows: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(rows, axis=1, keepdims=True)
+    return rows / np.where(norms == 0, 1, norms)
+
+
+def build_entity_index(entities_per_article):
+    """CSR inverted index from (normalized word, entity_group) to article rows"""
+    postings = {}
+    for row, entities in enumerate(entities_per_article):
+        for word, entity_group in entities:
+            norm = normalize_entity(word)
+            if norm:
+                postings.setdefault((norm, entity_group), set()).add(row)
+
+    keys = sorted(postings)
+    indptr = np.zeros(len(keys) + 1, dtype=np.int64)
+    rows = []
+    for i, key in enumerate(keys):
+        article_rows = sorted(postings[key])
+        rows.extend(article_rows)
+        indptr[i + 1] = indptr[i] + len(article_rows)
+    return [list(key) for key in keys], indptr, np.asarray(rows, dtype=np.int32)
+
+
+def main(args):
+    start = time.perf_counter()
+    os.makedirs(args.output, exist_ok=True)
+    dtype = np.float16 if args.dtype == "float16" else np.float32
+
+    embeddings, days, topic_codes, texts = [], [], [], []
+    topics = {}
+    offsets = [0]
+    sentence_counts, sentence_spans, sentence_embeddings = [], [], []
+
+    with open(os.path.join(args.output, "content.jsonl"), "wb") as content:
+        for record in read_records(args.files):
+            embeddings.append(np.asarray(record["embedding"], dtype=np.float32))
+            days.append(day_number(record.get("publish_date") or record.get("date")))
+            topic = record.get("topic")
+            topic_codes.append(topics.setdefault(topic, len(topics)) if topic else -1)
+            texts.append(record["text"])
+
+            line = json.dumps(
+                {"url": record.get("url"), "title": record.get("title"), "content": record["text"]},
+                ensure_ascii=False
+            ).encode("utf-8") + b"\n"
+            content.write(line)
+            offsets.append(offsets[-1] + len(line))
+
+            spans = record.get("sentence_spans") or []
+            sentence_counts.append(len(spans))
+            if spans:
+                sentence_spans.extend(spans)
+                sentence_embeddings.append(normalized(np.asarray(record["sentence_embeddings"], dtype=np.float32)))
+
+    n = len(embeddings)
+    if not n:
+        print("No articles with embeddings found")
+        return 1
+
+    matrix = normalized(np.vstack(embeddings))
+    np.save(os.path.join(args.output, "embeddings.npy"), matrix.astype(dtype))
+    if args.quantize == "int8":
+        codes, scales = quantize_int8(matrix)
+        np.save(os.path.join(args.output, "embeddings_int8.npy"), codes)
+        np.save(os.path.join(args.output, "int8_scales.npy"), scales)
+    elif args.quantize == "binary":
+        np.save(os.path.join(args.output, "embeddings_binary.npy"), quantize_binary(matrix))
+    np.save(os.path.join(args.output, "dates.npy"), np.asarray(days, dtype=np.int32))
+    np.save(os.path.join(args.output, "topics.npy"), np.asarray(topic_codes, dtype=np.int16))
+    np.save(os.path.join(args.output, "offsets.npy"), np.asarray(offsets, dtype=np.int64))
+
+    sentence_indptr = np.concatenate([[0], np.cumsum(sentence_counts)]).astype(np.int64)
+    np.save(os.path.join(args.output, "sentence_indptr.npy"), sentence_indptr)
+    np.save(os.path.join(args.output, "sentence_spans.npy"), np.asarray(sentence_spans, dtype=np.int32).reshape(-1, 2))
+    np.save(
+        os.path.join(args.output, "sentence_embeddings.npy"),
+        (np.vstack(sentence_embeddings) if sentence_embeddings else np.zeros((0, matrix.shape[1]))).astype(dtype)
+    )
+    print(f"{n} articles, {int(sentence_indptr[-1])} sentences written")
+
+    entity_keys, entity_indptr, entity_rows = [], np.zeros(1, dtype=np.int64), np.zeros(0, dtype=np.int32)
+    if args.ner:
+        from models.nlp import NLPModel
+
+        entities = NLPModel().extract_entities_batch(texts)
+        entity_keys, entity_indptr, entity_rows = build_entity_index(entities)
+        print(f"{len(entity_keys)} entity keys, {len(entity_rows)} postings")
+    with open(os.path.join(args.output, "entity_keys.json"), "w", encoding="utf-8") as f:
+        json.dump(entity_keys, f, ensure_ascii=False)
+    np.save(os.path.join(args.output, "entity_indptr.npy"), entity_indptr)
+    np.save(os.path.join(args.output, "entity_rows.npy"), entity_rows)
+
+    if args.bm25:
+        terms = save_bm25_index(args.output, texts)
+        print(f"BM25 index written ({terms} terms)")
+
+    if args.hnsw:
+        import hnswlib
+
+        index = hnswlib.Index(space="ip", dim=matrix.shape[1])
+        index.init_index(max_elements=n, ef_construction=args.ef_construction, M=args.m)
+        index.add_items(matrix, np.arange(n))
+        index.save_index(os.path.join(args.output, "hnsw.bin"))
+        print(f"HNSW index built (M={args.m}, ef_construction={args.ef_construction})")
+
+    with open(os.path.join(args.output, "meta.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "count": n,
+            "dim": int(matrix.shape[1]),
+            "dtype": args.dtype,
+            "topics": list(topics),
+            "hnsw": bool(args.hnsw),
+            "bm25": bool(args.bm25),
+            "quantization": args.quantize,
+        }, f, ensure_ascii=False)
+    print(f"Local index written to {args.output} in {time.perf_counter() - start:.1f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--output", default="data/local_index")
+    parser.add_argument("--dtype", choices=["float16", "float32"], default="float16")
+    parser.add_argument("--hnsw", action="store_true", help="Build an HNSW graph (requires hnswlib)")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=200)
+    parser.add_argument("--ner", action="store_true", help="Index spaCy entities for entity filters")
+    parser.add_argument("--quantize", choices=QUANTIZATIONS, help="Quantized codes for the first pass of exact scans")
+    parser.add_argument("--bm25", action="store_true", help="Build a BM25 index of the content for hybrid search")
+    sys.exit(main(parser.parse_args()))
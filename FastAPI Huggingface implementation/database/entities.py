@@ -0,0 +1,13 @@
+import re
+import unicodedata
+
+_ENTITY_TOKEN = re.compile(r"\w+")
+
+def normalize_entity(text: str) -> str:
+    """Accent- and case-insensitive key of an entity mention, as stored in
+    articles.ner.norm_word: casefolded, without combining marks, tokens
+    joined by single spaces. The trigger of migration 007 fills the column
+    for new rows with articles.normalize_entity, its SQL counterpart."""
+    text = unicodedata.normalize("NFKD", text.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(_ENTITY_TOKEN.findall(text))
@@ -0,0 +1,98 @@
+import os
+import json
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from spacy.lang.pt.stop_words import STOP_WORDS
+
+from database.entities import normalize_entity
+
+# Stop words in the normalized form of the terms (casefolded, no accents),
+# matching what the portuguese text search configuration drops
+_STOP_WORDS = frozenset(normalize_entity(word) for word in STOP_WORDS)
+
+
+def tokenize(text: str) -> List[str]:
+    """Index terms of a text: casefolded, accent-free words without stop words"""
+    return [token for token in normalize_entity(text).split() if token not in _STOP_WORDS and len(token) > 1]
+
+
+def build_bm25_index(texts: Iterable[str]) -> Tuple[List[str], np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """CSR inverted index of the texts: the rows and term frequencies of
+    term i are docs[indptr[i]:indptr[i + 1]] and tf[indptr[i]:indptr[i + 1]]"""
+    postings: Dict[str, List[Tuple[int, int]]] = {}
+    lengths = []
+    for row, text in enumerate(texts):
+        terms = tokenize(text)
+        lengths.append(len(terms))
+        counts: Dict[str, int] = {}
+        for term in terms:
+            counts[term] = counts.get(term, 0) + 1
+        for term, count in counts.items():
+            postings.setdefault(term, []).append((row, count))
+
+    vocabulary = sorted(postings)
+    indptr = np.zeros(len(vocabulary) + 1, dtype=np.int64)
+    for i, term in enumerate(vocabulary):
+        indptr[i + 1] = indptr[i] + len(postings[term])
+    docs = np.fromiter((row for term in vocabulary for row, _ in postings[term]), dtype=np.int32, count=indptr[-1])
+    tf = np.fromiter((count for term in vocabulary for _, count in postings[term]), dtype=np.float32, count=indptr[-1])
+    return vocabulary, indptr, docs, tf, np.asarray(lengths, dtype=np.float32)
+
+
+def save_bm25_index(path: str, texts: Iterable[str]) -> int:
+    """Write the BM25 index files of the texts; returns the vocabulary size"""
+    vocabulary, indptr, docs, tf, lengths = build_bm25_index(texts)
+    with open(os.path.join(path, "bm25_vocabulary.json"), "w", encoding="utf-8") as f:
+        json.dump(vocabulary, f, ensure_ascii=False)
+    np.save(os.path.join(path, "bm25_indptr.npy"), indptr)
+    np.save(os.path.join(path, "bm25_docs.npy"), docs)
+    np.save(os.path.join(path, "bm25_tf.npy"), tf)
+    np.save(os.path.join(path, "bm25_lengths.npy"), lengths)
+    return len(vocabulary)
+
+
+class BM25Index:
+    """Okapi BM25 over the inverted index written by save_bm25_index"""
+
+    def __init__(self, path: str, k1: float = None, b: float = None):
+        self.k1 = k1 or float(os.getenv("BM25_K1", "1.2"))
+        self.b = b if b is not None else float(os.getenv("BM25_B", "0.75"))
+
+        with open(os.path.join(path, "bm25_vocabulary.json"), "r", encoding="utf-8") as f:
+            self.vocabulary = {term: i for i, term in enumerate(json.load(f))}
+        self.indptr = np.load(os.path.join(path, "bm25_indptr.npy"))
+        self.docs = np.load(os.path.join(path, "bm25_docs.npy"), mmap_mode="r")
+        self.tf = np.load(os.path.join(path, "bm25_tf.npy"), mmap_mode="r")
+        lengths = np.load(os.path.join(path, "bm25_lengths.npy"))
+
+        self.count = len(lengths)
+        # Length normalization of each document, precomputed
+        self.norms = self.k1 * (1 - self.b + self.b * lengths / max(lengths.mean(), 1))
+
+    def search(self, text: str, limit: int, mask: Optional[np.ndarray] = None) -> np.ndarray:
+        """Rows of the limit best-scoring documents passing the mask, best first"""
+        rows, scores = [], []
+        for term in set(tokenize(text)):
+            i = self.vocabulary.get(term)
+            if i is None:
+                continue
+            docs = np.asarray(self.docs[self.indptr[i]:self.indptr[i + 1]])
+            tf = np.asarray(self.tf[self.indptr[i]:self.indptr[i + 1]])
+            idf = np.log(1 + (self.count - len(docs) + 0.5) / (len(docs) + 0.5))
+            rows.append(docs)
+            scores.append(idf * tf * (self.k1 + 1) / (tf + self.norms[docs]))
+
+        if not rows:
+            return np.zeros(0, dtype=np.int64)
+
+        # Sum the scores of the terms per document
+        rows, inverse = np.unique(np.concatenate(rows), return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate(scores))
+        if mask is not None:
+            keep = mask[rows]
+            rows, totals = rows[keep], totals[keep]
+        if len(rows) > limit:
+            top = np.argpartition(-totals, limit)[:limit]
+            rows, totals = rows[top], totals[top]
+        return rows[np.argsort(-totals, kind="stable")].astype(np.int64)
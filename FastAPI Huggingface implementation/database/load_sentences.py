@@ -0,0 +1,82 @@
+"""
+Load precomputed sentence spans and embeddings into articles.article_sentences.
+
+Reads the JSON lines written by "3-Preprocessing and Embeddings.py", matches
+each record to its row in articles.articles by URL and replaces the stored
+sentences of that article. Run from the API directory with the same DB_*
+environment variables as the API:
+
+    python -m database.load_sentences data/articles_done/publico2023.json
+"""
+
+import sys
+import json
+import argparse
+
+import numpy as np
+import psycopg
+from pgvector.psycopg import register_vector
+
+from database.query import database_conninfo
+
+
+def read_records(path: str):
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                if record.get("sentence_spans"):
+                    yield record
+
+
+def load_batch(conn, batch):
+    urls = [record["url"] for record in batch]
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "SELECT url, article_id FROM articles.articles WHERE url = ANY(%s)",
+            (urls,)
+        )
+        article_ids = dict(cursor.fetchall())
+
+        matched = [record for record in batch if record["url"] in article_ids]
+        cursor.execute(
+            "DELETE FROM articles.article_sentences WHERE article_id = ANY(%s)",
+            ([article_ids[record["url"]] for record in matched],)
+        )
+        with cursor.copy(
+            "COPY articles.article_sentences (article_id, sentence_idx, start_char, end_char, embedding) FROM STDIN"
+        ) as copy:
+            for record in matched:
+                article_id = article_ids[record["url"]]
+                for idx, ((start, end), embedding) in enumerate(
+                    zip(record["sentence_spans"], record["sentence_embeddings"])
+                ):
+                    copy.write_row((article_id, idx, start, end, np.asarray(embedding, dtype=np.float32)))
+
+    conn.commit()
+    return len(matched), len(batch) - len(matched)
+
+
+def main(args):
+    loaded = unmatched = 0
+    with psycopg.connect(database_conninfo(), prepare_threshold=None) as conn:
+        register_vector(conn)
+        for path in args.files:
+            batch = []
+            for record in read_records(path):
+                batch.append(record)
+                if len(batch) >= args.batch_size:
+                    counts = load_batch(conn, batch)
+                    loaded, unmatched = loaded + counts[0], unmatched + counts[1]
+                    batch = []
+            if batch:
+                counts = load_batch(conn, batch)
+                loaded, unmatched = loaded + counts[0], unmatched + counts[1]
+            print(f"{path}: {loaded} articles loaded, {unmatched} without a matching URL so far")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="+")
+    parser.add_argument("--batch-size", type=int, default=500)
+    sys.exit(main(parser.parse_args()))
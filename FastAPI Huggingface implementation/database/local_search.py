@@ -0,0 +1,496 @@
+import os
+import json
+import mmap
+import time
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+from database.entities import normalize_entity
+from database.lexical import BM25Index
+from database.quantization import RERANK_FACTORS, hamming_distances, int8_distances, quantize_binary
+
+logger = logging.getLogger(__name__)
+
+# Rows scored per matrix product in scans, bounding the float32 copy; chunks
+# that stay in cache convert float16 and int8 rows markedly faster
+SCAN_CHUNK_ROWS = 16384
+
+# Day number build_local_index.py stores for articles without a date
+NO_DATE = np.iinfo(np.int32).min
+EPOCH = datetime(1970, 1, 1)
+
+
+class LocalSearchService:
+    """In-process search backend with the interface of DatabaseService.
+
+    Serves the index written by database/build_local_index.py: article
+    embeddings memory-mapped as float16 or float32, an optional HNSW graph
+    (hnswlib), boolean filter masks for topics, day numbers for date ranges
+    and an inverted index of entity mentions. Filters are applied as masks;
+    queries keeping at most exact_max_rows rows, or any query without an
+    HNSW graph, are scored exactly, others take over-fetched HNSW candidates
+    and re-rank them exactly against the stored vectors. As in the
+    database, a query whose filters match nothing returns the nearest
+    articles overall. When the index has a BM25 inverted index, queries
+    with query_text fuse its ranking with the vector ranking by reciprocal
+    rank. An index built with --quantize scans int8 or sign-bit codes
+    instead of the vectors and re-ranks rerank_factor times limit
+    candidates exactly.
+    """
+
+    def __init__(self, path: str = None):
+        self.path = path or os.getenv("LOCAL_INDEX_PATH", "data/local_index")
+        self.exact_max_rows = int(os.getenv("LOCAL_SEARCH_EXACT_MAX_ROWS", "50000"))
+        self.overfetch = float(os.getenv("LOCAL_SEARCH_OVERFETCH", "2"))
+        self.max_candidates = int(os.getenv("LOCAL_SEARCH_MAX_CANDIDATES", "2000"))
+        self.ef_search = int(os.getenv("LOCAL_SEARCH_EF", "64"))
+        self.hybrid_candidates = int(os.getenv("SEARCH_HYBRID_CANDIDATES", "40"))
+        self.rrf_k = int(os.getenv("SEARCH_RRF_K", "60"))
+        self.rerank_factor = os.getenv("LOCAL_SEARCH_RERANK_FACTOR")
+
+        self.meta: Dict[str, Any] = {}
+        self.embeddings: np.ndarray = None
+        self.hnsw = None
+        self.bm25: BM25Index = None
+        self.quantization: Optional[str] = None
+        self.codes: np.ndarray = None
+        self._content_file = None
+        self._content: mmap.mmap = None
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    def _load(self):
+        with open(self._file("meta.json"), "r", encoding="utf-8") as f:
+            self.meta = json.load(f)
+
+        self.embeddings = np.load(self._file("embeddings.npy"), mmap_mode="r")
+        self.dates = np.load(self._file("dates.npy"))
+        self.offsets = np.load(self._file("offsets.npy"))
+
+        self.topic_codes = np.load(self._file("topics.npy"))
+        self.topic_masks = {topic: self.topic_codes == code for code, topic in enumerate(self.meta["topics"])}
+
+        with open(self._file("entity_keys.json"), "r", encoding="utf-8") as f:
+            self.entity_keys = {tuple(key): i for i, key in enumerate(json.load(f))}
+        self.entity_indptr = np.load(self._file("entity_indptr.npy"))
+        self.entity_rows = np.load(self._file("entity_rows.npy"))
+
+        self.sentence_indptr = np.load(self._file("sentence_indptr.npy"))
+        self.sentence_spans = np.load(self._file("sentence_spans.npy"))
+        self.sentence_embeddings = np.load(self._file("sentence_embeddings.npy"), mmap_mode="r")
+
+        self._content_file = open(self._file("content.jsonl"), "rb")
+        self._content = mmap.mmap(self._content_file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self.quantization = self.meta.get("quantization")
+        if self.quantization == "int8":
+            self.codes = np.load(self._file("embeddings_int8.npy"), mmap_mode="r")
+            self.scales = np.load(self._file("int8_scales.npy"))
+        elif self.quantization == "binary":
+            self.codes = np.load(self._file("embeddings_binary.npy"), mmap_mode="r")
+        if self.quantization:
+            self.rerank_factor = int(self.rerank_factor or RERANK_FACTORS[self.quantization])
+
+        if self.meta.get("bm25"):
+            self.bm25 = BM25Index(self.path)
+
+        if self.meta.get("hnsw"):
+            import hnswlib
+
+            self.hnsw = hnswlib.Index(space="ip", dim=self.meta["dim"])
+            self.hnsw.load_index(self._file("hnsw.bin"), max_elements=self.meta["count"])
+            self.hnsw.set_ef(self.ef_search)
+
+    async def open(self):
+        """Load the index files; the embedding matrices stay memory-mapped"""
+        await asyncio.to_thread(self._load)
+        logger.info(
+            f"Local search index loaded from {self.path} ({self.meta['count']} articles, "
+            f"{self.meta['dtype']}, {'hnsw' if self.hnsw else 'exact scan'}{', bm25' if self.bm25 else ''}"
+            f"{', ' + self.quantization + ' first pass' if self.quantization else ''})"
+        )
+
+    async def close(self):
+        if self._content:
+            self._content.close()
+            self._content_file.close()
+            self._content = None
+
+    def _article(self, row: int) -> Dict[str, Any]:
+        return json.loads(self._content[self.offsets[row]:self.offsets[row + 1]])
+
+    def _filter_mask(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        topic: Optional[str],
+        entities: Optional[List[Tuple[str, str]]]
+    ) -> Optional[np.ndarray]:
+        """Rows passing the filters; None without filters"""
+        mask = None
+        if start_date and end_date:
+            start = np.datetime64(start_date.date(), "D").astype(np.int64)
+            end = np.datetime64(end_date.date(), "D").astype(np.int64)
+            mask = (self.dates >= start) & (self.dates <= end)
+        if topic:
+            topic_mask = self.topic_masks.get(topic)
+            if topic_mask is None:
+                topic_mask = np.zeros(self.meta["count"], dtype=bool)
+            mask = topic_mask if mask is None else mask & topic_mask
+        if entities:
+            entity_mask = np.zeros(self.meta["count"], dtype=bool)
+            for word, entity_group in entities:
+                i = self.entity_keys.get((normalize_entity(word), entity_group))
+                if i is not None:
+                    entity_mask[self.entity_rows[self.entity_indptr[i]:self.entity_indptr[i + 1]]] = True
+            mask = entity_mask if mask is None else mask & entity_mask
+        return mask
+
+    def _exact(self, query: np.ndarray, limit: int, rows: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-limit rows by cosine distance, over rows or all articles.
+        Quantized indexes scan the codes and re-rank the best candidates."""
+        if self.quantization == "int8":
+            candidates, _ = self._scan(self.codes, lambda codes: int8_distances(codes, self.scales, query),
+                                       limit * self.rerank_factor, rows)
+            return self._rerank(query, limit, candidates)
+        if self.quantization == "binary":
+            query_bits = quantize_binary(query)
+            candidates, _ = self._scan(self.codes, lambda codes: hamming_distances(codes, query_bits),
+                                       limit * self.rerank_factor, rows)
+            return self._rerank(query, limit, candidates)
+        return self._scan(self.embeddings, lambda vectors: 1 - vectors.astype(np.float32) @ query, limit, rows)
+
+    def _exact_many(self, queries: np.ndarray, limit: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """_exact over all articles for each row of queries, converting
+        each chunk of the matrix once for all of them"""
+        if self.quantization == "int8":
+            scaled_queries = (queries * self.scales).T
+            candidates = self._scan_many(self.codes, lambda codes: 1 - codes.astype(np.float32) @ scaled_queries,
+                                         limit * self.rerank_factor)
+            return [self._rerank(query, limit, rows) for query, (rows, _) in zip(queries, candidates)]
+        if self.quantization == "binary":
+            query_bits = quantize_binary(queries)
+            candidates = self._scan_many(
+                self.codes,
+                lambda codes: np.stack([hamming_distances(codes, bits) for bits in query_bits], axis=1),
+                limit * self.rerank_factor
+            )
+            return [self._rerank(query, limit, rows) for query, (rows, _) in zip(queries, candidates)]
+        return self._scan_many(self.embeddings, lambda vectors: 1 - vectors.astype(np.float32) @ queries.T, limit)
+
+    def _rerank(self, query: np.ndarray, limit: int, rows: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Exact top-limit of the candidate rows against the stored vectors"""
+        rows = np.sort(rows)
+        distances = 1 - self.embeddings[rows].astype(np.float32) @ query
+        order = np.argsort(distances, kind="stable")[:limit]
+        return rows[order], distances[order]
+
+    def _scan(
+        self,
+        matrix: np.ndarray,
+        distance,
+        limit: int,
+        rows: Optional[np.ndarray] = None
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Top-limit rows of matrix by the distance function, chunk by chunk"""
+        n = self.meta["count"] if rows is None else len(rows)
+        best_rows, best_distances = [], []
+        for start in range(0, n, SCAN_CHUNK_ROWS):
+            chunk = slice(start, start + SCAN_CHUNK_ROWS)
+            chunk_rows = np.arange(start, min(start + SCAN_CHUNK_ROWS, n)) if rows is None else rows[chunk]
+            distances = distance(matrix[chunk] if rows is None else matrix[chunk_rows])
+            if len(distances) > limit:
+                top = np.argpartition(distances, limit)[:limit]
+                chunk_rows, distances = chunk_rows[top], distances[top]
+            best_rows.append(chunk_rows)
+            best_distances.append(distances)
+
+        rows = np.concatenate(best_rows) if best_rows else np.zeros(0, dtype=np.int64)
+        distances = np.concatenate(best_distances) if best_distances else np.zeros(0, dtype=np.float32)
+        order = np.argsort(distances, kind="stable")[:limit]
+        return rows[order], distances[order]
+
+    def _scan_many(self, matrix: np.ndarray, distance, limit: int) -> List[Tuple[np.ndarray, np.ndarray]]:
+        """_scan of all rows for several queries at once; distance returns
+        one column per query"""
+        n = self.meta["count"]
+        best = None
+        for start in range(0, n, SCAN_CHUNK_ROWS):
+            chunk_rows = np.arange(start, min(start + SCAN_CHUNK_ROWS, n))
+            distances = distance(matrix[start:start + SCAN_CHUNK_ROWS])
+            if best is None:
+                best = [([], []) for _ in range(distances.shape[1])]
+            top = np.argpartition(distances, limit, axis=0)[:limit] if len(distances) > limit else None
+            for j, (best_rows, best_distances) in enumerate(best):
+                column = distances[:, j] if top is None else distances[top[:, j], j]
+                best_rows.append(chunk_rows if top is None else chunk_rows[top[:, j]])
+                best_distances.append(column)
+
+        results = []
+        for best_rows, best_distances in best or []:
+            rows, distances = np.concatenate(best_rows), np.concatenate(best_distances)
+            order = np.argsort(distances, kind="stable")[:limit]
+            results.append((rows[order], distances[order]))
+        return results
+
+    def _ann(
+        self,
+        query: np.ndarray,
+        limit: int,
+        mask: Optional[np.ndarray],
+        selectivity: float,
+        queries: List[Dict[str, Any]]
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """HNSW candidates passing the mask, re-ranked exactly; None when
+        max_candidates are not enough"""
+        candidates = min(max(int(np.ceil(limit / max(selectivity, 1e-9) * self.overfetch)), limit), self.max_candidates)
+        candidates = min(candidates, self.meta["count"])
+        while True:
+            start = time.perf_counter()
+            labels, _ = self.hnsw.knn_query(query, k=candidates)
+            rows = labels[0].astype(np.int64)
+            if mask is not None:
+                rows = rows[mask[rows]]
+            queries.append({
+                "strategy": "ann",
+                "candidates": candidates,
+                "rows": int(min(len(rows), limit)),
+                "ms": (time.perf_counter() - start) * 1000,
+            })
+
+            if len(rows) >= limit or candidates >= min(self.max_candidates, self.meta["count"]):
+                break
+            candidates = min(candidates * 2, self.max_candidates, self.meta["count"])
+
+        if len(rows) < limit and mask is not None:
+            return None
+        return self._rerank(query, limit, rows)
+
+    def _search(
+        self,
+        query_embedding: List[float],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        topic: Optional[str],
+        entities: Optional[List[Tuple[str, str]]],
+        limit: int,
+        query_text: Optional[str] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        search_start = time.perf_counter()
+        query = self._query_vector(query_embedding)
+
+        mask = self._filter_mask(start_date, end_date, topic, entities)
+        filtered_rows = self.meta["count"] if mask is None else int(mask.sum())
+        plan = {"strategy": "exact", "estimated_rows": filtered_rows, "queries": []}
+        hybrid = bool(query_text) and self.bm25 is not None
+        # The vector ranking fused in hybrid mode is its top candidates
+        semantic_limit = max(limit, self.hybrid_candidates) if hybrid else limit
+
+        result = None
+        if filtered_rows:
+            if self.hnsw is not None and filtered_rows > self.exact_max_rows:
+                plan["strategy"] = "ann"
+                result = self._ann(query, semantic_limit, mask, filtered_rows / self.meta["count"], plan["queries"])
+            if result is None:
+                start = time.perf_counter()
+                result = self._exact(query, semantic_limit, None if mask is None else np.flatnonzero(mask))
+                plan["queries"].append({"strategy": "exact", "rows": len(result[0]), "ms": (time.perf_counter() - start) * 1000})
+            if hybrid:
+                fused = self._fuse(query, query_text, limit, mask, result[0], plan["queries"])
+                if fused is not None:
+                    plan["strategy"] = "hybrid"
+                    result = fused
+                else:
+                    # The text matches nothing: the vector ranking alone
+                    result = (result[0][:limit], result[1][:limit])
+
+        fallback = not filtered_rows
+        if fallback:
+            logger.info("No articles found with the filters applied, returned fallback results")
+            start = time.perf_counter()
+            if self.hnsw is not None:
+                labels, _ = self.hnsw.knn_query(query, k=min(limit, self.meta["count"]))
+                result = self._rerank(query, limit, labels[0].astype(np.int64))
+            else:
+                result = self._exact(query, limit)
+            plan["queries"].append({"strategy": "fallback", "rows": len(result[0]), "ms": (time.perf_counter() - start) * 1000})
+
+        articles = self._articles(*result)
+        plan["total_ms"] = (time.perf_counter() - search_start) * 1000
+        return articles, plan
+
+    @staticmethod
+    def _query_vector(query_embedding: List[float]) -> np.ndarray:
+        query = np.asarray(query_embedding, dtype=np.float32)
+        return query / (np.linalg.norm(query) or 1)
+
+    def _articles(self, rows: np.ndarray, distances: np.ndarray) -> List[Dict[str, Any]]:
+        articles = []
+        for row, distance in zip(rows, distances):
+            record = self._article(int(row))
+            day, topic_code = int(self.dates[row]), int(self.topic_codes[row])
+            articles.append({
+                "article_id": int(row),
+                "content": record["content"],
+                "distance": float(distance),
+                "date": EPOCH + timedelta(days=day) if day != NO_DATE else None,
+                "topic": self.meta["topics"][topic_code] if topic_code >= 0 else None,
+                "url": record["url"],
+            })
+        return articles
+
+    def _scans_everything(self, search: Dict[str, Any]) -> bool:
+        """Whether _search would scan every article exactly for the search"""
+        filtered = (search.get("start_date") and search.get("end_date")) or search.get("topic") or search.get("entities")
+        hybrid = search.get("query_text") and self.bm25 is not None
+        index = self.hnsw is not None and self.meta["count"] > self.exact_max_rows
+        return not (filtered or hybrid or index)
+
+    def _batch_search(self, searches: List[Dict[str, Any]]) -> List[Tuple[List[Dict[str, Any]], Dict[str, Any]]]:
+        """_search for each search; unfiltered exact scans share one pass
+        over the embeddings"""
+        results: List[Optional[Tuple[List[Dict[str, Any]], Dict[str, Any]]]] = [None] * len(searches)
+        shared = [i for i, search in enumerate(searches) if self._scans_everything(search)]
+        if len(shared) > 1:
+            start = time.perf_counter()
+            queries = np.vstack([self._query_vector(searches[i]["query_embedding"]) for i in shared])
+            scanned = self._exact_many(queries, max(searches[i].get("limit", 10) for i in shared))
+            ms = (time.perf_counter() - start) * 1000
+            for i, (rows, distances) in zip(shared, scanned):
+                limit = searches[i].get("limit", 10)
+                plan = {
+                    "strategy": "exact",
+                    "estimated_rows": self.meta["count"],
+                    "queries": [{"strategy": "exact", "batch_size": len(shared), "rows": len(rows[:limit]), "ms": ms}],
+                    "total_ms": ms,
+                }
+                results[i] = (self._articles(rows[:limit], distances[:limit]), plan)
+
+        for i, search in enumerate(searches):
+            if results[i] is None:
+                results[i] = self._search(
+                    search["query_embedding"],
+                    search.get("start_date"),
+                    search.get("end_date"),
+                    search.get("topic"),
+                    search.get("entities"),
+                    search.get("limit", 10),
+                    search.get("query_text")
+                )
+        return results
+
+    def _fuse(
+        self,
+        query: np.ndarray,
+        query_text: str,
+        limit: int,
+        mask: Optional[np.ndarray],
+        semantic_rows: np.ndarray,
+        queries: List[Dict[str, Any]]
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Reciprocal rank fusion of the BM25 and vector rankings, with the
+        exact distances of the fused rows; None when no row passing the mask
+        matches the text"""
+        start = time.perf_counter()
+        lexical_rows = self.bm25.search(query_text, self.hybrid_candidates, mask)
+        if not len(lexical_rows):
+            queries.append({"strategy": "hybrid", "candidates": 0, "rows": 0, "ms": (time.perf_counter() - start) * 1000})
+            return None
+        scores: Dict[int, float] = {}
+        for ranking in (lexical_rows, semantic_rows):
+            for rank, row in enumerate(ranking.tolist(), start=1):
+                scores[row] = scores.get(row, 0.0) + 1.0 / (self.rrf_k + rank)
+
+        rows = np.asarray(sorted(scores, key=scores.get, reverse=True)[:limit], dtype=np.int64)
+        distances = 1 - self.embeddings[rows].astype(np.float32) @ query
+        queries.append({
+            "strategy": "hybrid",
+            "candidates": len(lexical_rows),
+            "rows": len(rows),
+            "ms": (time.perf_counter() - start) * 1000,
+        })
+        return rows, distances
+
+    async def semantic_search(
+        self,
+        query_embedding: List[float],
+        start_date: Optional[datetime] = None,
+        end_date: Optional[datetime] = None,
+        topic: Optional[str] = None,
+        entities: Optional[List[Tuple[str, str]]] = None,
+        limit: int = 10,
+        report: Optional[Dict[str, Any]] = None,
+        query_text: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        logger.info(f"Searching with entities: {entities}")
+        try:
+            articles, plan = await asyncio.to_thread(
+                self._search, query_embedding, start_date, end_date, topic, entities, limit, query_text
+            )
+        except Exception as e:
+            logger.error(f"Local search error: {e}")
+            return []
+
+        logger.info(f"Local search: {plan['strategy']} over {plan['estimated_rows']} rows in {plan['total_ms']:.1f}ms")
+        if report is not None:
+            report.update(plan)
+        return articles
+
+    async def batch_semantic_search(
+        self,
+        searches: List[Dict[str, Any]],
+        reports: Optional[List[Dict[str, Any]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """semantic_search for each dict of its keyword arguments, in one
+        worker thread"""
+        try:
+            results = await asyncio.to_thread(self._batch_search, searches)
+        except Exception as e:
+            logger.error(f"Local batch search error: {e}")
+            return [[] for _ in searches]
+
+        logger.info(f"Local batch search: {len(searches)} searches")
+        if reports is not None:
+            for report, (_, plan) in zip(reports, results):
+                report.update(plan)
+        return [articles for articles, _ in results]
+
+    async def fetch_sentences(self, article_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        """Precomputed sentence spans and embeddings of the given articles"""
+        sentences = {}
+        for article_id in article_ids:
+            start, end = self.sentence_indptr[article_id], self.sentence_indptr[article_id + 1]
+            if end > start:
+                sentences[article_id] = {
+                    "spans": [tuple(span) for span in self.sentence_spans[start:end].tolist()],
+                    "embeddings": np.asarray(self.sentence_embeddings[start:end], dtype=np.float32),
+                }
+        return sentences
+
+    async def fetch_entity_vocabulary(self, since_article_id: int = 0) -> Optional[Tuple[List[Tuple[str, str, int]], int]]:
+        """Entity vocabulary for the gazetteer; the local index is static,
+        so only the first call returns rows"""
+        last_article_id = self.meta["count"]
+        if since_article_id >= last_article_id:
+            return [], since_article_id
+        rows = [
+            (word, entity_group, int(self.entity_indptr[i + 1] - self.entity_indptr[i]))
+            for (word, entity_group), i in self.entity_keys.items()
+        ]
+        return rows, last_article_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "local",
+            "path": self.path,
+            "articles": self.meta.get("count"),
+            "dtype": self.meta.get("dtype"),
+            "index": "hnsw" if self.hnsw else "exact",
+            "quantization": self.quantization,
+            "lexical": "bm25" if self.bm25 else None,
+        }
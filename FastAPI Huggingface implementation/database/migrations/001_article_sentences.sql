@@ -0,0 +1,16 @@
+-- Sentence segmentation and sentence embeddings of each article, computed
+-- offline by "3-Preprocessing and Embeddings.py" and loaded with
+-- database/load_sentences.py. QueryProcessor reads them for the LexRank
+-- stage instead of re-running spaCy and MiniLM on every query.
+
+CREATE TABLE IF NOT EXISTS articles.article_sentences (
+    -- Same type as articles.articles.article_id
+    article_id BIGINT NOT NULL REFERENCES articles.articles (article_id) ON DELETE CASCADE,
+    sentence_idx INTEGER NOT NULL,
+    -- Character offsets of the sentence within articles.content
+    start_char INTEGER NOT NULL,
+    end_char INTEGER NOT NULL,
+    -- paraphrase-multilingual-MiniLM-L12-v2 embedding of the sentence
+    embedding vector(384) NOT NULL,
+    PRIMARY KEY (article_id, sentence_idx)
+);
@@ -0,0 +1,19 @@
+-- Normalized entity key for the entity filter of semantic_search.
+--
+-- norm_word holds database.entities.normalize_entity(word): casefolded, without
+-- accents and with punctuation collapsed to single spaces. It replaces the
+-- per-row LOWER(UNACCENT(word)) comparison, so the lookup of each query
+-- entity is a scan of the index below instead of a pass over articles.ner.
+--
+-- Apply in three steps:
+--   1. the ALTER TABLE below;
+--   2. python -m database.backfill_norm_word, which fills norm_word for
+--      every row where it is NULL (new NER rows are filled by the trigger
+--      of migration 007);
+--   3. the CREATE INDEX below, after the backfill so it is built once.
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+
+ALTER TABLE articles.ner ADD COLUMN IF NOT EXISTS norm_word TEXT;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ner_norm_word_entity_group_article_id_idx
+    ON articles.ner (norm_word, entity_group, article_id);
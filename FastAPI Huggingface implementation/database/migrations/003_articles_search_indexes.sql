@@ -0,0 +1,18 @@
+-- Indexes behind the two search strategies of DatabaseService (see
+-- database/planner.py):
+--   * "ann" reads the nearest candidates from an HNSW index on the article
+--     embeddings and filters them;
+--   * "prefilter" scans the rows passing narrow date/topic filters exactly,
+--     found through the B-tree indexes; its queries order by an expression
+--     the HNSW index cannot serve, so they never go through it.
+-- Skip any index an existing one already covers. CREATE INDEX CONCURRENTLY
+-- cannot run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS articles_embedding_hnsw_idx
+    ON articles.articles USING hnsw (embedding vector_cosine_ops);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS articles_date_idx
+    ON articles.articles (date);
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS articles_topic_date_idx
+    ON articles.articles (topic, date);
@@ -0,0 +1,108 @@
+-- Partition articles.articles by publication year.
+--
+-- Each yearly partition gets its own HNSW and (topic, date) indexes, and
+-- DatabaseService searches date-filtered queries partition by partition
+-- (only the partitions overlapping the requested window, top-k from each,
+-- then merged), so a one-month query scans one year instead of the corpus.
+-- The service reads the partition bounds from the catalog at startup; the
+-- unpartitioned table keeps working with the same code.
+--
+-- The primary key of a partitioned table must contain the partition key, so
+-- it becomes (article_id, date), and foreign keys referencing article_id
+-- alone (articles.article_sentences, and articles.ner if it has one) are
+-- dropped. The key makes date NOT NULL, so rows without a date are not
+-- copied: they stay in the old table, kept as articles.articles_unpartitioned,
+-- and their number is reported before the copy. Give them a date and insert
+-- them, or accept losing them, before dropping the old table once the new
+-- one is verified. Run in a maintenance window: the copy and the index
+-- builds lock the tables. Add next year's partition before it starts, e.g.
+--   CREATE TABLE articles.articles_2026 PARTITION OF articles.articles
+--       FOR VALUES FROM ('2026-01-01') TO ('2027-01-01');
+-- Rows outside every partition go to articles.articles_default.
+
+BEGIN;
+
+CREATE TABLE articles.articles_by_year (
+    LIKE articles.articles INCLUDING DEFAULTS INCLUDING IDENTITY,
+    PRIMARY KEY (article_id, date)
+) PARTITION BY RANGE (date);
+
+-- One partition per year present in the data, plus the next one
+DO $$
+DECLARE
+    y INTEGER;
+BEGIN
+    FOR y IN
+        SELECT generate_series(
+            EXTRACT(YEAR FROM MIN(date))::INTEGER,
+            EXTRACT(YEAR FROM MAX(date))::INTEGER + 1
+        )
+        FROM articles.articles
+    LOOP
+        EXECUTE format(
+            'CREATE TABLE articles.articles_%s PARTITION OF articles.articles_by_year FOR VALUES FROM (%L) TO (%L)',
+            y, make_date(y, 1, 1), make_date(y + 1, 1, 1)
+        );
+    END LOOP;
+END $$;
+
+CREATE TABLE articles.articles_default PARTITION OF articles.articles_by_year DEFAULT;
+
+DO $$
+DECLARE
+    undated BIGINT;
+BEGIN
+    SELECT COUNT(*) INTO undated FROM articles.articles WHERE date IS NULL;
+    IF undated > 0 THEN
+        RAISE WARNING '% articles without a date are not copied and stay in articles.articles_unpartitioned', undated;
+    END IF;
+END $$;
+
+INSERT INTO articles.articles_by_year SELECT * FROM articles.articles WHERE date IS NOT NULL;
+
+-- Created on every partition
+CREATE INDEX ON articles.articles_by_year USING hnsw (embedding vector_cosine_ops);
+CREATE INDEX ON articles.articles_by_year (topic, date);
+CREATE INDEX ON articles.articles_by_year (url);
+
+DO $$
+DECLARE
+    fk RECORD;
+BEGIN
+    FOR fk IN
+        SELECT conrelid::regclass AS referencing_table, conname
+        FROM pg_constraint
+        WHERE contype = 'f' AND confrelid = 'articles.articles'::regclass
+    LOOP
+        EXECUTE format('ALTER TABLE %s DROP CONSTRAINT %I', fk.referencing_table, fk.conname);
+    END LOOP;
+END $$;
+
+ALTER TABLE articles.articles RENAME TO articles_unpartitioned;
+ALTER TABLE articles.articles_by_year RENAME TO articles;
+
+-- A serial article_id keeps using the old table's sequence; move its
+-- ownership so dropping the old table does not drop it. Identity columns
+-- got a new sequence, which setval below advances.
+DO $$
+DECLARE
+    seq TEXT := pg_get_serial_sequence('articles.articles_unpartitioned', 'article_id');
+BEGIN
+    IF seq IS NOT NULL AND (
+        SELECT attidentity = '' FROM pg_attribute
+        WHERE attrelid = 'articles.articles_unpartitioned'::regclass AND attname = 'article_id'
+    ) THEN
+        EXECUTE format('ALTER SEQUENCE %s OWNED BY articles.articles.article_id', seq);
+    END IF;
+END $$;
+
+-- New rows continue after the old ids, including those of undated rows
+-- left behind, so they can still be inserted later
+SELECT setval(
+    pg_get_serial_sequence('articles.articles', 'article_id'),
+    (SELECT MAX(article_id) FROM articles.articles_unpartitioned)
+);
+
+COMMIT;
+
+ANALYZE articles.articles;
@@ -0,0 +1,22 @@
+-- Full-text search over article content for hybrid retrieval
+-- (SEARCH_MODE=hybrid), which fuses a lexical ranking with the vector
+-- ranking by reciprocal rank fusion.
+--
+-- articles.portuguese_unaccent is the built-in Portuguese configuration
+-- (stop words and Snowball stemmer) with accents stripped first, so
+-- "eleicoes" and "eleições" match; it uses the unaccent extension the
+-- entity filter already relies on. content_tsv is a stored generated
+-- column, kept up to date by Postgres and created on every partition when
+-- articles.articles is partitioned (migration 004). The GIN index cannot be
+-- built CONCURRENTLY on a partitioned table; drop CONCURRENTLY when running
+-- this after migration 004.
+
+CREATE TEXT SEARCH CONFIGURATION articles.portuguese_unaccent (COPY = pg_catalog.portuguese);
+ALTER TEXT SEARCH CONFIGURATION articles.portuguese_unaccent
+    ALTER MAPPING FOR hword, hword_part, word WITH unaccent, portuguese_stem;
+
+ALTER TABLE articles.articles ADD COLUMN IF NOT EXISTS content_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('articles.portuguese_unaccent', coalesce(content, ''))) STORED;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS articles_content_tsv_idx
+    ON articles.articles USING gin (content_tsv);
@@ -0,0 +1,11 @@
+-- HNSW index over binary-quantized article embeddings, for the "ann"
+-- strategy with SEARCH_QUANTIZATION=binary: the index holds one sign bit
+-- per dimension (48 bytes per article instead of 1536) and is searched by
+-- Hamming distance; DatabaseService re-ranks the over-fetched candidates
+-- exactly against the stored vectors, so the embedding column stays.
+-- Requires pgvector 0.7 or later. The expression must match the one in
+-- BINARY_ANN_SEARCH_QUERY, including the dimension of the embeddings.
+-- As in migration 005, drop CONCURRENTLY on a partitioned articles table.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS articles_embedding_binary_hnsw_idx
+    ON articles.articles USING hnsw ((binary_quantize(embedding)::bit(384)) bit_hamming_ops);
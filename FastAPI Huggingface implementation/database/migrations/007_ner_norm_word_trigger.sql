@@ -0,0 +1,40 @@
+-- Keep articles.ner.norm_word (migration 002) filled for NER rows written
+-- after the backfill, which would otherwise keep a NULL key and never match
+-- the entity filter of semantic_search.
+--
+-- articles.normalize_entity is the SQL form of
+-- database.entities.normalize_entity: lowercased, accents stripped by the
+-- unaccent extension, runs of non-word characters collapsed to single
+-- spaces. The trigger fills norm_word on insert when the writer leaves it
+-- NULL and recomputes it when word changes; writers that compute the key
+-- with the Python function keep their value. lower() differs from
+-- str.casefold() only for a few non-Portuguese letters such as the German
+-- sharp s, and [:alnum:] follows the database's LC_CTYPE, so a UTF-8
+-- locale is assumed, as for the Portuguese text search configuration.
+--
+-- Run python -m database.backfill_norm_word once more after applying this,
+-- for rows loaded between the backfill and the trigger.
+
+CREATE OR REPLACE FUNCTION articles.normalize_entity(word text) RETURNS text
+    LANGUAGE sql STABLE STRICT PARALLEL SAFE
+    AS $$
+        SELECT btrim(regexp_replace(unaccent(lower(word)), '[^[:alnum:]_]+', ' ', 'g'))
+    $$;
+
+CREATE OR REPLACE FUNCTION articles.ner_fill_norm_word() RETURNS trigger
+    LANGUAGE plpgsql
+    AS $$
+    BEGIN
+        IF NEW.norm_word IS NULL
+            OR (TG_OP = 'UPDATE' AND NEW.word IS DISTINCT FROM OLD.word AND NEW.norm_word IS NOT DISTINCT FROM OLD.norm_word)
+        THEN
+            NEW.norm_word := articles.normalize_entity(NEW.word);
+        END IF;
+        RETURN NEW;
+    END
+    $$;
+
+DROP TRIGGER IF EXISTS ner_fill_norm_word ON articles.ner;
+CREATE TRIGGER ner_fill_norm_word
+    BEFORE INSERT OR UPDATE OF word, norm_word ON articles.ner
+    FOR EACH ROW EXECUTE FUNCTION articles.ner_fill_norm_word();
@@ -0,0 +1,164 @@
+import os
+import math
+import time
+import logging
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from services.cache import LRUCache
+
+logger = logging.getLogger(__name__)
+
+# Search strategies: exact scan of the rows passing the filters, or the HNSW
+# index first with the filters applied to an over-fetched candidate set
+STRATEGIES = ("prefilter", "ann")
+
+
+def _month_end(month: date) -> date:
+    return (month.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+class SearchPlanner:
+    """Chooses the search strategy of a query from its estimated filter
+    selectivity.
+
+    Article counts per (topic, month) are loaded from the database and
+    refreshed every stats_ttl seconds; entity filters are estimated from
+    the number of articles mentioning each entity. Queries whose exact scan
+    reads at most prefilter_max_rows rows are scanned exactly; broader ones go
+    through the vector index, fetching enough candidates that limit of them
+    are expected to pass the filters. SEARCH_STRATEGY forces a strategy.
+    """
+
+    def __init__(
+        self,
+        strategy: str = None,
+        prefilter_max_rows: int = None,
+        overfetch: float = None,
+        max_candidates: int = None,
+        stats_ttl: float = None
+    ):
+        self.strategy = (strategy or os.getenv("SEARCH_STRATEGY", "auto")).lower()
+        if self.strategy not in ("auto",) + STRATEGIES:
+            raise ValueError(f"Unknown SEARCH_STRATEGY '{self.strategy}', expected 'auto' or one of {STRATEGIES}")
+        self.prefilter_max_rows = prefilter_max_rows or int(os.getenv("SEARCH_PREFILTER_MAX_ROWS", "20000"))
+        self.overfetch = overfetch or float(os.getenv("SEARCH_ANN_OVERFETCH", "2"))
+        # hnsw.ef_search accepts at most 1000
+        self.max_candidates = max_candidates or int(os.getenv("SEARCH_ANN_MAX_CANDIDATES", "1000"))
+        self.stats_ttl = stats_ttl or float(os.getenv("SEARCH_STATS_TTL", "3600"))
+
+        self.total = 0
+        # (topic, first day of month) -> number of articles
+        self.counts: Dict[Tuple[Optional[str], date], int] = {}
+        self.loaded_at: Optional[float] = None
+        # (norm_word, entity_group) -> number of articles mentioning it
+        self.entity_counts = LRUCache(
+            max_entries=int(os.getenv("SEARCH_ENTITY_COUNT_CACHE_SIZE", "4096")),
+            ttl=self.stats_ttl,
+            name="entity counts"
+        )
+
+    @property
+    def stale(self) -> bool:
+        return self.loaded_at is None or time.monotonic() - self.loaded_at > self.stats_ttl
+
+    def set_statistics(self, rows: Iterable[Tuple[Optional[str], Any, int]]):
+        counts = {}
+        for topic, month, count in rows:
+            if isinstance(month, datetime):
+                month = month.date()
+            counts[(topic, month)] = count
+        self.counts = counts
+        self.total = sum(counts.values())
+        self.loaded_at = time.monotonic()
+        self.entity_counts.clear()
+
+    def estimate_rows(
+        self,
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        topic: Optional[str]
+    ) -> Optional[float]:
+        """Expected number of articles passing the date and topic filters,
+        prorating months the date range covers partially; None before the
+        statistics are loaded."""
+        if self.loaded_at is None:
+            return None
+        if start_date is None and topic is None:
+            return float(self.total)
+
+        rows = 0.0
+        for (month_topic, month), count in self.counts.items():
+            if topic is not None and month_topic != topic:
+                continue
+            if start_date is None:
+                rows += count
+                continue
+
+            month_end = _month_end(month)
+            overlap_start = max(month, start_date.date())
+            # BETWEEN includes the end date
+            overlap_end = min(month_end, end_date.date() + timedelta(days=1))
+            if overlap_end > overlap_start:
+                rows += count * (overlap_end - overlap_start).days / (month_end - month).days
+        return rows
+
+    def plan(
+        self,
+        limit: int,
+        filtered_rows: Optional[float],
+        entity_rows: Optional[float] = None
+    ) -> Dict[str, Any]:
+        """Strategy and ANN candidate count for a query. entity_rows is the
+        number of articles matching its entity filter, if it has one."""
+        if filtered_rows is None or not self.total:
+            plan = {"strategy": "prefilter", "estimated_rows": None, "scan_rows": None, "selectivity": None}
+            if self.strategy != "auto":
+                plan["strategy"] = self.strategy
+            if plan["strategy"] == "ann":
+                plan["candidates"] = self.max_candidates
+            return plan
+
+        # The exact scan reads the articles of the entities or those passing
+        # the date/topic filters, whichever is smaller; the filters are
+        # assumed independent for the number of rows passing all of them
+        scan_rows = filtered_rows
+        selectivity = filtered_rows / self.total
+        if entity_rows is not None:
+            scan_rows = min(filtered_rows, entity_rows)
+            selectivity *= min(entity_rows, self.total) / self.total
+
+        strategy = self.strategy
+        if strategy == "auto":
+            strategy = "prefilter" if scan_rows <= self.prefilter_max_rows else "ann"
+
+        plan = {
+            "strategy": strategy,
+            "estimated_rows": round(selectivity * self.total),
+            "scan_rows": round(scan_rows),
+            "selectivity": selectivity,
+        }
+        if strategy == "ann":
+            wanted = limit / max(selectivity, 1e-9) * self.overfetch if selectivity < 1 else limit
+            plan["candidates"] = int(min(max(math.ceil(wanted), limit), self.max_candidates))
+        return plan
+
+    def cached_entity_rows(self, entities: List[Tuple[str, str]]) -> Tuple[float, List[Tuple[str, str]]]:
+        """Articles mentioning the cached entities (an upper bound of the
+        union) and the entities whose counts are not cached"""
+        rows, missing = 0.0, []
+        for entity in entities:
+            count = self.entity_counts.get(entity)
+            if count is None:
+                missing.append(entity)
+            else:
+                rows += count
+        return rows, missing
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "strategy": self.strategy,
+            "articles": self.total,
+            "stats_age_seconds": time.monotonic() - self.loaded_at if self.loaded_at else None,
+            "entity_counts": self.entity_counts.stats(),
+        }
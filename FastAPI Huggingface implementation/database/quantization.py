@@ -0,0 +1,45 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+# Compressed first-pass representations of the L2-normalized embeddings:
+#   int8    per-dimension scalar quantization, 1 byte per dimension
+#   binary  sign bits packed 8 per byte, compared by Hamming distance
+# The first pass over-fetches candidates that are re-ranked exactly against
+# the float vectors.
+QUANTIZATIONS = ("int8", "binary")
+
+# Default candidates re-ranked per result; with synthetic 384-dimensional
+# data (benchmarks/quantization.py) int8 reaches recall@10 of 1.0 from 2x,
+# binary needs far more and still misses some at 10x
+RERANK_FACTORS = {"int8": 4, "binary": 10}
+
+# Set bits of every byte value, for numpy versions without bitwise_count
+_POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None], axis=1).sum(axis=1).astype(np.uint16)
+
+
+def quantize_int8(embeddings: np.ndarray, scales: Optional[np.ndarray] = None) -> Tuple[np.ndarray, np.ndarray]:
+    """int8 codes and the per-dimension scales with embeddings ~ codes * scales"""
+    if scales is None:
+        scales = np.abs(embeddings).max(axis=0) / 127
+        scales = np.where(scales == 0, 1, scales).astype(np.float32)
+    codes = np.clip(np.rint(embeddings / scales), -127, 127).astype(np.int8)
+    return codes, scales
+
+
+def quantize_binary(embeddings: np.ndarray) -> np.ndarray:
+    """Sign bits of the embeddings, packed along the last axis"""
+    return np.packbits(embeddings > 0, axis=-1)
+
+
+def int8_distances(codes: np.ndarray, scales: np.ndarray, query: np.ndarray) -> np.ndarray:
+    """Approximate cosine distances of the quantized rows to a float query"""
+    return 1 - codes.astype(np.float32) @ (query * scales)
+
+
+def hamming_distances(bits: np.ndarray, query_bits: np.ndarray) -> np.ndarray:
+    """Number of differing sign bits of each row and the query"""
+    differing = np.bitwise_xor(bits, query_bits)
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(differing).sum(axis=1, dtype=np.uint16)
+    return _POPCOUNT[differing].sum(axis=1, dtype=np.uint16)
@@ -1,17 +1,429 @@
 import os
-from typing import List, Dict, Optional,Tuple
+import re
+import time
+import asyncio
+import logging
+from typing import Any, List, Dict, Optional, Tuple, Union
 from datetime import datetime
-import psycopg2
-from psycopg2 import sql
+import numpy as np
+from psycopg import sql
+from psycopg.conninfo import make_conninfo
+from psycopg_pool import AsyncConnectionPool
+from pgvector.psycopg import register_vector_async
+
+from database.entities import normalize_entity
+from database.planner import SearchPlanner
+from database.quantization import RERANK_FACTORS
+
+logger = logging.getLogger(__name__)
+
+# Both queries have a fixed text so the server can reuse their plans: every
+# filter is a bound parameter and a NULL parameter disables its filter. The
+# embedding is bound with %b so it is sent in pgvector's binary format. The
+# unfiltered fallback is a second UNION ALL branch guarded by NOT EXISTS,
+# which the planner evaluates once, so it only scans when the filtered
+# branch came back empty and the whole search costs a single round trip.
+# The filtered branch orders by the distance plus zero, an expression the
+# HNSW index cannot serve: ordered by the bare distance, Postgres may walk
+# the index and filter its ef_search nearest rows afterwards, which leaves
+# narrow filters with few or no results instead of an exact scan.
+SEARCH_QUERY = '''
+    WITH hits AS (
+        SELECT
+            a.article_id,
+            a.content,
+            (a.embedding <=> %(embedding)b) + 0 AS distance,
+            a.date,
+            a.topic,
+            a.url
+        FROM articles.articles a
+        WHERE (%(start_date)s::timestamp IS NULL OR a.date BETWEEN %(start_date)s AND %(end_date)s)
+        AND (%(topic)s::text IS NULL OR a.topic = %(topic)s)
+        ORDER BY distance
+        LIMIT %(limit)s
+    )
+    SELECT article_id, content, distance, date, topic, url, FALSE AS fallback FROM hits
+    UNION ALL
+    (
+        SELECT article_id, content, embedding <=> %(embedding)b AS distance, date, topic, url, TRUE
+        FROM articles.articles
+        WHERE NOT EXISTS (SELECT 1 FROM hits)
+        ORDER BY distance
+        LIMIT %(limit)s
+    )
+    ORDER BY distance
+'''
+
+# Entities are matched on articles.ner.norm_word (migration 002), the
+# normalize_entity() form of the mention, so the query entities are
+# normalized once in Python and the lookup is an index scan per entity
+ENTITY_SEARCH_QUERY = '''
+    WITH target_articles AS (
+        SELECT DISTINCT n.article_id
+        FROM articles.ner n
+        JOIN unnest(%(words)s::text[], %(groups)s::text[]) AS e(norm_word, entity_group)
+            ON n.norm_word = e.norm_word
+            AND n.entity_group = e.entity_group
+    ),
+    hits AS (
+        SELECT
+            a.article_id,
+            a.content,
+            (a.embedding <=> %(embedding)b) + 0 AS distance,
+            a.date,
+            a.topic,
+            a.url
+        FROM articles.articles a
+        JOIN target_articles t ON a.article_id = t.article_id
+        WHERE (%(start_date)s::timestamp IS NULL OR a.date BETWEEN %(start_date)s AND %(end_date)s)
+        AND (%(topic)s::text IS NULL OR a.topic = %(topic)s)
+        ORDER BY distance
+        LIMIT %(limit)s
+    )
+    SELECT article_id, content, distance, date, topic, url, FALSE AS fallback FROM hits
+    UNION ALL
+    (
+        SELECT article_id, content, embedding <=> %(embedding)b AS distance, date, topic, url, TRUE
+        FROM articles.articles
+        WHERE NOT EXISTS (SELECT 1 FROM hits)
+        ORDER BY distance
+        LIMIT %(limit)s
+    )
+    ORDER BY distance
+'''
+
+# Index-first search: the HNSW index yields the %(candidates)s nearest
+# articles and the filters apply to those. An empty words array disables the
+# entity filter. hnsw.ef_search must be at least the candidate count, so it
+# is set for the transaction first.
+ANN_SEARCH_QUERY = '''
+    WITH candidates AS MATERIALIZED (
+        SELECT article_id, embedding <=> %(embedding)b AS distance
+        FROM articles.articles
+        ORDER BY embedding <=> %(embedding)b
+        LIMIT %(candidates)s
+    )
+    SELECT a.article_id, a.content, c.distance, a.date, a.topic, a.url, FALSE AS fallback
+    FROM candidates c
+    JOIN articles.articles a ON a.article_id = c.article_id
+    WHERE (%(start_date)s::timestamp IS NULL OR a.date BETWEEN %(start_date)s AND %(end_date)s)
+    AND (%(topic)s::text IS NULL OR a.topic = %(topic)s)
+    AND (cardinality(%(words)s::text[]) = 0 OR EXISTS (
+        SELECT 1
+        FROM articles.ner n
+        JOIN unnest(%(words)s::text[], %(groups)s::text[]) AS e(norm_word, entity_group)
+            ON n.norm_word = e.norm_word
+            AND n.entity_group = e.entity_group
+        WHERE n.article_id = c.article_id
+    ))
+    ORDER BY c.distance
+    LIMIT %(limit)s
+'''
+
+# ANN_SEARCH_QUERY through the binary-quantized index of migration 006: the
+# %(quantized_candidates)s nearest sign-bit codes by Hamming distance are
+# re-ranked by exact distance, keeping %(candidates)s candidates
+BINARY_ANN_SEARCH_QUERY = ANN_SEARCH_QUERY.replace('''
+    WITH candidates AS MATERIALIZED (
+        SELECT article_id, embedding <=> %(embedding)b AS distance
+        FROM articles.articles
+        ORDER BY embedding <=> %(embedding)b
+        LIMIT %(candidates)s
+    )''', '''
+    WITH quantized AS MATERIALIZED (
+        SELECT article_id
+        FROM articles.articles
+        ORDER BY binary_quantize(embedding)::bit(384) <~> binary_quantize(%(embedding)b)
+        LIMIT %(quantized_candidates)s
+    ),
+    candidates AS MATERIALIZED (
+        SELECT a.article_id, a.embedding <=> %(embedding)b AS distance
+        FROM quantized q
+        JOIN articles.articles a ON a.article_id = q.article_id
+        ORDER BY distance
+        LIMIT %(candidates)s
+    )''')
+
+SET_EF_SEARCH = "SELECT set_config('hnsw.ef_search', %(ef_search)s, true)"
+
+# Article counts per topic and month, for the selectivity estimates
+STATISTICS_QUERY = '''
+    SELECT topic, date_trunc('month', date)::date, COUNT(*)
+    FROM articles.articles
+    GROUP BY 1, 2
+'''
+
+# Number of articles mentioning each entity, from the norm_word index
+ENTITY_COUNT_QUERY = '''
+    SELECT e.norm_word, e.entity_group, COUNT(DISTINCT n.article_id)
+    FROM unnest(%(words)s::text[], %(groups)s::text[]) AS e(norm_word, entity_group)
+    JOIN articles.ner n
+        ON n.norm_word = e.norm_word
+        AND n.entity_group = e.entity_group
+    GROUP BY 1, 2
+'''
+
+# Hybrid retrieval (migration 005): the top %(candidates)s articles by
+# full-text rank and by vector distance, both under the filters, fused by
+# reciprocal rank: score = sum of 1 / (rrf_k + rank) over the two rankings.
+# The text matches articles containing any of its terms, as BM25 does in
+# the local index: plainto_tsquery ANDs the lexemes, which are ORed instead,
+# since a natural-language query rarely has all its words in one article.
+# Returned in fused order with the SEARCH_QUERY columns; empty when no
+# article under the filters matches the text, so the caller can fall back
+# to the entity-filtered vector search.
+HYBRID_SEARCH_QUERY = '''
+    WITH lexical AS (
+        SELECT article_id, ROW_NUMBER() OVER (ORDER BY text_rank DESC) AS rank
+        FROM (
+            SELECT a.article_id, ts_rank_cd(a.content_tsv, q) AS text_rank
+            FROM articles.articles a,
+                replace(plainto_tsquery('articles.portuguese_unaccent', %(text)s)::text, ' & ', ' | ')::tsquery q
+            WHERE a.content_tsv @@ q
+            AND {filters}
+            ORDER BY text_rank DESC
+            LIMIT %(candidates)s
+        ) l
+    ),
+    semantic AS (
+        SELECT article_id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+        FROM (
+            SELECT a.article_id, a.embedding <=> %(embedding)b AS distance
+            FROM articles.articles a
+            WHERE {filters}
+            ORDER BY distance
+            LIMIT %(candidates)s
+        ) s
+    ),
+    fused AS (
+        SELECT article_id, SUM(1.0 / (%(rrf_k)s + rank)) AS score
+        FROM (SELECT * FROM lexical UNION ALL SELECT * FROM semantic) ranked
+        WHERE EXISTS (SELECT 1 FROM lexical)
+        GROUP BY article_id
+        ORDER BY score DESC
+        LIMIT %(limit)s
+    )
+    SELECT a.article_id, a.content, a.embedding <=> %(embedding)b AS distance, a.date, a.topic, a.url, FALSE AS fallback
+    FROM fused f
+    JOIN articles.articles a ON a.article_id = f.article_id
+    ORDER BY f.score DESC
+'''.replace('{filters}', '''(%(start_date)s::timestamp IS NULL OR a.date BETWEEN %(start_date)s AND %(end_date)s)
+            AND (%(topic)s::text IS NULL OR a.topic = %(topic)s)
+            AND (cardinality(%(words)s::text[]) = 0 OR EXISTS (
+                SELECT 1
+                FROM articles.ner n
+                JOIN unnest(%(words)s::text[], %(groups)s::text[]) AS e(norm_word, entity_group)
+                    ON n.norm_word = e.norm_word
+                    AND n.entity_group = e.entity_group
+                WHERE n.article_id = a.article_id
+            ))''')
+
+# Partitions of articles.articles (migration 004) and their bounds; empty
+# when the table is not partitioned
+PARTITIONS_QUERY = '''
+    SELECT n.nspname, c.relname, pg_get_expr(c.relpartbound, c.oid)
+    FROM pg_inherits i
+    JOIN pg_class c ON c.oid = i.inhrelid
+    JOIN pg_namespace n ON n.oid = c.relnamespace
+    WHERE i.inhparent = 'articles.articles'::regclass
+'''
+
+_PARTITION_BOUNDS = re.compile(r"FROM \('([^']+)'\) TO \('([^']+)'\)")
+
+# Date-filtered search over the partitions overlapping the date range: the
+# top limit of each partition, merged. Each branch scans one partition with
+# its B-tree indexes, never its HNSW index, as in SEARCH_QUERY. Same output
+# and fallback as SEARCH_QUERY.
+PARTITIONED_SEARCH_QUERY = sql.SQL('''
+    WITH {target_articles}hits AS (
+        SELECT * FROM ({branches}
+        ) partitions
+        ORDER BY distance
+        LIMIT %(limit)s
+    )
+    SELECT article_id, content, distance, date, topic, url, FALSE AS fallback FROM hits
+    UNION ALL
+    (
+        SELECT article_id, content, embedding <=> %(embedding)b AS distance, date, topic, url, TRUE
+        FROM articles.articles
+        WHERE NOT EXISTS (SELECT 1 FROM hits)
+        ORDER BY distance
+        LIMIT %(limit)s
+    )
+    ORDER BY distance
+''')
+
+PARTITION_BRANCH = sql.SQL('''
+            (
+                SELECT a.article_id, a.content, (a.embedding <=> %(embedding)b) + 0 AS distance, a.date, a.topic, a.url
+                FROM {partition} a
+                WHERE a.date BETWEEN %(start_date)s AND %(end_date)s
+                AND (%(topic)s::text IS NULL OR a.topic = %(topic)s){entity_filter}
+                ORDER BY distance
+                LIMIT %(limit)s
+            )''')
+
+PARTITION_TARGET_ARTICLES = sql.SQL('''target_articles AS (
+        SELECT DISTINCT n.article_id
+        FROM articles.ner n
+        JOIN unnest(%(words)s::text[], %(groups)s::text[]) AS e(norm_word, entity_group)
+            ON n.norm_word = e.norm_word
+            AND n.entity_group = e.entity_group
+    ),
+    ''')
+
+def partitioned_search_query(partitions: List[Tuple[str, str]], entities: bool) -> sql.Composed:
+    """PARTITIONED_SEARCH_QUERY over the given (schema, table) partitions"""
+    entity_filter = sql.SQL("\n                AND a.article_id IN (SELECT article_id FROM target_articles)" if entities else "")
+    branches = sql.SQL("\n            UNION ALL").join(
+        PARTITION_BRANCH.format(partition=sql.Identifier(schema, name), entity_filter=entity_filter)
+        for schema, name in partitions
+    )
+    return PARTITIONED_SEARCH_QUERY.format(
+        target_articles=PARTITION_TARGET_ARTICLES if entities else sql.SQL(""),
+        branches=branches
+    )
+
+# Sentence spans and embeddings precomputed by the preprocessing stage
+SENTENCES_QUERY = '''
+    SELECT article_id, start_char, end_char, embedding
+    FROM articles.article_sentences
+    WHERE article_id = ANY(%(article_ids)s)
+    ORDER BY article_id, sentence_idx
+'''
+
+# Entity mentions of the articles loaded after a given article, with the
+# number of articles mentioning each, for the query gazetteer
+ENTITY_VOCABULARY_QUERY = '''
+    SELECT word, entity_group, COUNT(DISTINCT article_id), MAX(article_id)
+    FROM articles.ner
+    WHERE article_id > %(since)s
+    GROUP BY word, entity_group
+'''
+
+def database_conninfo() -> str:
+    """Supabase connection string from the DB_* environment variables"""
+    return make_conninfo(
+        user=os.getenv("DB_USER"),
+        password=os.getenv("DB_PASSWORD"),
+        host=os.getenv("SUPABASE_HOST", "aws-0-eu-west-3.pooler.supabase.com"),
+        port=os.getenv("DB_PORT", "6543"),
+        dbname=os.getenv("DB_NAME", "postgres")
+    )
 
 class DatabaseService:
     def __init__(self):
-        # Supabase Connection Parameters
-        self.DB_HOST = os.getenv("SUPABASE_HOST", "aws-0-eu-west-3.pooler.supabase.com")
-        self.DB_PORT = os.getenv("DB_PORT", "6543")
-        self.DB_NAME = os.getenv("DB_NAME", "postgres")
-        self.DB_USER = os.getenv("DB_USER")
-        self.DB_PASSWORD = os.getenv("DB_PASSWORD")
+        # Connection pool parameters
+        self.POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+        self.POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+        self.POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+        self.POOL_MAX_IDLE = float(os.getenv("DB_POOL_MAX_IDLE", "300"))
+        self.POOL_MAX_LIFETIME = float(os.getenv("DB_POOL_MAX_LIFETIME", "3600"))
+
+        # Server-side prepared statements. Supabase's transaction-mode
+        # pooler (port 6543, the default) hands each transaction to any
+        # server connection, where statements prepared on another do not
+        # exist, so they are only on by default for session mode or direct
+        # connections (5432); DB_PREPARED_STATEMENTS overrides either way
+        default_prepared = "false" if os.getenv("DB_PORT", "6543") == "6543" else "true"
+        self.PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", default_prepared).lower() == "true"
+
+        # Created closed, opened by open() from the application lifespan
+        self.pool = AsyncConnectionPool(
+            conninfo=database_conninfo(),
+            kwargs={"prepare_threshold": 0 if self.PREPARED_STATEMENTS else None},
+            min_size=self.POOL_MIN_SIZE,
+            max_size=self.POOL_MAX_SIZE,
+            timeout=self.POOL_TIMEOUT,
+            max_idle=self.POOL_MAX_IDLE,
+            max_lifetime=self.POOL_MAX_LIFETIME,
+            configure=self._configure_connection,
+            check=AsyncConnectionPool.check_connection,
+            open=False
+        )
+
+        self.planner = SearchPlanner()
+        self._statistics_task: Optional[asyncio.Task] = None
+        # (schema, table, lower bound, upper bound) of each partition of
+        # articles.articles; None bounds for the default partition
+        self.partitions: List[Tuple[str, str, Optional[datetime], Optional[datetime]]] = []
+
+        # Hybrid search: candidates taken from each of the full-text and
+        # vector rankings (keep within hnsw.ef_search, 40 by default) and the
+        # k constant of reciprocal rank fusion
+        self.HYBRID_CANDIDATES = int(os.getenv("SEARCH_HYBRID_CANDIDATES", "40"))
+        self.RRF_K = int(os.getenv("SEARCH_RRF_K", "60"))
+
+        # Index-first searches through the binary-quantized index
+        # (migration 006), re-ranking RERANK_FACTOR candidates per candidate
+        # kept; "none" uses the HNSW index on the vectors
+        self.QUANTIZATION = os.getenv("SEARCH_QUANTIZATION", "none").lower()
+        if self.QUANTIZATION not in ("none", "binary"):
+            raise ValueError(f"Unknown SEARCH_QUANTIZATION '{self.QUANTIZATION}', expected 'none' or 'binary'")
+        self.RERANK_FACTOR = int(os.getenv("SEARCH_RERANK_FACTOR", str(RERANK_FACTORS["binary"])))
+
+    @staticmethod
+    async def _configure_connection(conn):
+        """Register the pgvector adapters on every new pooled connection"""
+        await register_vector_async(conn)
+
+    async def open(self):
+        """Open the connection pool and wait for the minimum connections"""
+        await self.pool.open(wait=True, timeout=self.POOL_TIMEOUT)
+        logger.info(
+            f"Database pool opened (min_size={self.POOL_MIN_SIZE}, max_size={self.POOL_MAX_SIZE})"
+        )
+        await self.refresh_statistics()
+
+    async def refresh_statistics(self):
+        """Reload the article counts the search planner estimates from and
+        the partition bounds"""
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(STATISTICS_QUERY)
+                    rows = await cursor.fetchall()
+                    await cursor.execute(PARTITIONS_QUERY)
+                    partitions = await cursor.fetchall()
+            self.planner.set_statistics(rows)
+            self.partitions = [
+                (schema, name, *self._partition_bounds(bound)) for schema, name, bound in partitions
+            ]
+            logger.info(
+                f"Search statistics loaded ({self.planner.total} articles, {len(rows)} topic-months, "
+                f"{len(self.partitions)} partitions)"
+            )
+        except Exception as e:
+            logger.error(f"Search statistics query error: {e}")
+        finally:
+            self._statistics_task = None
+
+    @staticmethod
+    def _partition_bounds(bound: str) -> Tuple[Optional[datetime], Optional[datetime]]:
+        """Range of a 'FOR VALUES FROM (...) TO (...)' bound; (None, None)
+        for the default partition or unbounded ranges"""
+        match = _PARTITION_BOUNDS.search(bound or "")
+        if not match:
+            return None, None
+        return datetime.fromisoformat(match.group(1)), datetime.fromisoformat(match.group(2))
+
+    def _overlapping_partitions(self, start_date: datetime, end_date: datetime) -> List[Tuple[str, str]]:
+        return [
+            (schema, name)
+            for schema, name, lower, upper in self.partitions
+            if lower is None or (lower <= end_date and upper > start_date)
+        ]
+
+    def _prefilter_query(self, params: Dict[str, Any], plan: Dict[str, Any]):
+        """Exact filtered search, partition by partition when the table is
+        partitioned and the query has a date range"""
+        entities = bool(params["words"])
+        if self.partitions and params["start_date"]:
+            partitions = self._overlapping_partitions(params["start_date"], params["end_date"])
+            if partitions:
+                plan["partitions"] = [name for _, name in partitions]
+                return partitioned_search_query(partitions, entities)
+        return ENTITY_SEARCH_QUERY if entities else SEARCH_QUERY
 
     async def semantic_search(
         #Query parameters
@@ -21,151 +433,343 @@ class DatabaseService:
         end_date: Optional[datetime] = None,
         topic: Optional[str] = None,
         entities: Optional[List[Tuple[str,str]]] = None,
-        limit: int = 10
+        limit: int = 10,
+        report: Optional[Dict[str, Any]] = None,
+        query_text: Optional[str] = None
     ) -> List[Dict[str, any]]:
-        
+        """Nearest articles passing the filters, or the nearest articles
+        overall when none do. With query_text, the full-text and vector
+        rankings are fused by reciprocal rank in a single query, and when
+        the text matches no article the vector search runs as without it;
+        the strategy is "hybrid" only when the text matched. The chosen
+        strategy and the timing of each query are added to report when one
+        is given."""
+
         # Entity log Checking
-        print(f"Extracted entities2: {entities}")
-        
+        logger.info(f"Searching with entities: {entities}")
+
+        params = self._search_params(query_embedding, start_date, end_date, topic, entities, limit)
+
         try:
-            with psycopg2.connect(
-                user=self.DB_USER,
-                password=self.DB_PASSWORD,
-                host=self.DB_HOST,
-                port=self.DB_PORT,
-                dbname=self.DB_NAME
-            ) as conn:
-                with conn.cursor() as cursor:
-                    # Base query
-                    base_query = sql.SQL('''
-                        WITH filtered_articles AS (
-                            SELECT article_id
-                            FROM articles.articles
-                            WHERE 1=1
-                    ''')
-
-                    # Add date range filter (if both start and end dates provided)
-                    if start_date and end_date:
-                        base_query = sql.SQL('{}{}').format(
-                            base_query,
-                            sql.SQL(' AND date BETWEEN {} AND {}').format(
-                                sql.Literal(start_date),
-                                sql.Literal(end_date)
-                            )
-                        )
-
-                    # Add topic filter (if provided)
-                    if topic:
-                        base_query = sql.SQL('{}{}').format(
-                            base_query,
-                            sql.SQL(' AND topic = {}').format(sql.Literal(topic))
-                        )
-
-                    base_query = sql.SQL('{} {}').format(
-                        base_query,
-                        sql.SQL(')')
-                    )
-
-                    # Add entity filter (if entities exist)
-                    if entities:
-                        entity_conditions = sql.SQL(" OR ").join(
-                            sql.SQL("""
-                                (LOWER(UNACCENT(word)) = LOWER(UNACCENT({})) 
-                                AND entity_group = {})
-                            """).format(
-                                sql.Literal(e[0]),  # Lowercase + unaccented entity text
-                                sql.Literal(e[1])   # Original entity label (case-sensitive)
-                            ) for e in entities
-                        )
-                        
-                        # Final query with entity conditions and all filters
-                        final_query = sql.SQL('''
-                            {base_query},
-                            target_articles AS (
-                                SELECT DISTINCT article_id
-                                FROM articles.ner
-                                WHERE ({entity_conditions})
-                                AND article_id IN (SELECT article_id FROM filtered_articles)
-                            )
-                            SELECT
-                                a.content,
-                                a.embedding <=> {embedding}::vector AS distance,
-                                a.date,
-                                a.topic,
-                                a.url   
-                            FROM articles.articles a
-                            JOIN target_articles t ON a.article_id = t.article_id
-                            ORDER BY distance
-                            LIMIT {limit}
-                        ''').format(
-                            base_query=base_query,
-                            entity_conditions=entity_conditions,
-                            embedding=sql.Literal(query_embedding),
-                            limit=sql.Literal(limit)
-                        )
-
-                    # Final query with all filters but no entities
-                    else:
-                        print("No articles found with entities...")
-                        final_query = sql.SQL('''
-                            {base_query}
-                            SELECT
-                                a.content,
-                                a.embedding <=> {embedding}::vector AS distance,
-                                a.date,
-                                a.topic,
-                                a.url
-                            FROM articles.articles a
-                            JOIN filtered_articles f ON a.article_id = f.article_id
-                            ORDER BY distance
-                            LIMIT {limit}
-                        ''').format(
-                            base_query=base_query,
-                            embedding=sql.Literal(query_embedding),
-                            limit=sql.Literal(limit)
-                        )
-
-                    cursor.execute(final_query)
-                    articles = cursor.fetchall()
-
-                    # Fallback: Retry with no filters if no results, only semantic search
-                    if not articles:
-                        print("No articles found with the filters applied. Trying fallback query...")
-                        fallback_query = sql.SQL('''
-                            SELECT
-                                content,
-                                embedding <=> {}::vector AS distance,
-                                date,
-                                topic,
-                                url
-                            FROM articles.articles
-                            ORDER BY distance
-                            LIMIT {limit}
-                        ''').format(
-                            sql.Literal(query_embedding),
-                            limit=sql.Literal(limit)
-                        )
-                        cursor.execute(fallback_query)
-                        articles = cursor.fetchall()
-
-                    # Format results
-                    formatted_results = [
-                        {
-                            "content": content,
-                            "distance": distance,
-                            "date": art_date,
-                            "topic": art_topic,
-                            "url": url,
-                        }
-                        for content, distance, art_date, art_topic,url in articles
-                    ]
-
-                    return formatted_results
+            start = time.perf_counter()
+            articles, queries = None, []
+            if query_text:
+                plan = {"strategy": "hybrid", "estimated_rows": None, "queries": queries}
+                # Empty when the text matches nothing under the filters
+                articles = await self._timed_fetch(plan, "hybrid", *self._hybrid_statement(params, query_text)) or None
+            if articles is None:
+                plan, articles = await self._planned_search(params, queries)
+
+            plan["total_ms"] = (time.perf_counter() - start) * 1000
+            logger.info(
+                f"Search plan: {plan['strategy']} (estimated rows {plan['estimated_rows']}), "
+                f"{len(plan['queries'])} queries in {plan['total_ms']:.1f}ms"
+            )
+            if report is not None:
+                report.update(plan)
+
+            return self._format_results(articles)
 
         except Exception as e:
-            print(f"Database query error: {e}")
+            logger.error(f"Database query error: {e}")
             return []
 
+    async def batch_semantic_search(
+        self,
+        searches: List[Dict[str, Any]],
+        reports: Optional[List[Dict[str, Any]]] = None
+    ) -> List[List[Dict[str, Any]]]:
+        """semantic_search for each dict of its keyword arguments, sending
+        the planned query of every search over one connection in a single
+        pipelined round trip. Searches whose index-first query yields fewer
+        than limit rows are completed with the exact prefilter query, those
+        whose text matches nothing with the planned vector search. When the batch fails, each search
+        is retried on its own so one bad statement only empties its own
+        results."""
+        start = time.perf_counter()
+        statements, plans, searches_params = [], [], []
+        for search in searches:
+            params = self._search_params(
+                search["query_embedding"],
+                search.get("start_date"),
+                search.get("end_date"),
+                search.get("topic"),
+                search.get("entities"),
+                search.get("limit", 10)
+            )
+            searches_params.append(params)
+            if search.get("query_text"):
+                plan = {"strategy": "hybrid", "estimated_rows": None}
+                statements.append(self._hybrid_statement(params, search["query_text"]))
+            else:
+                plan = await self._plan_search(params)
+                if plan["strategy"] == "ann":
+                    statements.append(self._ann_statement(params, plan["candidates"]))
+                else:
+                    statements.append((self._prefilter_query(params, plan), params, None))
+            plan["queries"] = []
+            plans.append(plan)
+
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.pipeline():
+                    async with conn.transaction():
+                        cursors = []
+                        for query, params, ef_search in statements:
+                            cursor = conn.cursor()
+                            # ef_search is transaction-local, so each
+                            # statement using the index sets its own
+                            if ef_search is not None:
+                                await cursor.execute(SET_EF_SEARCH, {"ef_search": str(ef_search)})
+                            await cursor.execute(query, params)
+                            cursors.append(cursor)
+                        results = []
+                        for cursor in cursors:
+                            results.append(await cursor.fetchall())
+                            await cursor.close()
+        except Exception as e:
+            # A failed statement aborts the shared transaction, so the
+            # searches are run again one by one, each on its own
+            logger.error(f"Database batch query error, running the searches separately: {e}")
+            results = None
+
+        batch_ms = (time.perf_counter() - start) * 1000
+        formatted = []
+        for i, (plan, (query, params, ef_search)) in enumerate(zip(plans, statements)):
+            if results is not None:
+                articles = results[i]
+                plan["queries"].append({
+                    "strategy": plan["strategy"],
+                    "batch_size": len(searches),
+                    "rows": len(articles),
+                    "ms": batch_ms,
+                })
+            else:
+                try:
+                    articles = await self._timed_fetch(plan, plan["strategy"], query, params, ef_search)
+                except Exception as e:
+                    logger.error(f"Database query error: {e}")
+                    articles = []
+            try:
+                if plan["strategy"] == "hybrid" and not articles:
+                    plan, articles = await self._planned_search(searches_params[i], plan["queries"])
+                elif plan["strategy"] == "ann" and len(articles) < params["limit"]:
+                    articles = await self._timed_fetch(plan, "prefilter", self._prefilter_query(params, plan), params)
+            except Exception as e:
+                logger.error(f"Database query error: {e}")
+                articles = []
+            plan["total_ms"] = (time.perf_counter() - start) * 1000
+            if reports is not None:
+                reports[i].update(plan)
+            formatted.append(self._format_results(articles))
+
+        logger.info(f"Batch search: {len(searches)} searches in {batch_ms:.1f}ms")
+        return formatted
+
+    @staticmethod
+    def _search_params(
+        query_embedding: List[float],
+        start_date: Optional[datetime],
+        end_date: Optional[datetime],
+        topic: Optional[str],
+        entities: Optional[List[Tuple[str, str]]],
+        limit: int
+    ) -> Dict[str, Any]:
+        # Date range filter only applies when both start and end dates are provided
+        if not (start_date and end_date):
+            start_date = end_date = None
+
+        return {
+            "embedding": np.asarray(query_embedding, dtype=np.float32),
+            "start_date": start_date,
+            "end_date": end_date,
+            "topic": topic or None,
+            "limit": limit,
+            "words": [normalize_entity(e[0]) for e in entities or []],
+            "groups": [e[1] for e in entities or []],
+        }
+
+    @staticmethod
+    def _format_results(articles: List[tuple]) -> List[Dict[str, Any]]:
+        if articles and articles[0][6]:
+            logger.info("No articles found with the filters applied, returned fallback results")
+
+        return [
+            {
+                "article_id": article_id,
+                "content": content,
+                "distance": distance,
+                "date": art_date,
+                "topic": art_topic,
+                "url": url,
+            }
+            for article_id, content, distance, art_date, art_topic, url, _ in articles
+        ]
+
+    async def _planned_search(self, params: Dict[str, Any], queries: List[Dict[str, Any]]) -> Tuple[Dict[str, Any], List[tuple]]:
+        """Plan and rows of the vector search with the strategy the planner
+        picks, recording its queries after the given ones"""
+        plan = await self._plan_search(params)
+        plan["queries"] = queries
+        articles = None
+        if plan["strategy"] == "ann":
+            articles = await self._ann_search(params, plan)
+        if articles is None:
+            # Exact scan of the filtered rows, also when the index did
+            # not yield enough candidates passing the filters
+            articles = await self._timed_fetch(plan, "prefilter", self._prefilter_query(params, plan), params)
+        return plan, articles
+
+    async def _plan_search(self, params: Dict[str, Any]) -> Dict[str, Any]:
+        if self.planner.stale and self._statistics_task is None:
+            self._statistics_task = asyncio.create_task(self.refresh_statistics())
+
+        filtered_rows = self.planner.estimate_rows(params["start_date"], params["end_date"], params["topic"])
+        entity_rows = None
+        if params["words"] and filtered_rows is not None and self.planner.strategy == "auto":
+            entity_rows = await self._entity_rows(list(zip(params["words"], params["groups"])))
+        return self.planner.plan(params["limit"], filtered_rows, entity_rows)
+
+    async def _entity_rows(self, entities: List[Tuple[str, str]]) -> float:
+        """Upper bound of the number of articles mentioning any of the entities"""
+        rows, missing = self.planner.cached_entity_rows(entities)
+        if missing:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(ENTITY_COUNT_QUERY, {
+                        "words": [e[0] for e in missing],
+                        "groups": [e[1] for e in missing],
+                    })
+                    counts = {(word, group): count for word, group, count in await cursor.fetchall()}
+            for entity in missing:
+                self.planner.entity_counts.set(entity, counts.get(entity, 0))
+                rows += counts.get(entity, 0)
+        return rows
+
+    async def _timed_fetch(
+        self,
+        plan: Dict[str, Any],
+        strategy: str,
+        query: Union[str, sql.Composed],
+        params: Dict[str, Any],
+        ef_search: Optional[int] = None
+    ) -> List[tuple]:
+        start = time.perf_counter()
+        async with self.pool.connection() as conn:
+            if ef_search is None:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(query, params)
+                    rows = await cursor.fetchall()
+            else:
+                # One round trip for the transaction-local setting and the query
+                async with conn.pipeline():
+                    async with conn.transaction():
+                        async with conn.cursor() as cursor:
+                            await cursor.execute(SET_EF_SEARCH, {"ef_search": str(ef_search)})
+                            await cursor.execute(query, params)
+                            rows = await cursor.fetchall()
+        plan["queries"].append({
+            "strategy": strategy,
+            "rows": len(rows),
+            "ms": (time.perf_counter() - start) * 1000,
+        })
+        return rows
+
+    def _hybrid_statement(self, params: Dict[str, Any], text: str) -> Tuple[str, Dict[str, Any], int]:
+        """Hybrid query, its parameters and the hnsw.ef_search its vector branch needs"""
+        return HYBRID_SEARCH_QUERY, {
+            **params,
+            "text": text,
+            "candidates": self.HYBRID_CANDIDATES,
+            "rrf_k": self.RRF_K,
+        }, max(self.HYBRID_CANDIDATES, 40)
+
+    def _ann_statement(self, params: Dict[str, Any], candidates: int) -> Tuple[str, Dict[str, Any], int]:
+        """Index-first query, its parameters and the hnsw.ef_search it needs"""
+        if self.QUANTIZATION == "binary":
+            # hnsw.ef_search accepts at most 1000
+            quantized_candidates = max(min(candidates * self.RERANK_FACTOR, 1000), candidates)
+            return BINARY_ANN_SEARCH_QUERY, {
+                **params,
+                "candidates": candidates,
+                "quantized_candidates": quantized_candidates,
+            }, max(quantized_candidates, 40)
+        return ANN_SEARCH_QUERY, {**params, "candidates": candidates}, max(candidates, 40)
+
+    async def _ann_search(self, params: Dict[str, Any], plan: Dict[str, Any]) -> Optional[List[tuple]]:
+        """Index-first search, doubling the candidates until limit of them
+        pass the filters; None when even max_candidates are not enough."""
+        candidates = plan["candidates"]
+        while True:
+            query, query_params, ef_search = self._ann_statement(params, candidates)
+            start = time.perf_counter()
+            async with self.pool.connection() as conn:
+                # One round trip for the setting and the search
+                async with conn.pipeline():
+                    async with conn.transaction():
+                        async with conn.cursor() as cursor:
+                            await cursor.execute(SET_EF_SEARCH, {"ef_search": str(ef_search)})
+                            await cursor.execute(query, query_params)
+                            rows = await cursor.fetchall()
+            plan["queries"].append({
+                "strategy": "ann",
+                "quantization": self.QUANTIZATION,
+                "candidates": candidates,
+                "rows": len(rows),
+                "ms": (time.perf_counter() - start) * 1000,
+            })
+
+            if len(rows) >= params["limit"]:
+                return rows
+            if candidates >= self.planner.max_candidates:
+                return None
+            candidates = min(candidates * 2, self.planner.max_candidates)
+
+    async def fetch_sentences(self, article_ids: List[Any]) -> Dict[Any, Dict[str, Any]]:
+        """Precomputed sentence spans and embeddings of the given articles.
+
+        Articles without stored sentences are absent from the result.
+        """
+        if not article_ids:
+            return {}
+
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor(binary=True) as cursor:
+                    await cursor.execute(SENTENCES_QUERY, {"article_ids": list(article_ids)})
+                    rows = await cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Sentence lookup error: {e}")
+            return {}
+
+        sentences: Dict[Any, Dict[str, Any]] = {}
+        for article_id, start_char, end_char, embedding in rows:
+            entry = sentences.setdefault(article_id, {"spans": [], "embeddings": []})
+            entry["spans"].append((start_char, end_char))
+            entry["embeddings"].append(embedding)
+
+        for entry in sentences.values():
+            entry["embeddings"] = np.vstack(entry["embeddings"]).astype(np.float32)
+        return sentences
+
+    async def fetch_entity_vocabulary(self, since_article_id: int = 0) -> Optional[Tuple[List[Tuple[str, str, int]], int]]:
+        """(word, entity_group, article count) rows of the articles after
+        since_article_id and the last article id seen; None on error."""
+        try:
+            async with self.pool.connection() as conn:
+                async with conn.cursor() as cursor:
+                    await cursor.execute(ENTITY_VOCABULARY_QUERY, {"since": since_article_id})
+                    rows = await cursor.fetchall()
+        except Exception as e:
+            logger.error(f"Entity vocabulary lookup error: {e}")
+            return None
+
+        last_article_id = max((row[3] for row in rows), default=since_article_id)
+        return [(word, entity_group, count) for word, entity_group, count, _ in rows], last_article_id
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "postgres", "quantization": self.QUANTIZATION, **self.planner.stats()}
+
     async def close(self):
-        # No explicit close needed with context manager
-        pass
\ No newline at end of file
+        """Close the connection pool, waiting for checked-out connections"""
+        await self.pool.close(timeout=self.POOL_TIMEOUT)
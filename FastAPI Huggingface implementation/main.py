@@ -1,62 +1,388 @@
+import os
+import asyncio
 import datetime
-from typing import List, Dict, Any, Optional, Tuple
+from typing import AsyncIterator, Awaitable, Callable, List, Dict, Any, Optional, Tuple
 import numpy as np
-from models.LexRank import degree_centrality_scores
+from models.LexRank import sparse_degree_centrality_scores
+from models.summarization import AsyncTextStreamer
 import logging
 from datetime import datetime as dt
 
 logger = logging.getLogger(__name__)
 
+# Number of top articles whose sentences feed the summary
+SUMMARY_ARTICLES = 3
+
+# Summary modes, from cheapest to most expensive: LexRank sentences only,
+# short greedy T5 decoding and the full beam search
+SUMMARY_MODES = ("extractive", "fast", "quality")
+
+# Pending summaries above which "quality" requests are served in "fast"
+# mode; 0 disables degradation
+SUMMARY_DEGRADE_QUEUE_DEPTH = int(os.getenv("SUMMARY_DEGRADE_QUEUE_DEPTH", "8"))
+
+# Retrieval modes: vector distance with entity filters from the query, or
+# full-text and vector rankings fused by reciprocal rank, where names in the
+# query are matched lexically and entities are only extracted, to filter
+# the vector search, when the text matches no article
+SEARCH_MODES = ("semantic", "hybrid")
+SEARCH_MODE = os.getenv("SEARCH_MODE", "semantic").lower()
+
+# Awaited with (stage, data) as the intermediate results of a request
+# become available: "entities", "articles" and "extractive_summary"
+StageCallback = Callable[[str, Dict[str, Any]], Awaitable[None]]
+
 class QueryProcessor:
-    def __init__(self, embedding_model, summarization_model, nlp_model, db_service):
+    def __init__(self, embedding_model, summarization_model, nlp_model, db_service, cache=None, executor=None, embedding_batcher=None, summarization_batcher=None, entity_matcher=None):
         self.embedding_model = embedding_model
         self.summarization_model = summarization_model
         self.nlp_model = nlp_model
+        # Gazetteer replacing the spaCy NER for query entities once loaded
+        self.entity_matcher = entity_matcher
         self.db_service = db_service
+        self.cache = cache
+        self.executor = executor
+        self.embedding_batcher = embedding_batcher
+        self.summarization_batcher = summarization_batcher
+        if SEARCH_MODE not in SEARCH_MODES:
+            raise ValueError(f"Invalid SEARCH_MODE '{SEARCH_MODE}', expected one of {SEARCH_MODES}")
         logger.info("QueryProcessor initialized")
 
+    async def _run(self, model: str, fn, *args, **kwargs):
+        """Run blocking model work off the event loop"""
+        if self.executor:
+            return await self.executor.run(model, fn, *args, **kwargs)
+        return await asyncio.to_thread(fn, *args, **kwargs)
+
+    async def _encode(self, text):
+        """Encode through the shared batcher when one is configured"""
+        if self.embedding_batcher:
+            return await self.embedding_batcher.encode(text)
+        return await self._run("embedding", self.embedding_model.encode, text)
+
+    async def _summarize(self, text: str, mode: str = "quality", streamer=None) -> str:
+        """Summarize through the shared batcher when one is configured.
+        Streamed generations run on their own since each needs its own
+        generate call."""
+        if streamer:
+            return await self._run("summarization", self.summarization_model.summarize, text, mode, streamer)
+        if self.summarization_batcher:
+            return await self.summarization_batcher.summarize(text, mode)
+        return await self._run("summarization", self.summarization_model.summarize, text, mode)
+
+    def _effective_summary_mode(self, mode: str) -> str:
+        """Downgrade beam search to greedy decoding while the summarizer is backlogged"""
+        if (
+            mode == "quality"
+            and SUMMARY_DEGRADE_QUEUE_DEPTH
+            and self.summarization_batcher
+            and self.summarization_batcher.running
+            and self.summarization_batcher.queue.qsize() >= SUMMARY_DEGRADE_QUEUE_DEPTH
+        ):
+            logger.info("Summarizer backlogged, serving quality summary request in fast mode")
+            return "fast"
+        return mode
+
     async def process(
         self,
         query: str,
         topic: Optional[str] = None,
         start_date: Optional[str] = None,
-        end_date: Optional[str] = None
+        end_date: Optional[str] = None,
+        summary_mode: str = "quality",
+        on_stage: Optional[StageCallback] = None
     ) -> Dict[str, Any]:
         try:
-            # Date handling
-            start_dt = self._parse_date(start_date) if start_date else None
-            end_dt = self._parse_date(end_date) if end_date else None
-            
-            # Query processing
-            query_embedding = self.embedding_model.encode(query).tolist()
-            entities = self.nlp_model.extract_entities(query)
-            print(f"Extracted entities: {entities}")
-            
-            # Database search
-            articles = await self._execute_semantic_search(
-                query_embedding,
-                start_dt,
-                end_dt,
-                topic,
-                entities
-            )
-            
-            if not articles:
-                return {"message": "No articles found", "articles": []}
+            self._validate_summary_mode(summary_mode)
 
-            # Summary generation
-            print("Starting summary generation")
-            summary_data = self._generate_summary(articles)
-            return {
-                "summary": summary_data["summary"],
-                "articles": articles,
-                "entities": entities
-            }
+            retrieved = await self._retrieve(query, topic, start_date, end_date, on_stage)
+            return await self._complete(retrieved, summary_mode, on_stage)
 
         except Exception as e:
             logger.error(f"Processing failed: {str(e)}", exc_info=True)
             return {"error": str(e)}
 
+    async def process_batch(self, requests: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """process for several requests, each a dict of its keyword
+        arguments. Queries missing from the articles cache are encoded in
+        one call, their entities extracted in one spaCy batch (in hybrid
+        mode, only for those whose text matches nothing) and searched in
+        one batched database interaction; the summaries then run
+        concurrently, sharing the summarization batcher."""
+        results: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        retrieved: List[Optional[Dict[str, Any]]] = [None] * len(requests)
+        # (index, articles cache key, start date, end date) of each search to run
+        pending = []
+        for i, request in enumerate(requests):
+            try:
+                self._validate_summary_mode(request.get("summary_mode", "quality"))
+                start_dt = self._parse_date(request["start_date"]) if request.get("start_date") else None
+                end_dt = self._parse_date(request["end_date"]) if request.get("end_date") else None
+            except ValueError as e:
+                results[i] = {"error": str(e)}
+                continue
+
+            request_key = None
+            if self.cache:
+                request_key = self.cache.request_key(
+                    request["query"], request.get("topic"), request.get("start_date"), request.get("end_date")
+                )
+                cached = self.cache.get_articles(request_key)
+                if cached is not None:
+                    retrieved[i] = {**cached, "search": {"strategy": "cache"}}
+                    continue
+            pending.append((i, request_key, start_dt, end_dt))
+
+        if pending:
+            try:
+                for (i, _, _, _), found in zip(pending, await self._retrieve_batch(requests, pending)):
+                    retrieved[i] = found
+            except Exception as e:
+                # Encoder, NER or database failure: every pending item fails
+                logger.error(f"Batch retrieval failed: {str(e)}", exc_info=True)
+                for i, _, _, _ in pending:
+                    results[i] = {"error": str(e)}
+
+        indices = [i for i in range(len(requests)) if retrieved[i] is not None]
+        completed = await asyncio.gather(
+            *(self._complete(retrieved[i], requests[i].get("summary_mode", "quality")) for i in indices),
+            return_exceptions=True
+        )
+        for i, result in zip(indices, completed):
+            if isinstance(result, Exception):
+                logger.error(f"Processing failed: {str(result)}")
+                result = {"error": str(result)}
+            results[i] = result
+        return results
+
+    async def _retrieve_batch(self, requests: List[Dict[str, Any]], pending: List[Tuple]) -> List[Dict[str, Any]]:
+        """_retrieve for the (index, articles cache key, start date, end
+        date) of each pending request, in one encoder call and one batched
+        search"""
+        queries = [requests[i]["query"] for i, _, _, _ in pending]
+        if SEARCH_MODE == "hybrid":
+            embeddings = await self._encode_queries(queries)
+            entities = [[] for _ in queries]
+        else:
+            embeddings, entities = await asyncio.gather(
+                self._encode_queries(queries),
+                self._query_entities(queries)
+            )
+
+        searches = [
+            {
+                "query_embedding": embedding.tolist(),
+                "start_date": start_dt,
+                "end_date": end_dt,
+                "topic": requests[i].get("topic"),
+                "entities": query_entities,
+                "query_text": requests[i]["query"] if SEARCH_MODE == "hybrid" else None,
+            }
+            for (i, _, start_dt, end_dt), embedding, query_entities in zip(pending, embeddings, entities)
+        ]
+        reports = [{} for _ in pending]
+        found = await self.db_service.batch_semantic_search(searches, reports)
+
+        if SEARCH_MODE == "hybrid":
+            # As in _retrieve, searches whose text matched nothing run
+            # again filtered by the entities of their queries
+            missed = [k for k, search in enumerate(reports) if search.get("strategy") != "hybrid"]
+            if missed:
+                missed_entities = await self._query_entities([queries[k] for k in missed])
+                retry = [(k, query_entities) for k, query_entities in zip(missed, missed_entities) if query_entities]
+                if retry:
+                    retry_reports = [{} for _ in retry]
+                    retry_found = await self.db_service.batch_semantic_search(
+                        [{**searches[k], "entities": query_entities, "query_text": None} for k, query_entities in retry],
+                        retry_reports
+                    )
+                    for (k, query_entities), articles, search in zip(retry, retry_found, retry_reports):
+                        entities[k], found[k], reports[k] = query_entities, articles, search
+
+        retrieved = []
+        for (_, request_key, _, _), articles, query_entities, search in zip(pending, found, entities, reports):
+            retrieved.append({"articles": articles, "entities": query_entities, "search": search})
+            if self.cache and articles:
+                self.cache.set_articles(request_key, retrieved[-1])
+        return retrieved
+
+    async def _complete(
+        self,
+        retrieved: Dict[str, Any],
+        summary_mode: str,
+        on_stage: Optional[StageCallback] = None
+    ) -> Dict[str, Any]:
+        """Result of a request from its retrieved articles, with the summary"""
+        articles = retrieved["articles"]
+        entities = retrieved["entities"]
+
+        if not articles:
+            return {"message": "No articles found", "articles": [], "search": retrieved["search"]}
+
+        # Summary generation, served from the summaries cache tier when possible
+        summary_mode = self._effective_summary_mode(summary_mode)
+        summary_key, summary = self._cached_summary(articles, summary_mode)
+
+        if summary is None:
+            print("Starting summary generation")
+            summary_data = await self._generate_summary(articles, summary_mode, on_stage=on_stage)
+            summary = summary_data["summary"]
+            if self.cache and not summary_data.get("failed"):
+                self.cache.set_summary(summary_key, summary)
+
+        return {
+            "summary": summary,
+            "summary_mode": summary_mode,
+            "articles": articles,
+            "entities": entities,
+            "search": retrieved["search"]
+        }
+
+    async def process_stream(
+        self,
+        query: str,
+        topic: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None,
+        summary_mode: str = "quality"
+    ) -> AsyncIterator[Tuple[str, Dict[str, Any]]]:
+        """Same pipeline as process, yielding (event, data) pairs as results
+        become available: the articles right after the search, then summary
+        tokens as T5 decodes them. Beam search cannot be streamed, so
+        "quality" summaries arrive whole in the final summary event.
+        """
+        summary_task = None
+        try:
+            self._validate_summary_mode(summary_mode)
+
+            retrieved = await self._retrieve(query, topic, start_date, end_date)
+            articles = retrieved["articles"]
+            yield "articles", {"articles": articles, "entities": retrieved["entities"], "search": retrieved["search"]}
+
+            if not articles:
+                yield "done", {"message": "No articles found"}
+                return
+
+            summary_mode = self._effective_summary_mode(summary_mode)
+            summary_key, summary = self._cached_summary(articles, summary_mode)
+
+            if summary is None:
+                streamer = None
+                if summary_mode == "fast":
+                    streamer = AsyncTextStreamer(self.summarization_model.tokenizer)
+                summary_task = asyncio.create_task(self._generate_summary(articles, summary_mode, streamer))
+                if streamer:
+                    async for text in streamer:
+                        yield "token", {"text": text}
+
+                summary_data = await summary_task
+                summary = summary_data["summary"]
+                if self.cache and not summary_data.get("failed"):
+                    self.cache.set_summary(summary_key, summary)
+
+            yield "summary", {"summary": summary, "summary_mode": summary_mode}
+            yield "done", {}
+
+        except Exception as e:
+            logger.error(f"Streaming processing failed: {str(e)}", exc_info=True)
+            yield "error", {"error": str(e)}
+
+        finally:
+            # Client went away mid-stream
+            if summary_task and not summary_task.done():
+                summary_task.cancel()
+
+    def _validate_summary_mode(self, summary_mode: str):
+        if summary_mode not in SUMMARY_MODES:
+            raise ValueError(f"Invalid summary mode '{summary_mode}', expected one of {SUMMARY_MODES}")
+
+    async def _publish(self, on_stage: Optional[StageCallback], stage: str, data: Dict[str, Any]):
+        """Report an intermediate stage; failing to do so does not fail the request"""
+        if on_stage is None:
+            return
+        try:
+            await on_stage(stage, data)
+        except Exception as e:
+            logger.warning(f"Publishing stage {stage} failed: {str(e)}")
+
+    async def _retrieve(
+        self,
+        query: str,
+        topic: Optional[str],
+        start_date: Optional[str],
+        end_date: Optional[str],
+        on_stage: Optional[StageCallback] = None
+    ) -> Dict[str, Any]:
+        """Query entities and matching articles, served from the articles
+        cache tier when possible"""
+        # Date handling
+        start_dt = self._parse_date(start_date) if start_date else None
+        end_dt = self._parse_date(end_date) if end_date else None
+
+        request_key = None
+        if self.cache:
+            request_key = self.cache.request_key(query, topic, start_date, end_date)
+            retrieved = self.cache.get_articles(request_key)
+            if retrieved is not None:
+                retrieved = {**retrieved, "search": {"strategy": "cache"}}
+                await self._publish(on_stage, "articles", retrieved)
+                return retrieved
+
+        # Database search, recording the strategy the planner chose
+        search = {}
+        if SEARCH_MODE == "hybrid":
+            query_embedding = (await self._encode(query)).tolist()
+            articles = await self._execute_semantic_search(query_embedding, start_dt, end_dt, topic, [], search, query)
+            entities = []
+            if search.get("strategy") != "hybrid":
+                # No lexical match, so the query's entities filter instead
+                entities = (await self._query_entities([query]))[0]
+                if entities:
+                    search = {}
+                    articles = await self._execute_semantic_search(query_embedding, start_dt, end_dt, topic, entities, search)
+            print(f"Extracted entities: {entities}")
+            await self._publish(on_stage, "entities", {"entities": entities})
+        else:
+            if self.entity_matcher and self.entity_matcher.ready:
+                entities = self.entity_matcher.extract_entities(query)
+                query_embedding = await self._encode(query)
+            else:
+                # Query processing, embedding and NER run concurrently
+                query_embedding, entities = await asyncio.gather(
+                    self._encode(query),
+                    self._run("nlp", self.nlp_model.extract_entities, query)
+                )
+            query_embedding = query_embedding.tolist()
+            print(f"Extracted entities: {entities}")
+            await self._publish(on_stage, "entities", {"entities": entities})
+            articles = await self._execute_semantic_search(query_embedding, start_dt, end_dt, topic, entities, search)
+
+        retrieved = {"articles": articles, "entities": entities, "search": search}
+        if self.cache and articles:
+            self.cache.set_articles(request_key, retrieved)
+        await self._publish(on_stage, "articles", retrieved)
+        return retrieved
+
+    async def _encode_queries(self, queries: List[str]) -> np.ndarray:
+        """Embeddings of several queries; through the batcher, those not
+        memoized are encoded in a single call"""
+        if self.embedding_batcher:
+            return await self.embedding_batcher.encode(queries, memoize=True)
+        return await self._run("embedding", self.embedding_model.encode, queries)
+
+    async def _query_entities(self, queries: List[str]) -> List[List[Tuple[str, str]]]:
+        """Entities of several queries, as _retrieve extracts them"""
+        if self.entity_matcher and self.entity_matcher.ready:
+            return [self.entity_matcher.extract_entities(query) for query in queries]
+        return await self._run("nlp", self.nlp_model.extract_entities_batch, queries)
+
+    def _cached_summary(self, articles: List[Dict[str, Any]], summary_mode: str) -> Tuple[Optional[Tuple], Optional[str]]:
+        """Summaries cache key for the articles and the cached summary, if any"""
+        if not self.cache:
+            return None, None
+        summary_key = self.cache.summary_key(articles[:SUMMARY_ARTICLES], summary_mode)
+        return summary_key, self.cache.get_summary(summary_key)
+
     def _parse_date(self, date_str: str) -> dt:
         """Safe date parsing with validation"""
         try:
@@ -82,7 +408,9 @@ class QueryProcessor:
         start_date: Optional[dt],
         end_date: Optional[dt],
         topic: Optional[str],
-        entities: List[Tuple[str, str]]
+        entities: List[Tuple[str, str]],
+        report: Optional[Dict[str, Any]] = None,
+        query_text: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """Execute search with proper error handling"""
         try:
@@ -91,49 +419,112 @@ class QueryProcessor:
                 start_date=start_date,
                 end_date=end_date,
                 topic=topic,
-                entities=entities
+                entities=entities,
+                report=report,
+                query_text=query_text
             )
         except Exception as e:
             logger.error(f"Semantic search failed: {str(e)}")
             raise
 
-    def _generate_summary(self, articles: List[Dict[str, Any]]) -> Dict[str, Any]:
+    async def _generate_summary(
+        self,
+        articles: List[Dict[str, Any]],
+        mode: str = "quality",
+        streamer=None,
+        on_stage: Optional[StageCallback] = None
+    ) -> Dict[str, Any]:
         """Generate summary from articles with fallback handling"""
         try:
-            contents = [article["content"] for article in articles[:3]]
-            sentences = []
-            
-            for content in contents:
-                if content:
-                    sentences.extend(self.nlp_model.tokenize_sentences(content))
+            sentences, embeddings = await self._article_sentences(articles[:SUMMARY_ARTICLES])
             
             if not sentences:
                 logger.warning("No sentences available for summarization")
                 return {
                     "summary": "No content available for summarization",
+                    "failed": True,
                 }
             
             print("Starting first summary generation")
 
             #Creating graph representation of sentences
-            embeddings = self.embedding_model.encode(sentences)
-            similarity_matrix = np.dot(embeddings, embeddings.T) / (np.linalg.norm(embeddings, axis=1, keepdims=True) * np.linalg.norm(embeddings, axis=1, keepdims=True).T)
-            centrality_scores = degree_centrality_scores(similarity_matrix, threshold=0.1)
-            
-            # Selecting top 10 sentences based on centrality scores
-            top_indices = np.argsort(-centrality_scores)[:10]
+            top_indices = await self._run("lexrank", self._rank_sentences, embeddings)
             key_sentences = [sentences[idx].strip() for idx in top_indices]
             combined_text = ' '.join(key_sentences)
 
             print(f"First summary done with: {len(key_sentences)} sentences")
             print(combined_text)
 
+            if mode == "extractive":
+                return {"summary": combined_text}
+            await self._publish(on_stage, "extractive_summary", {"extractive_summary": combined_text})
+
             return {
-                "summary": self.summarization_model.summarize(combined_text),
+                "summary": await self._summarize(combined_text, mode, streamer),
             }
 
         except Exception as e:
             logger.error(f"Summary generation failed: {str(e)}")
             return {
                 "summary": "Summary generation failed",
-            }
\ No newline at end of file
+                "failed": True,
+            }
+
+        finally:
+            # Unblock stream consumers when generation never ran or failed
+            if streamer:
+                streamer.close()
+
+    async def _article_sentences(self, articles: List[Dict[str, Any]]) -> Tuple[List[str], Optional[np.ndarray]]:
+        """Sentences of the articles and their embeddings.
+
+        Uses the segmentation and sentence embeddings stored by the
+        preprocessing stage where available, so those articles skip both
+        spaCy and the embedder; the others are split and encoded here.
+        """
+        article_ids = [a["article_id"] for a in articles if a.get("article_id") is not None]
+        stored = await self.db_service.fetch_sentences(article_ids)
+
+        # Per article: its sentences and their embeddings (None until encoded)
+        segments = []
+        unsplit = []
+        for article in articles:
+            content = article["content"]
+            if not content:
+                continue
+            entry = stored.get(article.get("article_id"))
+            if entry:
+                segments.append(([content[start:end] for start, end in entry["spans"]], entry["embeddings"]))
+            else:
+                unsplit.append(len(segments))
+                segments.append((content, None))
+
+        # Articles without stored sentences are segmented in one spaCy batch
+        if unsplit:
+            splits = await self._run(
+                "nlp", self.nlp_model.tokenize_sentences_batch, [segments[i][0] for i in unsplit]
+            )
+            for i, split in zip(unsplit, splits):
+                segments[i] = (split, None)
+
+        missing = [sentence for split, embeddings in segments if embeddings is None for sentence in split]
+        if missing:
+            encoded = await self._encode(missing)
+            offset = 0
+            for i, (split, embeddings) in enumerate(segments):
+                if embeddings is None:
+                    segments[i] = (split, encoded[offset:offset + len(split)])
+                    offset += len(split)
+
+        sentences = [sentence for split, _ in segments for sentence in split]
+        if not sentences:
+            return [], None
+        return sentences, np.vstack([embeddings for split, embeddings in segments if split])
+
+    @staticmethod
+    def _rank_sentences(embeddings: np.ndarray, top_n: int = 10) -> np.ndarray:
+        """Indices of the top_n most central sentences according to LexRank"""
+        centrality_scores = sparse_degree_centrality_scores(embeddings, threshold=0.1)
+
+        # Selecting top sentences based on centrality scores, ties in sentence order
+        return np.argsort(-centrality_scores, kind="stable")[:top_n]
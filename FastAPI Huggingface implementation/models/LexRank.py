@@ -6,6 +6,7 @@ Source: https://github.com/crabcamp/lexrank/tree/dev
 import logging
 
 import numpy as np
+from scipy import sparse
 from scipy.sparse.csgraph import connected_components
 from scipy.special import softmax
 
@@ -66,13 +67,11 @@ def _power_method(transition_matrix, increase_power=True, max_iter=10000):
 def connected_nodes(matrix):
     _, labels = connected_components(matrix)
 
-    groups = []
+    # Group node indices by component label in one sort instead of one scan per label
+    order = np.argsort(labels, kind="stable")
+    boundaries = np.flatnonzero(np.diff(labels[order])) + 1
 
-    for tag in np.unique(labels):
-        group = np.where(labels == tag)[0]
-        groups.append(group)
-
-    return groups
+    return np.split(order, boundaries)
 
 
 def create_markov_matrix(weights_matrix):
@@ -118,4 +117,74 @@ def stationary_distribution(
     if normalized:
         distribution /= n_1
 
-    return distribution
\ No newline at end of file
+    return distribution
+
+
+def sparse_degree_centrality_scores(
+    embeddings,
+    threshold=0.1,
+    max_iter=1000,
+    tol=1e-10,
+    block_size=1024,
+):
+    """
+    Sparse equivalent of degree_centrality_scores(cosine_similarity(embeddings), threshold).
+
+    The thresholded graph is kept as a sparse adjacency matrix A built from
+    L2-normalized float32 embeddings, block by block, so the dense n x n
+    similarity matrix is never materialized. The dense implementation turns
+    A into a Markov matrix with a row softmax, which over a 0/1 matrix is
+    M = D^-1 (J + (e - 1) A) with J all ones and D the row sums, so
+    M^T v = sum(v / d) + (e - 1) A^T (v / d) costs O(nnz) per step. Every
+    entry of M is positive, hence the chain has a single component and the
+    power iteration converges geometrically without squaring the matrix.
+    Scores are scaled like the dense version (they sum to n).
+    """
+    if not (isinstance(threshold, float) and 0 <= threshold < 1):
+        raise ValueError(
+            "'threshold' should be a floating-point number from the interval [0, 1)",
+        )
+
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    n = len(embeddings)
+    if n <= 1:
+        return np.ones(n)
+
+    adjacency = thresholded_adjacency(embeddings, threshold, block_size)
+    degrees = np.asarray(adjacency.sum(axis=1)).ravel()
+
+    scale = np.e - 1
+    row_sums = n + scale * degrees
+    transition_t = adjacency.T.tocsr()
+
+    eigenvector = np.ones(n)
+    for _ in range(max_iter):
+        weighted = eigenvector / row_sums
+        eigenvector_next = weighted.sum() + scale * (transition_t @ weighted)
+
+        if np.abs(eigenvector_next - eigenvector).max() <= tol * n:
+            return eigenvector_next
+
+        eigenvector = eigenvector_next
+
+    logger.warning("Maximum number of iterations for sparse power method exceeded without convergence!")
+    return eigenvector_next
+
+
+def thresholded_adjacency(embeddings, threshold, block_size=1024):
+    """Sparse 0/1 matrix of cosine similarity >= threshold, computed in row blocks"""
+    norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+    normalized = embeddings / np.where(norms == 0, 1, norms)
+
+    n = len(normalized)
+    rows, cols = [], []
+    for start in range(0, n, block_size):
+        similarity = normalized[start:start + block_size] @ normalized.T
+        block_rows, block_cols = np.nonzero(similarity >= threshold)
+        rows.append(block_rows + start)
+        cols.append(block_cols)
+
+    rows = np.concatenate(rows)
+    cols = np.concatenate(cols)
+    data = np.ones(len(rows), dtype=np.float64)
+    return sparse.csr_matrix((data, (rows, cols)), shape=(n, n))
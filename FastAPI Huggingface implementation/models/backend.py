@@ -0,0 +1,95 @@
+"""
+Inference backend selection for the transformer models.
+
+"torch" runs the Hugging Face models as they are. "onnx" exports them once
+to ONNX_CACHE_DIR, applies dynamic int8 quantization (unless
+ONNX_QUANTIZE=false) and runs them with ONNX Runtime, which is
+considerably faster than fp32 PyTorch on CPU-only hosts.
+"""
+
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+BACKENDS = ("torch", "onnx")
+
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "kairos-onnx"))
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "true").lower() == "true"
+# Instruction set targeted by the quantized kernels: avx2, avx512, avx512_vnni or arm64
+ONNX_QUANTIZATION_CONFIG = os.getenv("ONNX_QUANTIZATION_CONFIG", "avx2")
+
+# Files written by optimum for a seq2seq export with a KV cache
+SEQ2SEQ_ONNX_FILES = ("encoder_model", "decoder_model", "decoder_with_past_model")
+
+
+def get_backend(env_var: str, backend: str = None) -> str:
+    """Backend passed explicitly, else from env_var, defaulting to torch"""
+    backend = (backend or os.getenv(env_var, "torch")).lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown inference backend '{backend}' for {env_var}, expected one of {BACKENDS}")
+    return backend
+
+
+def onnx_model_dir(name: str) -> str:
+    return os.path.join(ONNX_CACHE_DIR, name.replace("/", "--"))
+
+
+def quantization_config(is_static: bool = False):
+    from optimum.onnxruntime.configuration import AutoQuantizationConfig
+
+    return getattr(AutoQuantizationConfig, ONNX_QUANTIZATION_CONFIG)(is_static=is_static, per_channel=False)
+
+
+def load_onnx_seq2seq(model_name: str):
+    """Export a seq2seq model to ONNX with a decoder KV cache, quantize it
+    once and load it with ONNX Runtime"""
+    from optimum.onnxruntime import ORTModelForSeq2SeqLM, ORTQuantizer
+
+    path = onnx_model_dir(model_name)
+    if not os.path.exists(os.path.join(path, "encoder_model.onnx")):
+        logger.info(f"Exporting {model_name} to ONNX in {path}")
+        model = ORTModelForSeq2SeqLM.from_pretrained(model_name, export=True, use_cache=True)
+        model.save_pretrained(path)
+
+    if not ONNX_QUANTIZE:
+        return ORTModelForSeq2SeqLM.from_pretrained(path, use_cache=True)
+
+    for file_name in SEQ2SEQ_ONNX_FILES:
+        if not os.path.exists(os.path.join(path, f"{file_name}_quantized.onnx")):
+            logger.info(f"Quantizing {file_name} of {model_name} to int8")
+            quantizer = ORTQuantizer.from_pretrained(path, file_name=f"{file_name}.onnx")
+            quantizer.quantize(save_dir=path, quantization_config=quantization_config())
+
+    return ORTModelForSeq2SeqLM.from_pretrained(
+        path,
+        use_cache=True,
+        encoder_file_name="encoder_model_quantized.onnx",
+        decoder_file_name="decoder_model_quantized.onnx",
+        decoder_with_past_file_name="decoder_with_past_model_quantized.onnx",
+    )
+
+
+def load_onnx_sentence_transformer(model_name: str):
+    """Export a sentence-transformers model to ONNX, quantize it once and
+    load it with the ONNX Runtime backend"""
+    from sentence_transformers import SentenceTransformer, export_dynamic_quantized_onnx_model
+
+    path = onnx_model_dir(model_name)
+    if not os.path.exists(os.path.join(path, "onnx", "model.onnx")):
+        logger.info(f"Exporting {model_name} to ONNX in {path}")
+        SentenceTransformer(model_name, backend="onnx").save(path)
+
+    if not ONNX_QUANTIZE:
+        return SentenceTransformer(path, backend="onnx")
+
+    file_name = f"onnx/model_qint8_{ONNX_QUANTIZATION_CONFIG}.onnx"
+    if not os.path.exists(os.path.join(path, file_name)):
+        logger.info(f"Quantizing {model_name} to int8")
+        export_dynamic_quantized_onnx_model(
+            SentenceTransformer(path, backend="onnx"),
+            ONNX_QUANTIZATION_CONFIG,
+            path
+        )
+
+    return SentenceTransformer(path, backend="onnx", model_kwargs={"file_name": file_name})
@@ -1,10 +1,56 @@
+import os
+from typing import List, Optional, Union
 from sentence_transformers import SentenceTransformer
+import numpy as np
 import torch
 
+from models.backend import get_backend, load_onnx_sentence_transformer
+from services.cache import LRUCache, normalize_text
+
+MODEL_NAME = "paraphrase-multilingual-MiniLM-L12-v2"
+
 class EmbeddingModel:
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.model = SentenceTransformer("paraphrase-multilingual-MiniLM-L12-v2")
-    
-    def encode(self, text: str):
-        return self.model.encode(text, device=self.device)
\ No newline at end of file
+    def __init__(self, backend: str = None):
+        self.backend = get_backend("EMBEDDING_BACKEND", backend)
+        if self.backend == "onnx":
+            self.device = "cpu"
+            self.model = load_onnx_sentence_transformer(MODEL_NAME)
+        else:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = SentenceTransformer(MODEL_NAME)
+        # Memoized single-text (query) embeddings, keyed on NFKC text with
+        # collapsed whitespace
+        self.cache = LRUCache(
+            max_entries=int(os.getenv("EMBEDDING_CACHE_SIZE", "4096")),
+            name="embeddings"
+        )
+
+    def encode(self, text: Union[str, List[str]]):
+        if not isinstance(text, str):
+            return self.model.encode(text, device=self.device)
+
+        embedding = self.cached(text)
+        if embedding is None:
+            embedding = self.model.encode(text, device=self.device)
+            self.remember(text, embedding)
+        return embedding
+
+    @staticmethod
+    def _key(text: str) -> str:
+        # The MiniLM tokenizer is cased and sees punctuation, so only
+        # Unicode form and whitespace are normalized
+        return normalize_text(text, casefold=False, strip_punctuation=False)
+
+    def cached(self, text: str) -> Optional[np.ndarray]:
+        """Memoized embedding for a query text, if any"""
+        if self.cache.max_entries <= 0:
+            return None
+        return self.cache.get(self._key(text))
+
+    def remember(self, text: str, embedding: np.ndarray) -> None:
+        """Memoize the embedding of a query text"""
+        if self.cache.max_entries <= 0:
+            return
+        # Shared between callers, so guard against in-place changes
+        embedding.setflags(write=False)
+        self.cache.set(self._key(text), embedding)
@@ -0,0 +1,112 @@
+import os
+import time
+import logging
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from database.entities import normalize_entity
+
+logger = logging.getLogger(__name__)
+
+# Marks the end of an entity in the token trie; maps each of its entity
+# groups to the corpus spelling first seen, which the search query matches
+_END = None
+
+
+class EntityGazetteer:
+    """Query entity matcher over the entity vocabulary of articles.ner.
+
+    The normalized mentions are compiled into a trie of tokens, and queries
+    are scanned left to right for the longest known mention at each
+    position, so matching costs microseconds and only yields (word,
+    entity_group) pairs the corpus contains. Mentions shorter than
+    min_length characters or found in fewer than min_articles articles are
+    left out to keep stray tokens from becoming filters. refresh() adds the
+    mentions of articles loaded since the previous refresh.
+    """
+
+    def __init__(self, min_length: int = None, min_articles: int = None):
+        self.min_length = min_length or int(os.getenv("GAZETTEER_MIN_LENGTH", "3"))
+        self.min_articles = min_articles or int(os.getenv("GAZETTEER_MIN_ARTICLES", "2"))
+
+        self._trie: Dict[str, Any] = {}
+        # (normalized word, entity_group) -> number of articles mentioning it
+        self._counts: Dict[Tuple[str, str], int] = {}
+        self.entries = 0
+        self.last_article_id = 0
+        self.refreshed_at: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.refreshed_at is not None
+
+    def add(self, rows: Iterable[Tuple[str, str, int]]):
+        """Count (word, entity_group, n_articles) rows into the vocabulary"""
+        for word, entity_group, n_articles in rows:
+            norm = normalize_entity(word)
+            if len(norm) < self.min_length:
+                continue
+            key = (norm, entity_group)
+            previous = self._counts.get(key, 0)
+            self._counts[key] = previous + n_articles
+            if previous < self.min_articles <= previous + n_articles:
+                self._insert(norm, entity_group, word)
+
+    def _insert(self, norm: str, entity_group: str, word: str):
+        node = self._trie
+        for token in norm.split():
+            node = node.setdefault(token, {})
+        groups = node.setdefault(_END, {})
+        if entity_group not in groups:
+            groups[entity_group] = word.lower()
+            self.entries += 1
+
+    def extract_entities(self, text: str) -> List[Tuple[str, str]]:
+        """(word, entity_group) pairs of the known mentions in text"""
+        tokens = normalize_entity(text).split()
+        entities = []
+        i = 0
+        while i < len(tokens):
+            node = self._trie
+            match_end, match_groups = None, None
+            for j in range(i, len(tokens)):
+                node = node.get(tokens[j])
+                if node is None:
+                    break
+                if _END in node:
+                    match_end, match_groups = j + 1, node[_END]
+
+            if match_end is None:
+                i += 1
+                continue
+
+            for entity_group, word in match_groups.items():
+                if (word, entity_group) not in entities:
+                    entities.append((word, entity_group))
+            i = match_end
+        return entities
+
+    async def refresh(self, db_service) -> int:
+        """Add the mentions of articles loaded since the last refresh;
+        returns the number of vocabulary rows read."""
+        start = time.perf_counter()
+        vocabulary = await db_service.fetch_entity_vocabulary(self.last_article_id)
+        if vocabulary is None:
+            return 0
+
+        rows, last_article_id = vocabulary
+        self.add(rows)
+        self.last_article_id = max(self.last_article_id, last_article_id)
+        self.refreshed_at = time.time()
+        logger.info(
+            f"Gazetteer refreshed with {len(rows)} rows in {time.perf_counter() - start:.2f}s "
+            f"({self.entries} entries, last article {self.last_article_id})"
+        )
+        return len(rows)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": self.entries,
+            "mentions": len(self._counts),
+            "last_article_id": self.last_article_id,
+            "refreshed_at": self.refreshed_at,
+        }
@@ -1,35 +1,135 @@
+import os
 import spacy
-from typing import List, Union
+from typing import Iterable, List, Optional, Union
 import logging
 
+from services.cache import LRUCache, normalize_text
+
 logger = logging.getLogger(__name__)
 
+MODEL_NAME = "pt_core_news_md"
+
+# Components neither task uses; excluded at load time
+UNUSED_COMPONENTS = ["morphologizer", "lemmatizer", "attribute_ruler"]
+
+# Sentence segmenters: the dependency parser of the statistical model, which
+# the preprocessing stage also uses, or spaCy's rule-based sentencizer on a
+# blank pipeline (punctuation only, no model)
+SENTENCE_SEGMENTERS = ("parser", "sentencizer")
+
+
 class NLPModel:
-    def __init__(self):
+    def __init__(self, sentence_segmenter: Optional[str] = None):
+        self.sentence_segmenter = (sentence_segmenter or os.getenv("SENTENCE_SEGMENTER", "parser")).lower()
+        if self.sentence_segmenter not in SENTENCE_SEGMENTERS:
+            raise ValueError(
+                f"Unknown sentence segmenter '{self.sentence_segmenter}', expected one of {SENTENCE_SEGMENTERS}"
+            )
+
+        # nlp.pipe settings for the batch APIs; n_process > 1 forks worker
+        # processes with their own copy of the pipeline
+        self.batch_size = int(os.getenv("NLP_BATCH_SIZE", "64"))
+        self.n_process = int(os.getenv("NLP_N_PROCESS", "1"))
+
         try:
             # Load spaCy model only
-            self.nlp = spacy.load("pt_core_news_md")
-            logger.info("spaCy model initialized successfully")
+            self.nlp = spacy.load(MODEL_NAME, exclude=UNUSED_COMPONENTS)
+            if self.sentence_segmenter == "sentencizer":
+                self.sentencizer = spacy.blank("pt")
+                self.sentencizer.add_pipe("sentencizer")
+            logger.info(f"spaCy model initialized successfully (pipeline={self.nlp.pipe_names})")
         except Exception as e:
             logger.error(f"Failed to initialize spaCy model: {str(e)}")
             raise
 
+        # Each task runs only its component and the tok2vec layers it listens to
+        self.ner_disabled = self._disabled_for("ner")
+        self.parser_disabled = self._disabled_for("parser")
+
+        # Memoized entity extraction results, keyed on normalized text. Case
+        # is kept in the key because the statistical NER depends on it
+        self.entity_cache = LRUCache(
+            max_entries=int(os.getenv("NER_CACHE_SIZE", "4096")),
+            name="entities"
+        )
+
+    def _disabled_for(self, component: str) -> List[str]:
+        """Pipeline components not needed to run the given component"""
+        needed = {component}
+        for name, pipe in self.nlp.pipeline:
+            if component in getattr(pipe, "listening_components", []):
+                needed.add(name)
+        return [name for name in self.nlp.pipe_names if name not in needed]
+
+    def _pipe(self, texts: Iterable[str], disable: List[str], n_process: Optional[int] = None):
+        return self.nlp.pipe(
+            texts,
+            disable=disable,
+            batch_size=self.batch_size,
+            n_process=n_process or self.n_process
+        )
+
     def extract_entities(self, text: Union[str, List[str]]) -> List[tuple]:
         """Entity extraction using spaCy"""
         try:
             if isinstance(text, list):
                 text = " ".join(text)
-            doc = self.nlp(text)
-            return [(ent.text.lower(), ent.label_) for ent in doc.ents]
+            key = normalize_text(text, casefold=False)
+            entities = self.entity_cache.get(key)
+            if entities is None:
+                doc = self.nlp(text, disable=self.ner_disabled)
+                entities = tuple((ent.text.lower(), ent.label_) for ent in doc.ents)
+                self.entity_cache.set(key, entities)
+            return list(entities)
         except Exception as e:
             logger.error(f"Entity extraction failed: {str(e)}")
             return []
 
+    def extract_entities_batch(self, texts: List[str], n_process: Optional[int] = None) -> List[List[tuple]]:
+        """Entity extraction over many texts with nlp.pipe, sharing the cache"""
+        results: List[Optional[tuple]] = [None] * len(texts)
+        pending = {}
+        for i, text in enumerate(texts):
+            key = normalize_text(text, casefold=False)
+            entities = self.entity_cache.get(key)
+            if entities is None:
+                pending.setdefault(key, []).append(i)
+            else:
+                results[i] = entities
+
+        try:
+            keys = list(pending)
+            docs = self._pipe((texts[pending[key][0]] for key in keys), self.ner_disabled, n_process)
+            for key, doc in zip(keys, docs):
+                entities = tuple((ent.text.lower(), ent.label_) for ent in doc.ents)
+                self.entity_cache.set(key, entities)
+                for i in pending[key]:
+                    results[i] = entities
+        except Exception as e:
+            logger.error(f"Batch entity extraction failed: {str(e)}")
+
+        return [list(entities or ()) for entities in results]
+
     def tokenize_sentences(self, text: str) -> List[str]:
         """Sentence tokenization using spaCy"""
         try:
-            doc = self.nlp(text)
+            if self.sentence_segmenter == "sentencizer":
+                doc = self.sentencizer(text)
+            else:
+                doc = self.nlp(text, disable=self.parser_disabled)
             return [sent.text for sent in doc.sents]
         except Exception as e:
             logger.error(f"Sentence tokenization failed: {str(e)}")
-            return [text]  # Fallback to returning whole text
\ No newline at end of file
+            return [text]  # Fallback to returning whole text
+
+    def tokenize_sentences_batch(self, texts: List[str], n_process: Optional[int] = None) -> List[List[str]]:
+        """Sentence tokenization over many texts with nlp.pipe"""
+        try:
+            if self.sentence_segmenter == "sentencizer":
+                docs = self.sentencizer.pipe(texts, batch_size=self.batch_size)
+            else:
+                docs = self._pipe(texts, self.parser_disabled, n_process)
+            return [[sent.text for sent in doc.sents] for doc in docs]
+        except Exception as e:
+            logger.error(f"Batch sentence tokenization failed: {str(e)}")
+            return [[text] for text in texts]
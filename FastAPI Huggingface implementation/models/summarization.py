@@ -1,29 +1,91 @@
-from transformers import T5Tokenizer, T5ForConditionalGeneration
+import asyncio
+from typing import List
+from transformers import T5Tokenizer, T5ForConditionalGeneration, TextStreamer
 import torch
 
+from models.backend import get_backend, load_onnx_seq2seq
+
+TOKENIZER_NAME = 'unicamp-dl/ptt5-base-portuguese-vocab'
+MODEL_NAME = 'recogna-nlp/ptt5-base-summ'
+
+# Decoding parameters per abstractive summary mode, from cheapest to best
+GENERATION_MODES = {
+    "fast": {
+        "max_length": 160,
+        "min_length": 32,
+        "num_beams": 1,
+        "no_repeat_ngram_size": 3,
+    },
+    "quality": {
+        "max_length": 512,
+        "min_length": 128,
+        "num_beams": 5,
+        "no_repeat_ngram_size": 3,
+        "early_stopping": False,
+    },
+}
+
+class AsyncTextStreamer(TextStreamer):
+    """TextStreamer handing decoded text from the generating thread to an
+    asyncio consumer. Must be created on the event loop thread."""
+
+    def __init__(self, tokenizer):
+        super().__init__(tokenizer, skip_prompt=True, skip_special_tokens=True)
+        self.loop = asyncio.get_running_loop()
+        self.queue: asyncio.Queue = asyncio.Queue()
+
+    def on_finalized_text(self, text: str, stream_end: bool = False):
+        if text:
+            self.loop.call_soon_threadsafe(self.queue.put_nowait, text)
+        if stream_end:
+            self.close()
+
+    def close(self):
+        """Signal the consumer that no more text will arrive"""
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        text = await self.queue.get()
+        if text is None:
+            raise StopAsyncIteration
+        return text
+
 class SummarizationModel:
-    def __init__(self):
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
-        self.tokenizer = T5Tokenizer.from_pretrained('unicamp-dl/ptt5-base-portuguese-vocab')
-        self.model = T5ForConditionalGeneration.from_pretrained('recogna-nlp/ptt5-base-summ').to(self.device)
-    
-    def summarize(self, text: str) -> str:
-        """Summarize the input text using T5 model"""
+    def __init__(self, backend: str = None):
+        self.backend = get_backend("SUMMARIZATION_BACKEND", backend)
+        self.tokenizer = T5Tokenizer.from_pretrained(TOKENIZER_NAME)
+        if self.backend == "onnx":
+            self.device = "cpu"
+            self.model = load_onnx_seq2seq(MODEL_NAME)
+        else:
+            self.device = "cuda" if torch.cuda.is_available() else "cpu"
+            self.model = T5ForConditionalGeneration.from_pretrained(MODEL_NAME).to(self.device)
+
+    def summarize(self, text: str, mode: str = "quality", streamer: TextStreamer = None) -> str:
+        """Summarize the input text using T5 model, optionally streaming
+        the decoded text (greedy modes only)"""
+        return self.summarize_batch([text], mode, streamer)[0]
+
+    def summarize_batch(self, texts: List[str], mode: str = "quality", streamer: TextStreamer = None) -> List[str]:
+        """Summarize several texts with a single padded generate call"""
         # Model and tokenization parameters
-        inputs = self.tokenizer.encode(
-            text,
+        inputs = self.tokenizer(
+            texts,
             max_length=1024,
             truncation=True,
+            padding=True,
             return_tensors='pt'
         ).to(self.device)
-        
-        summary_ids = self.model.generate(
-            inputs,
-            max_length=512,
-            min_length=128,
-            num_beams=5,
-            no_repeat_ngram_size=3,
-            early_stopping=False,
-        )
-        
-        return self.tokenizer.decode(summary_ids[0], skip_special_tokens=True)
\ No newline at end of file
+
+        with torch.inference_mode():
+            summary_ids = self.model.generate(
+                input_ids=inputs["input_ids"],
+                attention_mask=inputs["attention_mask"],
+                streamer=streamer,
+                **GENERATION_MODES[mode],
+            )
+
+        return self.tokenizer.batch_decode(summary_ids, skip_special_tokens=True)
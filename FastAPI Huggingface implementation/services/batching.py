@@ -0,0 +1,254 @@
+import os
+import asyncio
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+class MicroBatcher(ABC):
+    """Coalesces requests from concurrent jobs into shared model calls.
+
+    Requests are collected for at most max_wait_ms after the first one
+    arrives, or until max_batch_size items are pending, then handed to
+    _run_batch in one call on the model's executor pool and split back to
+    their callers. One batch runs per pool worker while the next one
+    collects. A max_queue_size of 0 means an unbounded queue.
+    """
+
+    # InferenceExecutor pool the batches run on
+    pool: str = None
+
+    def __init__(
+        self,
+        executor=None,
+        max_batch_size: int = 32,
+        max_wait_ms: float = 5,
+        max_queue_size: int = 0,
+        name: str = "batcher"
+    ):
+        self.executor = executor
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000
+        self.max_queue_size = max_queue_size
+        self.name = name
+        self.concurrency = executor.workers[self.pool] if executor else 1
+
+        self.queue: "asyncio.Queue[Tuple[List[Any], asyncio.Future]]" = None
+        self._slots: asyncio.Semaphore = None
+        self._task: asyncio.Task = None
+        self._inflight: Set[asyncio.Task] = set()
+
+        self.batches = 0
+        self.requests = 0
+        self.items = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def start(self):
+        self.queue = asyncio.Queue(maxsize=self.max_queue_size)
+        self._slots = asyncio.Semaphore(self.concurrency)
+        self._task = asyncio.create_task(self._collect_loop())
+        logger.info(
+            f"{self.name} started (max_batch_size={self.max_batch_size}, "
+            f"max_wait={self.max_wait * 1000:.1f}ms, max_queue_size={self.max_queue_size})"
+        )
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        if self._inflight:
+            await asyncio.gather(*self._inflight, return_exceptions=True)
+        while self.queue and not self.queue.empty():
+            _, future = self.queue.get_nowait()
+            if not future.done():
+                future.set_exception(RuntimeError(f"{self.name} stopped"))
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    async def submit(self, items: Sequence[Any], timeout: Optional[float] = None) -> Any:
+        """Queue items for the next batch and wait for their results"""
+        future = asyncio.get_running_loop().create_future()
+        try:
+            self.queue.put_nowait((list(items), future))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            raise RuntimeError(f"{self.name} queue is full ({self.max_queue_size} pending requests)")
+
+        try:
+            # On timeout the future is cancelled and skipped by its batch
+            return await asyncio.wait_for(future, timeout)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise TimeoutError(f"{self.name} request timed out after {timeout}s")
+
+    async def _run(self, fn, *args):
+        if self.executor:
+            return await self.executor.run(self.pool, fn, *args)
+        return await asyncio.to_thread(fn, *args)
+
+    @abstractmethod
+    def _run_batch(self, items: List[Any]) -> Sequence[Any]:
+        """Blocking model call over the flattened items of a batch"""
+
+    async def _collect_loop(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            try:
+                batch = [await self.queue.get()]
+                size = len(batch[0][0])
+                deadline = loop.time() + self.max_wait
+                while size < self.max_batch_size:
+                    timeout = deadline - loop.time()
+                    if timeout <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), timeout)
+                    except asyncio.TimeoutError:
+                        break
+                    batch.append(item)
+                    size += len(item[0])
+            except BaseException:
+                self._slots.release()
+                raise
+
+            task = asyncio.create_task(self._process_batch(batch))
+            self._inflight.add(task)
+            task.add_done_callback(self._inflight.discard)
+
+    async def _process_batch(self, batch: List[Tuple[List[Any], asyncio.Future]]):
+        try:
+            # Callers that timed out or were cancelled while queued are dropped
+            batch = [(items, future) for items, future in batch if not future.done()]
+            if not batch:
+                return
+
+            flat = [item for items, _ in batch for item in items]
+            self.batches += 1
+            self.requests += len(batch)
+            self.items += len(flat)
+            try:
+                results = await self._run(self._run_batch, flat)
+            except Exception as e:
+                logger.error(f"{self.name}: batch of {len(flat)} items failed: {str(e)}")
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                return
+
+            offset = 0
+            for items, future in batch:
+                if not future.done():
+                    future.set_result(results[offset:offset + len(items)])
+                offset += len(items)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "batches": self.batches,
+            "requests": self.requests,
+            "items": self.items,
+            "avg_requests_per_batch": self.requests / self.batches if self.batches else 0.0,
+            "avg_items_per_batch": self.items / self.batches if self.batches else 0.0,
+            "pending": self.queue.qsize() if self.queue else 0,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+        }
+
+
+class EmbeddingBatcher(MicroBatcher):
+    """Shares MiniLM forward passes between queries and summary sentences
+    of concurrent jobs. Query strings, and lists of queries encoded with
+    memoize, still go through the model's memoization.
+    """
+
+    pool = "embedding"
+
+    def __init__(self, embedding_model, executor=None, max_batch_size: int = None, max_wait_ms: float = None):
+        super().__init__(
+            executor=executor,
+            max_batch_size=max_batch_size or int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", "64")),
+            max_wait_ms=max_wait_ms if max_wait_ms is not None else float(os.getenv("EMBEDDING_BATCH_MAX_WAIT_MS", "5")),
+            name="Embedding batcher"
+        )
+        self.embedding_model = embedding_model
+
+    async def encode(self, text: Union[str, List[str]], memoize: bool = False) -> np.ndarray:
+        """Encode a query string or a list of texts as part of a shared
+        batch. With memoize, the texts of a list are looked up and
+        remembered like query strings, and only the missing ones encoded."""
+        single = isinstance(text, str)
+        texts = [text] if single else list(text)
+        if not (single or memoize):
+            if not texts or not self.running:
+                return await self._run(self.embedding_model.encode, texts)
+            return await self.submit(texts)
+
+        embeddings = [self.embedding_model.cached(t) for t in texts]
+        missing = [i for i, embedding in enumerate(embeddings) if embedding is None]
+        if missing:
+            missing_texts = [texts[i] for i in missing]
+            if self.running:
+                encoded = await self.submit(missing_texts)
+            else:
+                encoded = await self._run(self.embedding_model.encode, missing_texts)
+            for i, embedding in zip(missing, encoded):
+                # Copy so the cached row does not keep the whole batch alive
+                embeddings[i] = embedding.copy()
+                self.embedding_model.remember(texts[i], embeddings[i])
+        return embeddings[0] if single else np.asarray(embeddings)
+
+    def _run_batch(self, items: List[str]) -> np.ndarray:
+        return self.embedding_model.encode(items)
+
+
+class SummarizationBatcher(MicroBatcher):
+    """Groups pending summary inputs from concurrent jobs into padded
+    batches for a single T5 generate call per summary mode, with a bounded
+    queue and a per-request timeout.
+    """
+
+    pool = "summarization"
+
+    def __init__(
+        self,
+        summarization_model,
+        executor=None,
+        max_batch_size: int = None,
+        max_wait_ms: float = None,
+        max_queue_size: int = None,
+        timeout: float = None
+    ):
+        super().__init__(
+            executor=executor,
+            max_batch_size=max_batch_size or int(os.getenv("SUMMARY_BATCH_MAX_SIZE", "4")),
+            max_wait_ms=max_wait_ms if max_wait_ms is not None else float(os.getenv("SUMMARY_BATCH_MAX_WAIT_MS", "50")),
+            max_queue_size=max_queue_size if max_queue_size is not None else int(os.getenv("SUMMARY_QUEUE_SIZE", "64")),
+            name="Summarization batcher"
+        )
+        self.summarization_model = summarization_model
+        self.timeout = timeout if timeout is not None else float(os.getenv("SUMMARY_TIMEOUT", "300"))
+
+    async def summarize(self, text: str, mode: str = "quality") -> str:
+        if not self.running:
+            return await self._run(self.summarization_model.summarize, text, mode)
+        summaries = await self.submit([(text, mode)], timeout=self.timeout)
+        return summaries[0]
+
+    def _run_batch(self, items: List[Tuple[str, str]]) -> List[str]:
+        # Decoding parameters differ per mode, so each mode is one generate call
+        summaries = [None] * len(items)
+        for mode in dict.fromkeys(mode for _, mode in items):
+            indices = [i for i, (_, m) in enumerate(items) if m == mode]
+            texts = [items[i][0] for i in indices]
+            for i, summary in zip(indices, self.summarization_model.summarize_batch(texts, mode)):
+                summaries[i] = summary
+        return summaries
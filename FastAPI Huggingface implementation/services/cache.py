@@ -0,0 +1,213 @@
+import os
+import re
+import sys
+import time
+import json
+import hashlib
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+def normalize_text(text: str, casefold: bool = True, strip_punctuation: bool = True) -> str:
+    """Normalize query text so trivially different spellings share a cache key"""
+    text = unicodedata.normalize("NFKC", text)
+    if casefold:
+        text = text.casefold()
+    text = re.sub(r"\s+", " ", text).strip()
+    return text.rstrip("?!.;, ") if strip_punctuation else text
+
+
+def estimate_size(value: Any) -> int:
+    """Approximate the memory footprint of a cached value in bytes"""
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set)):
+        return sys.getsizeof(value) + sum(estimate_size(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe LRU cache with per-entry TTL and an optional memory cap"""
+
+    def __init__(
+        self,
+        max_entries: int = 1024,
+        ttl: Optional[float] = None,
+        max_bytes: Optional[int] = None,
+        name: str = "cache"
+    ):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.name = name
+        self._data: "OrderedDict[Hashable, Tuple[Any, float, int]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._data.get(key, _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return default
+
+            value, expires_at, _ = entry
+            if expires_at and expires_at < time.monotonic():
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return default
+
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: Hashable, value: Any) -> None:
+        size = estimate_size(value) if self.max_bytes else 0
+        if self.max_bytes and size > self.max_bytes:
+            logger.debug(f"{self.name}: value of {size} bytes exceeds cache capacity, not cached")
+            return
+
+        expires_at = time.monotonic() + self.ttl if self.ttl else 0.0
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._data[key] = (value, expires_at, size)
+            self._bytes += size
+
+            while self._data and (
+                len(self._data) > self.max_entries
+                or (self.max_bytes and self._bytes > self.max_bytes)
+            ):
+                oldest = next(iter(self._data))
+                self._remove(oldest)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+            self._bytes = 0
+
+    def _remove(self, key: Hashable) -> None:
+        _, _, size = self._data.pop(key)
+        self._bytes -= size
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._data),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+            }
+
+
+class ResultCache:
+    """Two-tier cache for QueryProcessor results.
+
+    The articles tier maps a normalized request to the retrieved articles
+    and query entities. The summaries tier maps the articles that feed the
+    summarizer to the generated summary, so different queries retrieving
+    the same top articles share one summary.
+    """
+
+    def __init__(self):
+        # CACHE_MAX_MB is the budget of both tiers together; the articles
+        # tier, holding full article contents, gets CACHE_ARTICLES_SHARE of
+        # it. Kept off 0 and 1, since a max_bytes of 0 means no limit
+        max_bytes = int(float(os.getenv("CACHE_MAX_MB", "256")) * 1024 * 1024)
+        articles_share = min(max(float(os.getenv("CACHE_ARTICLES_SHARE", "0.75")), 0.05), 0.95)
+        articles_bytes = int(max_bytes * articles_share)
+        self.enabled = os.getenv("CACHE_ENABLED", "true").lower() == "true"
+        self.articles = LRUCache(
+            max_entries=int(os.getenv("CACHE_ARTICLES_MAX_ENTRIES", "1024")),
+            ttl=float(os.getenv("CACHE_ARTICLES_TTL", "3600")),
+            max_bytes=articles_bytes,
+            name="articles"
+        )
+        self.summaries = LRUCache(
+            max_entries=int(os.getenv("CACHE_SUMMARIES_MAX_ENTRIES", "1024")),
+            ttl=float(os.getenv("CACHE_SUMMARIES_TTL", "86400")),
+            max_bytes=max_bytes - articles_bytes,
+            name="summaries"
+        )
+
+    @staticmethod
+    def request_key(
+        query: str,
+        topic: Optional[str] = None,
+        start_date: Optional[str] = None,
+        end_date: Optional[str] = None
+    ) -> Tuple:
+        return (
+            normalize_text(query),
+            normalize_text(topic) if topic else None,
+            start_date or None,
+            end_date or None,
+        )
+
+    @staticmethod
+    def summary_key(articles: List[Dict[str, Any]], *extra: Hashable) -> Tuple:
+        digest = hashlib.sha1()
+        for article in articles:
+            digest.update((article.get("url") or "").encode("utf-8"))
+            digest.update(b"\0")
+            digest.update((article.get("content") or "").encode("utf-8"))
+            digest.update(b"\0")
+        return (digest.hexdigest(),) + extra
+
+    def get_articles(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        return self.articles.get(key) if self.enabled else None
+
+    def set_articles(self, key: Tuple, value: Dict[str, Any]) -> None:
+        if self.enabled:
+            self.articles.set(key, value)
+
+    def get_summary(self, key: Tuple) -> Optional[str]:
+        return self.summaries.get(key) if self.enabled else None
+
+    def set_summary(self, key: Tuple, summary: str) -> None:
+        if self.enabled:
+            self.summaries.set(key, summary)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "enabled": self.enabled,
+            "articles": self.articles.stats(),
+            "summaries": self.summaries.stats(),
+        }
+
+
+def load_warmup_queries(path: str) -> List[Dict[str, Any]]:
+    """Read popular queries, one per line, as plain text or JSON request objects"""
+    requests = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if line.startswith("{"):
+                requests.append(json.loads(line))
+            else:
+                requests.append({"query": line})
+    return requests
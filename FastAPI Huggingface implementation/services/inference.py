@@ -0,0 +1,45 @@
+import os
+import asyncio
+import logging
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+# Default number of concurrent calls allowed per model, overridable with
+# <NAME>_WORKERS (e.g. SUMMARIZATION_WORKERS=2)
+DEFAULT_WORKERS = {
+    "embedding": 1,
+    "nlp": 1,
+    "lexrank": 2,
+    "summarization": 1,
+}
+
+class InferenceExecutor:
+    """Runs blocking model calls on dedicated thread pools, one per model.
+
+    PyTorch, NumPy and SciPy release the GIL during their heavy kernels, so
+    threads let inference overlap with the event loop and with other jobs
+    without loading a second copy of each model in another process.
+    """
+
+    def __init__(self):
+        self.workers: Dict[str, int] = {
+            name: int(os.getenv(f"{name.upper()}_WORKERS", str(default)))
+            for name, default in DEFAULT_WORKERS.items()
+        }
+        self.pools: Dict[str, ThreadPoolExecutor] = {
+            name: ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"{name}-inference")
+            for name, workers in self.workers.items()
+        }
+        logger.info(f"Inference executor initialized with workers: {self.workers}")
+
+    async def run(self, model: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+        """Run fn on the pool reserved for the given model and await its result"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.pools[model], functools.partial(fn, *args, **kwargs))
+
+    def shutdown(self):
+        for pool in self.pools.values():
+            pool.shutdown(wait=False, cancel_futures=True)
@@ -0,0 +1,261 @@
+"""
+Job stores backing the /index and /loading endpoints.
+
+Both backends expire jobs TTL seconds after their last update and keep at
+most max_jobs, dropping the oldest first. "memory" lives in the worker
+process; "sqlite" keeps jobs in a WAL-mode SQLite file that several uvicorn
+workers on the same host can share and that survives restarts.
+
+Every update increments the job's version, which wait() long-polls on:
+updates made in the same process wake waiters at once, and the SQLite
+store also re-reads the job every poll_interval seconds to see updates
+from other workers.
+"""
+
+import os
+import json
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional
+
+from fastapi.encoders import jsonable_encoder
+
+logger = logging.getLogger(__name__)
+
+# Statuses after which a job no longer changes
+FINAL_STATUSES = ("completed", "failed", "rejected", "cancelled", "timeout")
+
+
+class JobStore(ABC):
+    """Interface shared by the job store backends"""
+
+    def __init__(self, ttl: float, max_jobs: int, poll_interval: Optional[float] = None):
+        self.ttl = ttl
+        self.max_jobs = max_jobs
+        # None when every update goes through this process
+        self.poll_interval = poll_interval
+        # job_id -> [event set on its next update, number of waiters]
+        self._waiters: Dict[str, list] = {}
+
+    def _notify(self, job_id: str):
+        entry = self._waiters.pop(job_id, None)
+        if entry:
+            entry[0].set()
+
+    async def wait(self, job_id: str, version: int, timeout: float) -> Optional[Dict[str, Any]]:
+        """The job once its version exceeds version or it reaches a final
+        status, else as it is after timeout seconds"""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            # Registered before reading, so an update in between is not missed
+            entry = self._waiters.setdefault(job_id, [asyncio.Event(), 0])
+            entry[1] += 1
+            try:
+                job = await self.get(job_id)
+                if job is None or job.get("version", 0) > version or job["status"] in FINAL_STATUSES:
+                    return job
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    return job
+                try:
+                    await asyncio.wait_for(entry[0].wait(), min(remaining, self.poll_interval or remaining))
+                except asyncio.TimeoutError:
+                    pass
+            finally:
+                entry[1] -= 1
+                if not entry[1] and self._waiters.get(job_id) is entry:
+                    del self._waiters[job_id]
+
+    @abstractmethod
+    async def create(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Store a new job and return it"""
+
+    @abstractmethod
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """The job, or None once it expired or was dropped"""
+
+    @abstractmethod
+    async def update(self, job_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Merge fields into the job and increment its version; None if it is gone"""
+
+    @abstractmethod
+    async def count(self) -> int:
+        """Number of jobs not yet expired"""
+
+    async def close(self):
+        pass
+
+
+class MemoryJobStore(JobStore):
+    """Per-process job store with TTL expiry and a size cap"""
+
+    def __init__(self, ttl: float, max_jobs: int):
+        super().__init__(ttl, max_jobs)
+        # job_id -> (expires_at, job), ordered from least to most recently updated
+        self._jobs: "OrderedDict[str, tuple]" = OrderedDict()
+
+    def _purge(self):
+        now = time.monotonic()
+        while self._jobs:
+            job_id, (expires_at, _) = next(iter(self._jobs.items()))
+            if expires_at > now and len(self._jobs) <= self.max_jobs:
+                break
+            del self._jobs[job_id]
+
+    def _store(self, job: Dict[str, Any]):
+        self._jobs[job["id"]] = (time.monotonic() + self.ttl, job)
+        self._jobs.move_to_end(job["id"])
+        self._purge()
+
+    async def create(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        self._store(job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        self._purge()
+        entry = self._jobs.get(job_id)
+        return entry[1] if entry else None
+
+    async def update(self, job_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        job = await self.get(job_id)
+        if job is None:
+            return None
+        job.update(fields)
+        job["version"] = job.get("version", 0) + 1
+        self._store(job)
+        self._notify(job_id)
+        return job
+
+    async def count(self) -> int:
+        self._purge()
+        return len(self._jobs)
+
+
+class SQLiteJobStore(JobStore):
+    """Job store in a WAL-mode SQLite file shared by the workers of a host.
+
+    Jobs are stored as JSON documents; datetimes come back as ISO strings,
+    which the JobStatus response model parses again.
+    """
+
+    def __init__(self, ttl: float, max_jobs: int, path: str, poll_interval: float = 0.5):
+        super().__init__(ttl, max_jobs, poll_interval)
+        self.path = path
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+
+        conn = self._connection()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                data TEXT NOT NULL,
+                updated_at REAL NOT NULL
+            )
+        ''')
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_updated_at ON jobs (updated_at)")
+        conn.commit()
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; calls run on asyncio's default executor
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+        return conn
+
+    def _purge(self, conn: sqlite3.Connection):
+        conn.execute("DELETE FROM jobs WHERE updated_at < ?", (time.time() - self.ttl,))
+        conn.execute('''
+            DELETE FROM jobs WHERE id IN (
+                SELECT id FROM jobs ORDER BY updated_at DESC LIMIT -1 OFFSET ?
+            )
+        ''', (self.max_jobs,))
+
+    def _write(self, job: Dict[str, Any]):
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO jobs (id, data, updated_at) VALUES (?, ?, ?)",
+                (job["id"], json.dumps(jsonable_encoder(job)), time.time())
+            )
+            self._purge(conn)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _read(self, job_id: str) -> Optional[Dict[str, Any]]:
+        row = self._connection().execute(
+            "SELECT data FROM jobs WHERE id = ? AND updated_at >= ?",
+            (job_id, time.time() - self.ttl)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def _update(self, job_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute("SELECT data FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            if row is None:
+                conn.execute("ROLLBACK")
+                return None
+            job = json.loads(row[0])
+            job.update(jsonable_encoder(fields))
+            job["version"] = job.get("version", 0) + 1
+            conn.execute(
+                "UPDATE jobs SET data = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(job), time.time(), job_id)
+            )
+            conn.execute("COMMIT")
+            return job
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    def _count(self) -> int:
+        return self._connection().execute(
+            "SELECT COUNT(*) FROM jobs WHERE updated_at >= ?", (time.time() - self.ttl,)
+        ).fetchone()[0]
+
+    async def create(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        await asyncio.to_thread(self._write, job)
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await asyncio.to_thread(self._read, job_id)
+
+    async def update(self, job_id: str, fields: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        job = await asyncio.to_thread(self._update, job_id, fields)
+        self._notify(job_id)
+        return job
+
+    async def count(self) -> int:
+        return await asyncio.to_thread(self._count)
+
+
+def create_job_store() -> JobStore:
+    """Job store selected by the JOB_STORE env var"""
+    backend = os.getenv("JOB_STORE", "memory").lower()
+    ttl = float(os.getenv("JOB_TTL_SECONDS", "3600"))
+    max_jobs = int(os.getenv("JOB_STORE_MAX_JOBS", "1000"))
+
+    if backend == "sqlite":
+        path = os.getenv("JOB_STORE_PATH", "data/jobs.sqlite3")
+        poll_interval = float(os.getenv("JOB_STORE_POLL_INTERVAL", "0.5"))
+        logger.info(f"Using SQLite job store at {path} (ttl={ttl}s, max_jobs={max_jobs})")
+        return SQLiteJobStore(ttl, max_jobs, path, poll_interval)
+    if backend == "memory":
+        logger.info(f"Using in-memory job store (ttl={ttl}s, max_jobs={max_jobs})")
+        return MemoryJobStore(ttl, max_jobs)
+    raise ValueError(f"Unknown JOB_STORE '{backend}', expected 'memory' or 'sqlite'")
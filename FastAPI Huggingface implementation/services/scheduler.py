@@ -0,0 +1,259 @@
+import os
+import math
+import time
+import asyncio
+import logging
+import itertools
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Lower value is served first
+PRIORITIES = {"high": 0, "normal": 1, "low": 2}
+
+
+class SchedulerFull(Exception):
+    """Raised when the job queue is at capacity"""
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Job queue is full, retry after {retry_after}s")
+        self.retry_after = retry_after
+
+
+class JobAborted(Exception):
+    """Raised by JobScheduler.execute when the job is cancelled or misses its deadline"""
+
+    def __init__(self, status: str, reason: str):
+        super().__init__(reason)
+        self.status = status
+
+
+class _Entry:
+    __slots__ = ("job_id", "run", "priority", "seq", "enqueued_at", "deadline", "cancelled", "task", "outcome")
+
+    def __init__(self, job_id: str, run: Callable[[], Awaitable[Any]], priority: int, seq: int, deadline: float):
+        self.job_id = job_id
+        self.run = run
+        self.priority = priority
+        self.seq = seq
+        self.enqueued_at = time.monotonic()
+        self.deadline = deadline
+        self.cancelled = False
+        self.task: Optional[asyncio.Task] = None
+        # Result of the run, for callers of execute
+        self.outcome: Optional[asyncio.Future] = None
+
+    def __lt__(self, other: "_Entry") -> bool:
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class JobScheduler:
+    """Bounded priority queue of pipeline runs with a fixed number of
+    concurrent workers, per-job deadlines and cancellation.
+
+    on_start(job_id, wait_seconds) is awaited when a job leaves the queue;
+    on_abort(job_id, status, reason) is awaited when a job is cancelled or
+    misses its deadline, with status "cancelled" or "timeout".
+    """
+
+    def __init__(
+        self,
+        on_start: Callable[[str, float], Awaitable[None]],
+        on_abort: Callable[[str, str, str], Awaitable[None]],
+        max_concurrency: int = None,
+        max_queue_size: int = None,
+        default_deadline: float = None
+    ):
+        self.on_start = on_start
+        self.on_abort = on_abort
+        self.max_concurrency = max_concurrency or int(os.getenv("JOB_MAX_CONCURRENCY", "2"))
+        self.max_queue_size = max_queue_size or int(os.getenv("JOB_QUEUE_SIZE", "32"))
+        self.default_deadline = default_deadline or float(os.getenv("JOB_DEADLINE_SECONDS", "300"))
+
+        self.queue: asyncio.PriorityQueue = None
+        self._workers = []
+        self._seq = itertools.count()
+        self._pending: Dict[str, _Entry] = {}
+        self._running: Dict[str, _Entry] = {}
+
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        # Exponential moving averages, seeded with a conservative guess
+        self.avg_wait = 0.0
+        self.avg_run = float(os.getenv("JOB_EXPECTED_RUN_SECONDS", "10"))
+
+    def start(self):
+        # Capacity is enforced by check_capacity on submission
+        self.queue = asyncio.PriorityQueue()
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.max_concurrency)]
+        logger.info(
+            f"Job scheduler started (max_concurrency={self.max_concurrency}, "
+            f"max_queue_size={self.max_queue_size}, deadline={self.default_deadline}s)"
+        )
+
+    async def stop(self):
+        for entry in list(self._running.values()):
+            if entry.task:
+                entry.task.cancel()
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+        for entry in self._pending.values():
+            if entry.outcome:
+                entry.outcome.cancel()
+
+    @property
+    def queue_depth(self) -> int:
+        return len(self._pending)
+
+    def retry_after(self) -> int:
+        """Seconds until a queue slot is expected to free up"""
+        # With every worker busy, one job finishes every avg_run / max_concurrency seconds
+        return max(1, math.ceil(self.avg_run / self.max_concurrency))
+
+    def check_capacity(self):
+        if self.queue_depth >= self.max_queue_size:
+            self.rejected += 1
+            raise SchedulerFull(self.retry_after())
+
+    def submit(
+        self,
+        job_id: str,
+        run: Callable[[], Awaitable[Any]],
+        priority: str = "normal",
+        deadline: Optional[float] = None
+    ):
+        """Queue a job, raising SchedulerFull when the queue is at capacity"""
+        self._enqueue(job_id, run, priority, deadline)
+
+    async def execute(
+        self,
+        job_id: str,
+        run: Callable[[], Awaitable[Any]],
+        priority: str = "normal",
+        deadline: Optional[float] = None
+    ) -> Any:
+        """Queue a job and wait for the result of its run. Raises
+        SchedulerFull when the queue is at capacity and JobAborted when the
+        job is cancelled or misses its deadline; the job is cancelled when
+        the caller stops waiting."""
+        entry = self._enqueue(job_id, run, priority, deadline)
+        entry.outcome = asyncio.get_running_loop().create_future()
+        try:
+            return await asyncio.shield(entry.outcome)
+        except asyncio.CancelledError:
+            self.cancel(job_id)
+            entry.outcome.cancel()
+            raise
+
+    def _enqueue(self, job_id: str, run: Callable[[], Awaitable[Any]], priority: str, deadline: Optional[float]) -> _Entry:
+        self.check_capacity()
+        timeout = self.default_deadline if deadline is None else min(deadline, self.default_deadline)
+        entry = _Entry(job_id, run, PRIORITIES[priority], next(self._seq), time.monotonic() + timeout)
+        self.queue.put_nowait(entry)
+        self._pending[job_id] = entry
+        return entry
+
+    def cancel(self, job_id: str) -> bool:
+        """Cancel a queued or running job; False if it is not scheduled here"""
+        entry = self._pending.get(job_id) or self._running.get(job_id)
+        if entry is None:
+            return False
+        entry.cancelled = True
+        # A queued entry stays in the queue until a worker drops it, but no
+        # longer counts towards the queue depth
+        self._pending.pop(job_id, None)
+        if entry.task:
+            entry.task.cancel()
+        return True
+
+    def status(self, job_id: str) -> Dict[str, Any]:
+        """Live queue position and wait time of a job scheduled by this worker"""
+        now = time.monotonic()
+        entry = self._pending.get(job_id)
+        if entry is not None:
+            position = sum(1 for other in self._pending.values() if other < entry)
+            return {
+                "queue_position": position + 1,
+                "queue_depth": self.queue_depth,
+                "wait_seconds": now - entry.enqueued_at,
+            }
+        return {"queue_position": None, "queue_depth": self.queue_depth}
+
+    async def _worker(self):
+        while True:
+            entry: _Entry = await self.queue.get()
+            self._pending.pop(entry.job_id, None)
+            try:
+                await self._execute(entry)
+            except Exception as e:
+                logger.error(f"Scheduler failed to run job {entry.job_id}: {str(e)}", exc_info=True)
+            finally:
+                self.queue.task_done()
+
+    async def _execute(self, entry: _Entry):
+        now = time.monotonic()
+        wait = now - entry.enqueued_at
+
+        if entry.cancelled:
+            self.cancelled += 1
+            await self._abort(entry, "cancelled", "Job cancelled while queued")
+            return
+        if now >= entry.deadline:
+            self.timeouts += 1
+            await self._abort(entry, "timeout", f"Job deadline expired after {wait:.1f}s in queue")
+            return
+
+        self.avg_wait = 0.8 * self.avg_wait + 0.2 * wait
+        await self.on_start(entry.job_id, wait)
+
+        self._running[entry.job_id] = entry
+        entry.task = asyncio.create_task(entry.run())
+        started = time.monotonic()
+        try:
+            # On timeout or cancellation wait_for waits until the run has
+            # unwound, so the slot is only freed once the work has stopped
+            result = await asyncio.wait_for(entry.task, entry.deadline - started)
+            self.completed += 1
+            self.avg_run = 0.8 * self.avg_run + 0.2 * (time.monotonic() - started)
+            if entry.outcome and not entry.outcome.done():
+                entry.outcome.set_result(result)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            await self._abort(entry, "timeout", "Job deadline expired while processing")
+        except asyncio.CancelledError:
+            if not entry.cancelled:
+                # The worker itself is being stopped
+                if entry.outcome and not entry.outcome.done():
+                    entry.outcome.cancel()
+                raise
+            self.cancelled += 1
+            await self._abort(entry, "cancelled", "Job cancelled while processing")
+        except Exception as e:
+            if entry.outcome and not entry.outcome.done():
+                entry.outcome.set_exception(e)
+            raise
+        finally:
+            self._running.pop(entry.job_id, None)
+
+    async def _abort(self, entry: _Entry, status: str, reason: str):
+        if entry.outcome and not entry.outcome.done():
+            entry.outcome.set_exception(JobAborted(status, reason))
+        await self.on_abort(entry.job_id, status, reason)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "queue_depth": self.queue_depth,
+            "running": len(self._running),
+            "max_concurrency": self.max_concurrency,
+            "max_queue_size": self.max_queue_size,
+            "completed": self.completed,
+            "rejected": self.rejected,
+            "timeouts": self.timeouts,
+            "cancelled": self.cancelled,
+            "avg_wait_seconds": self.avg_wait,
+            "avg_run_seconds": self.avg_run,
+        }
@@ -0,0 +1,74 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+logger = logging.getLogger(__name__)
+
+class SingleFlight:
+    """Deduplicates concurrent calls with the same key.
+
+    The first caller for a key starts the computation as a task; callers
+    arriving while it runs attach to that task and receive the same result
+    or exception. Each caller waits through a shield, so a caller going away
+    does not cancel the computation for the others; when the last one goes
+    away nobody needs the result, so the computation is cancelled and that
+    caller is held until it has unwound, keeping whatever slot the caller
+    occupies busy while the work still runs.
+    """
+
+    def __init__(self):
+        self._inflight: Dict[Hashable, asyncio.Task] = {}
+        # Callers currently waiting on each computation
+        self._waiters: Dict[asyncio.Task, int] = {}
+        self.executions = 0
+        self.coalesced = 0
+        self.abandoned = 0
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self.executions += 1
+        else:
+            self.coalesced += 1
+            logger.info(f"Attached to in-flight computation for {key}")
+
+        self._waiters[task] = self._waiters.get(task, 0) + 1
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            if self._waiters[task] == 1 and not task.done():
+                logger.info(f"Last caller left, cancelling computation for {key}")
+                self.abandoned += 1
+                # Later callers start a new computation instead of attaching
+                if self._inflight.get(key) is task:
+                    del self._inflight[key]
+                task.cancel()
+                await asyncio.wait({task})
+            raise
+        finally:
+            self._waiters[task] -= 1
+            if not self._waiters[task]:
+                del self._waiters[task]
+
+    def is_inflight(self, key: Hashable) -> bool:
+        return key in self._inflight
+
+    def _done(self, key: Hashable, task: asyncio.Task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        # Mark the exception retrieved when every caller has gone away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, Any]:
+        calls = self.executions + self.coalesced
+        return {
+            "inflight": len(self._inflight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+            "abandoned": self.abandoned,
+            "coalesced_ratio": self.coalesced / calls if calls else 0.0,
+        }
@@ -0,0 +1,70 @@
+import asyncio
+
+import numpy as np
+
+from services.batching import EmbeddingBatcher
+
+
+class CountingModel:
+    """Embedding model memoizing query texts, counting encoded texts"""
+
+    def __init__(self):
+        self.memo = {}
+        self.encoded = []
+
+    def encode(self, texts):
+        self.encoded.append(list(texts))
+        return np.asarray([[len(text), i] for i, text in enumerate(texts)], dtype=np.float32)
+
+    def cached(self, text):
+        return self.memo.get(text)
+
+    def remember(self, text, embedding):
+        self.memo[text] = embedding
+
+
+def test_memoized_list_encodes_only_missing_texts():
+    async def scenario():
+        model = CountingModel()
+        batcher = EmbeddingBatcher(model, max_batch_size=8, max_wait_ms=1)
+        batcher.start()
+        try:
+            first = await batcher.encode(["a", "bb"], memoize=True)
+            second = await batcher.encode(["bb", "ccc", "a"], memoize=True)
+        finally:
+            await batcher.stop()
+        return model, first, second
+
+    model, first, second = asyncio.run(scenario())
+    assert model.encoded == [["a", "bb"], ["ccc"]]
+    assert second.shape == (3, 2)
+    np.testing.assert_array_equal(second[[0, 2]], first[[1, 0]])
+    assert set(model.memo) == {"a", "bb", "ccc"}
+
+
+def test_plain_list_skips_the_memo():
+    async def scenario():
+        model = CountingModel()
+        batcher = EmbeddingBatcher(model, max_batch_size=8, max_wait_ms=1)
+        batcher.start()
+        try:
+            await batcher.encode(["a", "a"])
+        finally:
+            await batcher.stop()
+        return model
+
+    model = asyncio.run(scenario())
+    assert model.encoded == [["a", "a"]]
+    assert not model.memo
+
+
+def test_memoized_list_without_running_batcher():
+    async def scenario():
+        model = CountingModel()
+        batcher = EmbeddingBatcher(model)
+        await batcher.encode("a")
+        return model, await batcher.encode(["a", "b"], memoize=True)
+
+    model, embeddings = asyncio.run(scenario())
+    assert model.encoded == [["a"], ["b"]]
+    assert embeddings.shape == (2, 2)
@@ -0,0 +1,87 @@
+import time
+
+import pytest
+
+from services.cache import LRUCache, ResultCache, estimate_size, normalize_text
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    # b is now the least recently used
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+
+
+def test_hit_and_miss_counters():
+    cache = LRUCache()
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("a")
+    cache.get("missing")
+    assert cache.get("missing", "default") == "default"
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+    assert stats["hit_rate"] == 0.5
+
+
+def test_entries_expire_after_ttl():
+    cache = LRUCache(ttl=0.05)
+    cache.set("a", 1)
+    assert cache.get("a") == 1
+    time.sleep(0.1)
+    assert cache.get("a") is None
+    stats = cache.stats()
+    assert stats["expirations"] == 1
+    assert stats["entries"] == 0
+
+
+def test_byte_budget_evicts_oldest_entries():
+    value = "x" * 1000
+    size = estimate_size(value)
+    cache = LRUCache(max_bytes=size * 2)
+    cache.set("a", value)
+    cache.set("b", value)
+    assert cache.stats()["bytes"] == size * 2
+    cache.set("c", value)
+    assert cache.get("a") is None
+    assert len(cache) == 2
+    assert cache.stats()["bytes"] == size * 2
+
+
+def test_values_over_the_byte_budget_are_not_cached():
+    cache = LRUCache(max_bytes=100)
+    cache.set("a", "x" * 1000)
+    assert cache.get("a") is None
+    assert cache.stats()["bytes"] == 0
+
+
+def test_replacing_a_key_keeps_the_byte_count():
+    cache = LRUCache(max_bytes=10_000)
+    cache.set("a", "x" * 100)
+    cache.set("a", "x" * 200)
+    assert cache.stats()["bytes"] == estimate_size("x" * 200)
+    cache.clear()
+    assert cache.stats()["bytes"] == 0
+
+
+@pytest.mark.parametrize("share, articles_mb", [("0.75", 3), ("0", 0.2), ("1", 3.8)])
+def test_result_cache_splits_the_budget(monkeypatch, share, articles_mb):
+    monkeypatch.setenv("CACHE_MAX_MB", "4")
+    monkeypatch.setenv("CACHE_ARTICLES_SHARE", share)
+    cache = ResultCache()
+    total = 4 * 1024 * 1024
+    # The share is clamped so neither tier gets 0, which means unlimited
+    assert cache.articles.max_bytes == int(total * articles_mb / 4)
+    assert cache.articles.max_bytes + cache.summaries.max_bytes == total
+    assert cache.summaries.max_bytes > 0
+
+
+def test_request_key_normalizes_spelling():
+    assert ResultCache.request_key("Eleições  2024?", "Política") == ResultCache.request_key("eleições 2024", "política")
+    assert normalize_text("Eleições  2024?", casefold=False, strip_punctuation=False) == "Eleições 2024?"
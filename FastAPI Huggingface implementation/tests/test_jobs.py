@@ -0,0 +1,130 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from services.jobs import JobStore, MemoryJobStore, SQLiteJobStore
+
+
+def job(job_id: str, status: str = "queued") -> dict:
+    return {"id": job_id, "status": status, "created_at": datetime(2024, 1, 1), "version": 0}
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def make_store(request, tmp_path):
+    def make(ttl: float = 60, max_jobs: int = 10, path: str = "jobs.sqlite3"):
+        if request.param == "memory":
+            return MemoryJobStore(ttl, max_jobs)
+        return SQLiteJobStore(ttl, max_jobs, str(tmp_path / path), poll_interval=0.02)
+    return make
+
+
+def test_job_store_is_abstract():
+    class Incomplete(JobStore):
+        async def get(self, job_id):
+            return None
+
+    with pytest.raises(TypeError):
+        Incomplete(60, 10)
+
+
+def test_update_increments_the_version(make_store):
+    async def scenario():
+        store = make_store()
+        await store.create(job("a"))
+        updated = await store.update("a", {"status": "processing"})
+        missing = await store.update("b", {"status": "processing"})
+        return updated, await store.get("a"), missing
+
+    updated, stored, missing = asyncio.run(scenario())
+    assert updated["version"] == 1
+    assert stored["status"] == "processing"
+    assert stored["version"] == 1
+    assert missing is None
+
+
+def test_jobs_expire_after_ttl(make_store):
+    async def scenario():
+        store = make_store(ttl=0.05)
+        await store.create(job("a"))
+        before = await store.get("a"), await store.count()
+        await asyncio.sleep(0.1)
+        return before, await store.get("a"), await store.count()
+
+    (found, count), expired, remaining = asyncio.run(scenario())
+    assert found is not None and count == 1
+    assert expired is None
+    assert remaining == 0
+
+
+def test_oldest_jobs_are_dropped_at_the_cap(make_store):
+    async def scenario():
+        store = make_store(max_jobs=2)
+        for job_id in ("a", "b"):
+            await store.create(job(job_id))
+            # Distinct update times for the SQLite ordering
+            await asyncio.sleep(0.01)
+        # Updating a keeps it; b is now the least recently updated
+        await store.update("a", {"status": "processing"})
+        await asyncio.sleep(0.01)
+        await store.create(job("c"))
+        return [await store.get(job_id) is not None for job_id in ("a", "b", "c")], await store.count()
+
+    present, count = asyncio.run(scenario())
+    assert present == [True, False, True]
+    assert count == 2
+
+
+def test_wait_returns_on_a_newer_version(make_store):
+    async def scenario():
+        store = make_store()
+        await store.create(job("a"))
+        waiting = asyncio.create_task(store.wait("a", 0, 5))
+        await asyncio.sleep(0.02)
+        await store.update("a", {"status": "processing"})
+        return await asyncio.wait_for(waiting, 1)
+
+    woken = asyncio.run(scenario())
+    assert woken["version"] == 1
+    assert woken["status"] == "processing"
+
+
+def test_wait_times_out_with_the_current_job(make_store):
+    async def scenario():
+        store = make_store()
+        await store.create(job("a"))
+        await store.update("a", {"status": "processing"})
+        # Already past version 0, so it returns at once
+        current = await store.wait("a", 0, 5)
+        start = asyncio.get_running_loop().time()
+        unchanged = await store.wait("a", 1, 0.05)
+        return current, unchanged, asyncio.get_running_loop().time() - start, await store.wait("missing", 0, 5)
+
+    current, unchanged, waited, missing = asyncio.run(scenario())
+    assert current["version"] == 1
+    assert unchanged["version"] == 1
+    assert waited >= 0.05
+    assert missing is None
+
+
+def test_wait_returns_for_final_statuses(make_store):
+    async def scenario():
+        store = make_store()
+        await store.create(job("a", status="completed"))
+        return await asyncio.wait_for(store.wait("a", 5, 5), 1)
+
+    assert asyncio.run(scenario())["status"] == "completed"
+
+
+def test_sqlite_wait_sees_updates_from_another_worker(tmp_path):
+    async def scenario():
+        path = str(tmp_path / "shared.sqlite3")
+        reader = SQLiteJobStore(60, 10, path, poll_interval=0.02)
+        writer = SQLiteJobStore(60, 10, path, poll_interval=0.02)
+        await writer.create(job("a"))
+        waiting = asyncio.create_task(reader.wait("a", 0, 5))
+        await asyncio.sleep(0.05)
+        await writer.update("a", {"status": "processing"})
+        return await asyncio.wait_for(waiting, 1)
+
+    assert asyncio.run(scenario())["version"] == 1
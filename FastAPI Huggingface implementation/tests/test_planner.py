@@ -0,0 +1,80 @@
+from datetime import date, datetime
+
+import pytest
+
+from database.planner import SearchPlanner
+
+
+def make_planner(**kwargs) -> SearchPlanner:
+    planner = SearchPlanner(
+        **{"strategy": "auto", "prefilter_max_rows": 1000, "overfetch": 2, "max_candidates": 500, **kwargs}
+    )
+    # 10000 articles: 6000 politics, 4000 sports, over January and February
+    planner.set_statistics([
+        ("politics", date(2024, 1, 1), 3100),
+        ("politics", date(2024, 2, 1), 2900),
+        ("sports", date(2024, 1, 1), 3100),
+        ("sports", date(2024, 2, 1), 900),
+    ])
+    return planner
+
+
+def test_estimate_prorates_partial_months():
+    planner = make_planner()
+    assert planner.estimate_rows(None, None, None) == 10000
+    assert planner.estimate_rows(None, None, "sports") == 4000
+    # Ten of January's 31 days, both ends included
+    rows = planner.estimate_rows(datetime(2024, 1, 1), datetime(2024, 1, 10), "politics")
+    assert rows == pytest.approx(1000)
+
+
+def test_narrow_filters_are_scanned_exactly():
+    planner = make_planner()
+    plan = planner.plan(10, 1000)
+    assert plan["strategy"] == "prefilter"
+    assert plan["scan_rows"] == 1000
+    assert "candidates" not in plan
+
+
+def test_broad_filters_go_through_the_index():
+    planner = make_planner()
+    plan = planner.plan(10, 5000)
+    assert plan["strategy"] == "ann"
+    # limit / selectivity * overfetch
+    assert plan["candidates"] == 40
+
+
+def test_entity_filter_narrows_the_scan():
+    planner = make_planner()
+    plan = planner.plan(10, 5000, entity_rows=200)
+    assert plan["strategy"] == "prefilter"
+    assert plan["scan_rows"] == 200
+    assert plan["estimated_rows"] == 100
+
+
+def test_candidates_are_capped():
+    # A selectivity of 0.02 wants 10 / 0.02 * 2 = 1000 candidates
+    plan = make_planner(prefilter_max_rows=100).plan(10, 200)
+    assert plan["strategy"] == "ann"
+    assert plan["candidates"] == 500
+
+
+def test_unfiltered_queries_fetch_limit_candidates():
+    plan = make_planner().plan(10, 10000)
+    assert plan["strategy"] == "ann"
+    assert plan["candidates"] == 10
+
+
+def test_forced_strategy_and_missing_statistics():
+    planner = SearchPlanner(strategy="ann", max_candidates=300)
+    assert planner.plan(10, None) == {
+        "strategy": "ann",
+        "estimated_rows": None,
+        "scan_rows": None,
+        "selectivity": None,
+        "candidates": 300,
+    }
+    assert SearchPlanner(strategy="auto").plan(10, None)["strategy"] == "prefilter"
+    assert make_planner(strategy="prefilter").plan(10, 9000)["strategy"] == "prefilter"
+    with pytest.raises(ValueError):
+        SearchPlanner(strategy="exact")
@@ -0,0 +1,74 @@
+import re
+from datetime import datetime
+
+import pytest
+
+from database.query import (
+    ENTITY_SEARCH_QUERY, HYBRID_SEARCH_QUERY, SEARCH_QUERY, DatabaseService, partitioned_search_query
+)
+
+# Distance orderings an HNSW index on the embeddings can serve
+_INDEX_ORDERING = re.compile(r"ORDER BY\s+(a\.)?embedding\s*<=>|(?<!\()\ba\.embedding\s*<=>\s*%\(embedding\)b\s+AS distance")
+
+
+def filtered_branch(query: str) -> str:
+    """The query up to its unfiltered fallback branch"""
+    return query.split("WHERE NOT EXISTS")[0].rsplit("UNION ALL", 1)[0]
+
+
+@pytest.mark.parametrize("query", [
+    SEARCH_QUERY,
+    ENTITY_SEARCH_QUERY,
+    partitioned_search_query([("articles", "articles_2024"), ("articles", "articles_2025")], False).as_string(None),
+    partitioned_search_query([("articles", "articles_2024")], True).as_string(None),
+], ids=["plain", "entities", "partitioned", "partitioned-entities"])
+def test_prefilter_queries_cannot_use_the_vector_index(query):
+    branch = filtered_branch(query)
+    assert "ORDER BY distance" in branch
+    assert "(a.embedding <=> %(embedding)b) + 0 AS distance" in branch
+    assert not _INDEX_ORDERING.search(branch)
+
+
+def test_hybrid_query_matches_any_term():
+    # plainto_tsquery ANDs the lexemes of the text, which are ORed
+    assert "replace(plainto_tsquery('articles.portuguese_unaccent', %(text)s)::text, ' & ', ' | ')::tsquery" in HYBRID_SEARCH_QUERY
+    assert "websearch_to_tsquery" not in HYBRID_SEARCH_QUERY
+    # No rows without a lexical match, so the caller falls back to entities
+    assert "WHERE EXISTS (SELECT 1 FROM lexical)" in HYBRID_SEARCH_QUERY
+
+
+def make_service(bounds):
+    service = DatabaseService()
+    service.partitions = [
+        ("articles", name, *DatabaseService._partition_bounds(bound)) for name, bound in bounds
+    ]
+    return service
+
+
+YEARLY = [
+    ("articles_2024", "FOR VALUES FROM ('2024-01-01 00:00:00') TO ('2025-01-01 00:00:00')"),
+    ("articles_2025", "FOR VALUES FROM ('2025-01-01') TO ('2026-01-01')"),
+    ("articles_default", "DEFAULT"),
+]
+
+
+def test_partition_bounds():
+    assert DatabaseService._partition_bounds(YEARLY[0][1]) == (datetime(2024, 1, 1), datetime(2025, 1, 1))
+    assert DatabaseService._partition_bounds(YEARLY[1][1]) == (datetime(2025, 1, 1), datetime(2026, 1, 1))
+    assert DatabaseService._partition_bounds("DEFAULT") == (None, None)
+    assert DatabaseService._partition_bounds("FOR VALUES FROM (MINVALUE) TO ('2024-01-01')") == (None, None)
+    assert DatabaseService._partition_bounds(None) == (None, None)
+
+
+@pytest.mark.parametrize("start, end, expected", [
+    (datetime(2024, 3, 1), datetime(2024, 3, 31), ["articles_2024"]),
+    # The upper bound is exclusive, the end of the date range inclusive
+    (datetime(2024, 12, 1), datetime(2024, 12, 31, 23, 59), ["articles_2024"]),
+    (datetime(2024, 12, 1), datetime(2025, 1, 1), ["articles_2024", "articles_2025"]),
+    (datetime(2025, 1, 1), datetime(2025, 1, 31), ["articles_2025"]),
+    (datetime(2023, 1, 1), datetime(2023, 12, 31), []),
+])
+def test_overlapping_partitions_at_a_year_boundary(start, end, expected):
+    service = make_service(YEARLY)
+    # The default partition may hold rows of any date
+    assert service._overlapping_partitions(start, end) == [("articles", name) for name in expected + ["articles_default"]]
@@ -0,0 +1,239 @@
+import asyncio
+
+import pytest
+
+from services.scheduler import JobAborted, JobScheduler
+from services.singleflight import SingleFlight
+
+
+class Recorder:
+    def __init__(self):
+        self.started = []
+        self.aborted = {}
+
+    async def on_start(self, job_id, wait_seconds):
+        self.started.append(job_id)
+
+    async def on_abort(self, job_id, status, reason):
+        self.aborted[job_id] = status
+
+
+def test_concurrency_cap_holds_while_jobs_time_out():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = JobScheduler(recorder.on_start, recorder.on_abort, max_concurrency=1, default_deadline=5)
+        flight = SingleFlight()
+        running = peak = finished = 0
+
+        async def pipeline():
+            nonlocal running, peak, finished
+            running += 1
+            peak = max(peak, running)
+            try:
+                await asyncio.sleep(0.2)
+                finished += 1
+            finally:
+                running -= 1
+
+        scheduler.start()
+        # Identical jobs coalesce in the single flight, like process_job does
+        for i, key in enumerate(["a", "a", "b", "c"]):
+            scheduler.submit(f"job-{i}", lambda key=key: flight.do(key, pipeline), deadline=0.05 * (i + 1))
+        await asyncio.sleep(0.5)
+        await scheduler.stop()
+        return peak, finished, running, recorder, scheduler.stats()
+
+    peak, finished, running, recorder, stats = asyncio.run(scenario())
+    assert peak == 1
+    assert finished == 0
+    assert running == 0
+    assert set(recorder.aborted.values()) == {"timeout"}
+    assert stats["timeouts"] == 4
+    assert stats["completed"] == 0
+
+
+def test_cancelled_job_releases_its_slot_after_the_run_stops():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = JobScheduler(recorder.on_start, recorder.on_abort, max_concurrency=1, default_deadline=5)
+        running = peak = 0
+
+        async def pipeline():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                await asyncio.sleep(0.1)
+            finally:
+                # Work that outlives the cancellation request
+                await asyncio.shield(asyncio.sleep(0.05))
+                running -= 1
+
+        scheduler.start()
+        scheduler.submit("first", pipeline)
+        scheduler.submit("second", pipeline)
+        await asyncio.sleep(0.02)
+        scheduler.cancel("first")
+        await asyncio.sleep(0.3)
+        await scheduler.stop()
+        return peak, recorder
+
+    peak, recorder = asyncio.run(scenario())
+    assert peak == 1
+    assert recorder.started == ["first", "second"]
+    assert recorder.aborted == {"first": "cancelled"}
+
+
+def test_cancelled_queued_job_leaves_the_queue_depth():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = JobScheduler(
+            recorder.on_start, recorder.on_abort, max_concurrency=1, max_queue_size=2, default_deadline=5
+        )
+        release = asyncio.Event()
+
+        scheduler.start()
+        scheduler.submit("running", release.wait)
+        await asyncio.sleep(0)
+        scheduler.submit("queued", release.wait)
+        scheduler.submit("cancelled", release.wait)
+        assert scheduler.queue_depth == 2
+        scheduler.cancel("cancelled")
+        depth = scheduler.queue_depth
+        # The cancelled job no longer takes up room in the queue
+        scheduler.submit("accepted", release.wait)
+        release.set()
+        await asyncio.sleep(0.05)
+        await scheduler.stop()
+        return depth, recorder
+
+    depth, recorder = asyncio.run(scenario())
+    assert depth == 1
+    assert recorder.aborted == {"cancelled": "cancelled"}
+    assert recorder.started == ["running", "queued", "accepted"]
+
+
+def test_zero_deadline_is_not_the_default():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = JobScheduler(recorder.on_start, recorder.on_abort, max_concurrency=1, default_deadline=5)
+        scheduler.start()
+        scheduler.submit("job", lambda: asyncio.sleep(0.05), deadline=0)
+        await asyncio.sleep(0.1)
+        await scheduler.stop()
+        return recorder
+
+    recorder = asyncio.run(scenario())
+    assert recorder.started == []
+    assert recorder.aborted == {"job": "timeout"}
+
+
+def test_execute_waits_for_a_slot_and_returns_the_result():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = JobScheduler(recorder.on_start, recorder.on_abort, max_concurrency=1, default_deadline=5)
+        release = asyncio.Event()
+
+        async def batch():
+            return ["result"]
+
+        scheduler.start()
+        scheduler.submit("job", release.wait)
+        waiting = asyncio.create_task(scheduler.execute("batch", batch))
+        await asyncio.sleep(0.02)
+        # The batch queues behind the running job like any other
+        queued = not waiting.done() and scheduler.queue_depth == 1
+        release.set()
+        result = await waiting
+        await scheduler.stop()
+        return queued, result, recorder
+
+    queued, result, recorder = asyncio.run(scenario())
+    assert queued
+    assert result == ["result"]
+    assert recorder.started == ["job", "batch"]
+
+
+def test_execute_raises_when_the_deadline_expires():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = JobScheduler(recorder.on_start, recorder.on_abort, max_concurrency=1, default_deadline=5)
+        scheduler.start()
+        try:
+            with pytest.raises(JobAborted) as aborted:
+                await scheduler.execute("batch", lambda: asyncio.sleep(1), deadline=0.05)
+        finally:
+            await scheduler.stop()
+        return aborted.value, scheduler.stats()
+
+    aborted, stats = asyncio.run(scenario())
+    assert aborted.status == "timeout"
+    assert stats["running"] == 0
+    assert stats["timeouts"] == 1
+
+
+def test_execute_cancels_the_job_when_the_caller_leaves():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = JobScheduler(recorder.on_start, recorder.on_abort, max_concurrency=1, default_deadline=5)
+        scheduler.start()
+        waiting = asyncio.create_task(scheduler.execute("batch", lambda: asyncio.sleep(1)))
+        await asyncio.sleep(0.02)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        await asyncio.sleep(0.02)
+        await scheduler.stop()
+        return recorder, scheduler.stats()
+
+    recorder, stats = asyncio.run(scenario())
+    assert recorder.aborted == {"batch": "cancelled"}
+    assert stats["running"] == 0
+
+
+def test_streams_take_worker_slots_and_their_deadline():
+    async def scenario():
+        recorder = Recorder()
+        scheduler = JobScheduler(recorder.on_start, recorder.on_abort, max_concurrency=1, default_deadline=5)
+        running = peak = 0
+
+        async def stream(events: asyncio.Queue, tokens: int):
+            # Like stream_events: the pipeline pushes its events from a job
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            try:
+                for i in range(tokens):
+                    await asyncio.sleep(0.02)
+                    await events.put(i)
+            finally:
+                running -= 1
+
+        async def consume(job_id: str, tokens: int, deadline=None):
+            events = asyncio.Queue()
+            job = asyncio.create_task(scheduler.execute(job_id, lambda: stream(events, tokens), deadline=deadline))
+            job.add_done_callback(lambda _: events.put_nowait(None))
+            received = []
+            while True:
+                item = await events.get()
+                if item is None:
+                    break
+                received.append(item)
+            try:
+                await job
+            except JobAborted as e:
+                return received, e.status
+            return received, "completed"
+
+        scheduler.start()
+        results = await asyncio.gather(consume("first", 3), consume("second", 3), consume("late", 50, deadline=0.3))
+        await scheduler.stop()
+        return peak, running, results
+
+    peak, running, results = asyncio.run(scenario())
+    assert peak == 1
+    assert running == 0
+    assert results[0] == ([0, 1, 2], "completed")
+    assert results[1] == ([0, 1, 2], "completed")
+    received, status = results[2]
+    assert status == "timeout"
+    assert len(received) < 50
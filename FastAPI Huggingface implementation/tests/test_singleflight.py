@@ -0,0 +1,94 @@
+import asyncio
+
+from services.singleflight import SingleFlight
+
+
+def test_callers_share_one_computation():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return "result"
+
+        results = await asyncio.gather(*(flight.do("key", compute) for _ in range(3)))
+        return calls, results, flight.stats()
+
+    calls, results, stats = asyncio.run(scenario())
+    assert calls == 1
+    assert results == ["result"] * 3
+    assert stats["coalesced"] == 2
+    assert stats["inflight"] == 0
+
+
+def test_computation_survives_while_a_caller_remains():
+    async def scenario():
+        flight = SingleFlight()
+        finished = asyncio.Event()
+
+        async def compute():
+            await asyncio.sleep(0.1)
+            finished.set()
+            return "result"
+
+        leaving = asyncio.create_task(flight.do("key", compute))
+        staying = asyncio.create_task(flight.do("key", compute))
+        await asyncio.sleep(0.02)
+        leaving.cancel()
+        return await staying, finished.is_set(), leaving.cancelled()
+
+    result, finished, cancelled = asyncio.run(scenario())
+    assert result == "result"
+    assert finished
+    assert cancelled
+
+
+def test_computation_is_cancelled_when_every_caller_leaves():
+    async def scenario():
+        flight = SingleFlight()
+        started = asyncio.Event()
+        unwound = asyncio.Event()
+
+        async def compute():
+            started.set()
+            try:
+                await asyncio.sleep(10)
+            finally:
+                unwound.set()
+
+        callers = [asyncio.create_task(flight.do("key", compute)) for _ in range(2)]
+        await started.wait()
+        for caller in callers:
+            caller.cancel()
+        await asyncio.gather(*callers, return_exceptions=True)
+        # The last caller returns only once the computation has unwound
+        return unwound.is_set(), all(caller.cancelled() for caller in callers), flight.stats()
+
+    unwound, cancelled, stats = asyncio.run(scenario())
+    assert unwound
+    assert cancelled
+    assert stats["abandoned"] == 1
+    assert stats["inflight"] == 0
+
+
+def test_new_caller_after_abandonment_starts_a_new_computation():
+    async def scenario():
+        flight = SingleFlight()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return calls
+
+        first = asyncio.create_task(flight.do("key", compute))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        return await flight.do("key", compute)
+
+    assert asyncio.run(scenario()) == 2
@@ -2,6 +2,7 @@ import json
 import os
 import pandas as pd
 import re
+import spacy
 from sentence_transformers import SentenceTransformer
 
 #Filename of the input file and its path
@@ -9,6 +10,25 @@ filename = ""
 input_file = os.path.join("", filename)
 # Load the pre-trained model for sentence embeddings
 model = SentenceTransformer('paraphrase-multilingual-MiniLM-L12-v2')
+# Same spaCy parser the API uses to split articles into sentences; the
+# components segmentation does not need are not loaded
+nlp = spacy.load("pt_core_news_md", exclude=["ner", "morphologizer", "lemmatizer", "attribute_ruler"])
+
+def sentence_segmentation(texts):
+    """Sentence spans (character offsets) of each text and the embedding of every sentence"""
+    spans = []
+    for doc in nlp.pipe(texts, batch_size=64):
+        spans.append([[sent.start_char, sent.end_char] for sent in doc.sents])
+
+    sentences = [text[start:end] for text, text_spans in zip(texts, spans) for start, end in text_spans]
+    sentence_embeddings = model.encode(sentences, show_progress_bar=True, batch_size=64, device='cuda:0')
+
+    # Regroup the flat sentence embeddings per article
+    grouped, offset = [], 0
+    for text_spans in spans:
+        grouped.append([sentence_embeddings[i].tolist() for i in range(offset, offset + len(text_spans))])
+        offset += len(text_spans)
+    return spans, grouped
 
 def preprocessing(input_file):
     try:
@@ -48,6 +68,13 @@ def preprocessing(input_file):
     embeddings = model.encode(df["text"], show_progress_bar=True, batch_size=16, device='cuda:0')
     df.insert(3, "embedding", [embeddings[i].tolist() for i in range(len(embeddings))])
 
+    # Precompute sentence boundaries and sentence embeddings on the cleaned
+    # text (the article content stored in the database), loaded with
+    # database/load_sentences.py so the API's LexRank stage can skip them
+    sentence_spans, sentence_embeddings = sentence_segmentation(df["text"].tolist())
+    df["sentence_spans"] = sentence_spans
+    df["sentence_embeddings"] = sentence_embeddings
+
     removed_count = initial_count - filtered_count
     print(f'Number of articles kept: {filtered_count}')
     print(f'Number of articles removed: {removed_count}')